@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""
+What canonicalizing urls costs and what it saves: urls a second through
+`urls.Canonicalizer` with and without its memo, then crawls of a local
+synthetic site where --duplicate-rate of the links are spelled differently
+to the page they point at, with canonicalization off and on.
+
+    python bench/canonicalize.py --pages 2000 --duplicate-rate 0.3
+
+The site runs in its own process.
+"""
+import argparse
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.threads import Dispatcher
+from crawler.urls import Canonicalizer
+from synthetic import fetch_stats, spawn
+
+def make_urls(count, seed=1):
+    rand = random.Random(seed)
+    urls = []
+    for i in xrange(count):
+        url = 'HTTP://Example.com:80/section/%7E{}/page'.format(
+                                                        rand.randint(0, 500))
+        if rand.random() < 0.5:
+            url += '?b={}&a={}&utm_source=feed'.format(i % 7, i % 3)
+        if rand.random() < 0.3:
+            url += '#part-{}'.format(i % 5)
+        urls.append(url)
+    return urls
+
+
+def throughput(urls, cache_size):
+    canonicalize = Canonicalizer(cache_size=cache_size)
+    start = time.time()
+    for url in urls:
+        canonicalize(url)
+    return len(urls) / (time.time() - start)
+
+
+def crawl(url, canonicalize):
+    dispatcher = Dispatcher(base=url, fetchers=4, exit_when_idle=True,
+                        robots=False, canonicalizer=canonicalize)
+    dispatcher.signal_queue.put(('add_urls', [url]))
+    before = fetch_stats(url)
+    start = time.time()
+    dispatcher.start()
+    dispatcher.join()
+    elapsed = time.time() - start
+    fetches = fetch_stats(url)['200'] - before.get('200', 0)
+    return fetches, elapsed, dispatcher.duplicates_avoided
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=200000)
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.3)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    urls = make_urls(args.urls)
+    print '{} urls, {} different'.format(len(urls), len(set(urls)))
+    print '  {:<14} {:>9.0f} urls/s'.format('no memo', throughput(urls, 0))
+    print '  {:<14} {:>9.0f} urls/s'.format('memoized',
+                                                throughput(urls, len(urls)))
+
+    site, url = spawn({'pages': args.pages,
+                        'duplicate_rate': args.duplicate_rate})
+    try:
+        print '{} page site, {:.0f}% of links spelled differently'.format(
+                                    args.pages, args.duplicate_rate * 100)
+        for label, canonicalize in (('off', lambda url: url),
+                                    ('on', Canonicalizer())):
+            fetches, elapsed, avoided = crawl(url, canonicalize)
+            print ('  {:<4} {:>6} fetches in {:>5.1f}s, {:>6} duplicates '
+                    'avoided'.format(label, fetches, elapsed, avoided))
+    finally:
+        site.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+How long resuming a crawl takes: writes a `checkpoint.Checkpoint` of
+--urls urls (--done of them finished, with rows like a real crawl's) and
+times `threads.Dispatcher.restore` reading it back, with how much the
+peak memory grew while it did.
+
+    python bench/checkpoint_restore.py --urls 1000000 --done 0.5
+
+The restore runs in its own process, without a sink so it's just the
+dispatcher's own work.
+"""
+import argparse
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.checkpoint import Checkpoint
+from crawler.threads import Dispatcher
+from column_store import make_row
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def write(path, count, done):
+    checkpoint = Checkpoint(path)
+    checkpoint.start({'base': 'http://example.com/', 'robots': False})
+    finished = int(count * done)
+    start = time.time()
+    # a page is queued before it's done and a crawl runs ahead of itself,
+    # so the log interleaves the two the way a real one does
+    for i in xrange(count):
+        url, data = make_row(i)
+        checkpoint.add_seen(url)
+        if i < finished:
+            checkpoint.add_done(url, data)
+    checkpoint.close()
+    return time.time() - start, finished
+
+
+def run(path):
+    checkpoint = Checkpoint(path)
+    dispatcher = Dispatcher(checkpoint=checkpoint, resume=True,
+                            metrics=False, **checkpoint.load_settings())
+    before = peak()
+    start = time.time()
+    dispatcher.restore()
+    print time.time() - start, peak() - before, dispatcher.url_queue.qsize()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=1000000)
+    parser.add_argument('--done', type=float, default=0.5,
+                help='How much of the crawl was finished')
+    parser.add_argument('--run', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+    if args.run is not None:
+        return run(args.run)
+
+    folder = tempfile.mkdtemp()
+    try:
+        path = os.path.join(folder, 'crawl')
+        elapsed, finished = write(path, args.urls, args.done)
+        size = os.path.getsize(os.path.join(path, 'crawl.log'))
+        print '{} urls, {} done: wrote {:.0f}MB of log in {:.1f}s'.format(
+                    args.urls, finished, size / 1048576.0, elapsed)
+        out = subprocess.check_output([sys.executable, __file__,
+                                        '--run', path])
+        elapsed, grew, queued = map(float, out.split())
+        print ('  restored in {:.1f}s ({:.0f} urls/s), {:.0f}MB more peak, '
+                '{:.0f} urls queued'.format(elapsed, args.urls / elapsed,
+                                                grew / 1048576, queued))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
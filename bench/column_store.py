@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Memory per row and rows a second for `store.ColumnStore` (no wx needed),
+next to keeping each row as a dict of strings like a naive model would.
+Rows look like a real crawl's: the status, server and content type repeat
+and the size, title, description and headings are different for every
+page, as are the notes on the ones that redirect.
+
+    python bench/column_store.py --rows 200000
+
+Each runs in its own process, memory is how much its peak grew while
+filling the rows (strings and all).
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.store import COLUMNS, ColumnStore
+
+SERVERS = ('nginx', 'Apache', 'cloudflare')
+
+def make_row(i):
+    return ('http://example.com/section-{}/page-{}'.format(i % 50, i), {
+        'status': 200 if i % 20 else 404,
+        'server': SERVERS[i % len(SERVERS)],
+        'content_type': 'text/html', 'size': str(2000 + i * 7 % 90000),
+        'x_robots': '--',
+        'title': u'Page {} of the example site'.format(i),
+        'desc': u'A description of page {}, long enough to look like '
+                u'the real thing does'.format(i),
+        'kw': '--', 'canonical': 'http://example.com/page-{}'.format(i),
+        'h1': u'Heading {}'.format(i), 'h2': u'Subheading;Another one',
+        'notes': '' if i % 10 else
+                        'Redirected to http://example.com/page-{}/'.format(i),
+    })
+
+
+class RowDicts(object):
+    """
+    A dict of strings per row.
+    """
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, url):
+        self.rows.setdefault(url, {'url': url})
+        return url
+
+    def update(self, row, data):
+        self.rows[row].update((key, value if isinstance(value, basestring)
+                                else str(value)) for key, value in data.items())
+
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run(kind, count):
+    store = ColumnStore(COLUMNS) if 'store' == kind else RowDicts()
+    before = peak()
+    elapsed = 0.0
+    # rows are made as we go so the strings count too, but only the store
+    # is timed
+    for i in xrange(count):
+        url, data = make_row(i)
+        start = time.time()
+        store.update(store.add(url), data)
+        elapsed += time.time() - start
+    print elapsed, peak() - before
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--run', choices=('store', 'dicts'),
+                help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        return run(args.run, args.rows)
+
+    print '{} rows'.format(args.rows)
+    for kind, label in (('dicts', 'dict per row'), ('store', 'ColumnStore')):
+        out = subprocess.check_output([sys.executable, __file__, '--run',
+                                                kind, '--rows', str(args.rows)])
+        elapsed, grew = map(float, out.split())
+        print '  {:<13} {:>6.0f} bytes/row {:>9.0f} rows/s'.format(label,
+                                    grew / args.rows, args.rows / elapsed)
+
+
+if __name__ == '__main__':
+    main()
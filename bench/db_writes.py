@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+How fast rows go into the sqlite store when each row is its own commit
+versus batched into big transactions.
+
+    python bench/db_writes.py --rows 20000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.database import DBWriter, open_database
+
+def make_row(i):
+    return ('http://example.com/page/{}'.format(i), {
+        'status': 200, 'server': 'nginx', 'content_type': 'text/html',
+        'size': 5120, 'title': u'Page {}'.format(i),
+        'desc': u'Description of page {}'.format(i), 'h1': u'Heading',
+    })
+
+
+def run(path, rows, batch_size):
+    writer = DBWriter(open_database(path), batch_size=batch_size)
+    start = time.time()
+    writer.start()
+    for i in xrange(rows):
+        writer.put(*make_row(i))
+    writer.close()
+    return rows / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    try:
+        for label, batch_size in (('per-row', 1), ('batched', args.batch_size)):
+            path = os.path.join(tmp, '{}.db'.format(label))
+            print '{:<8} {:>10.0f} rows/s'.format(label,
+                                            run(path, args.rows, batch_size))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
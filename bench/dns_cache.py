@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Time per request with and without the DNS cache, against a local HTTP
+server and a stub resolver that answers every *.test host with 127.0.0.1
+after --latency milliseconds (and says nx-*.test hosts don't exist).
+
+    python bench/dns_cache.py --requests 2000 --hosts 20 --threads 10
+
+Connections aren't kept alive, so like a crawl spread over lots of hosts,
+every request needs a lookup.
+"""
+import argparse
+import BaseHTTPServer
+import os
+import socket
+import SocketServer
+import sys
+from threading import Lock, Thread
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from requests.exceptions import RequestException
+
+from crawler.resolver import DNSCache
+from crawler.sessions import SessionPool
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # send the response in one go
+    wbufsize = -1
+
+    def do_GET(self):
+        body = '<html><title>ok</title></html>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class StubResolver(object):
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.lock = Lock()
+
+    def __call__(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if host.startswith('nx-'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return socket.getaddrinfo('127.0.0.1', port, socket.AF_INET,
+                                                            socktype, proto)
+
+
+class NoCache(object):
+    """
+    Every lookup goes to the resolver, like without a cache at all.
+    """
+
+    def __init__(self, resolve):
+        self.getaddrinfo = resolve
+
+    def stats(self):
+        return {'hits': 0, 'misses': 0, 'negative_hits': 0}
+
+
+def run(urls, threads, cached, latency):
+    stub = StubResolver(latency)
+    cache = DNSCache(resolve=stub) if cached else NoCache(stub)
+    sessions = SessionPool(pool_size=threads, keep_alive=False,
+                                                            dns_cache=cache)
+    times = []
+    def fetch(part):
+        for url in part:
+            start = time.time()
+            try:
+                sessions.get(url).get(url, timeout=sessions.timeout).close()
+            except RequestException:
+                pass
+            times.append(time.time() - start)
+    workers = [Thread(target=fetch, args=(urls[i::threads],))
+                                                    for i in xrange(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.time() - start
+    sessions.close()
+    return elapsed, sum(times) / len(times), stub.calls, cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--hosts', type=int, default=20)
+    parser.add_argument('--missing', type=int, default=2,
+                help="Hosts that don't exist")
+    parser.add_argument('--threads', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=20,
+                help='Stub resolver milliseconds per lookup')
+    args = parser.parse_args()
+
+    server = Server(('127.0.0.1', 0), Handler)
+    t = Thread(target=server.serve_forever)
+    t.daemon = True
+    t.start()
+    hosts = ['site-{}.test'.format(i) for i in xrange(args.hosts)]
+    hosts += ['nx-{}.test'.format(i) for i in xrange(args.missing)]
+    urls = ['http://{}:{}/{}'.format(hosts[i % len(hosts)],
+                server.server_port, i) for i in xrange(args.requests)]
+    print '{} requests, {} hosts, {} threads, {:.0f}ms lookups'.format(
+                args.requests, len(hosts), args.threads, args.latency)
+    results = {}
+    for label, cached in (('no cache', False), ('cache', True)):
+        elapsed, mean, calls, stats = run(urls, args.threads, cached,
+                                                    args.latency / 1000.0)
+        results[label] = mean
+        print ('  {:<8} {:>7.0f} req/s  {:>6.2f}ms/request  {:>5} lookups  '
+            '{hits} hits {misses} misses {negative_hits} negative hits'
+            .format(label, len(urls) / elapsed, mean * 1000, calls, **stats))
+    print '  saved {:.2f}ms a request'.format(
+                        (results['no cache'] - results['cache']) * 1000)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
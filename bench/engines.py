@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Pages a second crawling a slow local synthetic site with the `threads`
+fetch engine (a handful of fetchers) and the `pool` engine (lots of them,
+capped per host).
+
+    python bench/engines.py --pages 10000 --latency 50
+
+The site runs in its own process, and its latency is fixed so the
+scheduler never sees a slow response to back off from.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.threads import Dispatcher
+from synthetic import spawn
+
+def crawl(url, engine, fetchers, per_host):
+    dispatcher = Dispatcher(base=url, engine=engine, fetchers=fetchers,
+                        per_host=per_host, exit_when_idle=True, robots=False)
+    dispatcher.signal_queue.put(('add_urls', [url]))
+    start = time.time()
+    dispatcher.start()
+    dispatcher.join()
+    return dispatcher.metrics.snapshot()['pages'], time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=50.0,
+                help='Milliseconds per response')
+    parser.add_argument('--fetchers', type=int, default=5,
+                help='Fetchers for the threads engine')
+    parser.add_argument('--pool-size', type=int, default=100,
+                help='Requests in flight for the pool engine')
+    parser.add_argument('--per-host', type=int, default=50)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    site, url = spawn({'pages': args.pages, 'latency': args.latency,
+                        'latency_dist': 'fixed'})
+    try:
+        print '{} pages, {:.0f}ms a response'.format(args.pages, args.latency)
+        for label, engine, fetchers in (
+                ('threads', 'threads', args.fetchers),
+                ('pool', 'pool', args.pool_size)):
+            pages, elapsed = crawl(url, engine, fetchers, args.per_host)
+            print '  {:<8} {:>4} fetchers {:>7.1f} pages/s ({} pages in '\
+                '{:.1f}s)'.format(label, fetchers, pages / elapsed, pages,
+                                                                    elapsed)
+    finally:
+        site.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Rows a second and memory exporting a crawl's results from a
+`store.ColumnStore` in each of the formats in `exporters.EXPORTERS`, plus
+the old way for comparison: building a tablib dataset of every row and
+writing it out in one go (only if tablib is installed).
+
+    python bench/exporters.py --rows 1000000
+
+Each runs in its own process, memory is how much its peak grew during the
+export (the store is filled first). Output goes to a temporary file.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.exporters import EXPORTERS, export_store, get_exporter
+from crawler.store import COLUMNS, ColumnStore
+from column_store import make_row
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def fill(count):
+    store = ColumnStore(COLUMNS)
+    for i in xrange(count):
+        url, data = make_row(i)
+        store.update(store.add(url), data)
+    return store
+
+
+def tablib_export(store, f):
+    # how File > Save used to do it
+    import tablib
+    dataset = tablib.Dataset(headers=store.columns)
+    for values in store.iter_rows():
+        dataset.append(values)
+    f.write(dataset.json)
+
+
+def run(kind, count):
+    store = fill(count)
+    fd, path = tempfile.mkstemp()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            before = peak()
+            start = time.time()
+            if 'tablib' == kind:
+                tablib_export(store, f)
+            else:
+                for progress in export_store(store,
+                                        get_exporter(kind, f, store.columns)):
+                    pass
+            elapsed = time.time() - start
+        print elapsed, peak() - before, os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--run', choices=list(EXPORTERS) + ['tablib'],
+                help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        return run(args.run, args.rows)
+
+    kinds = list(EXPORTERS)
+    try:
+        import tablib
+    except ImportError:
+        print 'tablib not installed, skipping the old json export'
+    else:
+        kinds.append('tablib')
+    print '{} rows'.format(args.rows)
+    for kind in kinds:
+        out = subprocess.check_output([sys.executable, __file__, '--run',
+                                            kind, '--rows', str(args.rows)])
+        elapsed, grew, size = map(float, out.split())
+        print ('  {:<7} {:>8.0f} rows/s {:>7.0f}MB more peak {:>6.0f}MB '
+                'written'.format(kind, args.rows / elapsed, grew / 1048576,
+                                                            size / 1048576))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Pages a second pulling links and the title/desc/kw/canonical/h1/h2 fields
+out of parsed pages: a cssselect call per field (how the parser used to do
+it), a precompiled selector per field, and `extract.Extractor`'s single
+pass. Then whole pages a second through `parse_page` and `stream_page`,
+parsing included. And pages a second and peak memory for both on
+--big-size byte pages, the stream path fed --chunk-size chunks as they'd
+come off the response and the DOM path the whole body like the fetcher
+reads it, each in its own process. Pages are made up as they're read, so
+they don't count towards the stream path's memory.
+
+    python bench/extract_pages.py [page.html or folder ...]
+    python bench/extract_pages.py --big-size 8388608 --chunk-size 16384
+
+Point it at saved pages (folders are read for *.html and *.htm). Without
+any it makes up synthetic ones (see synthetic.py).
+"""
+import argparse
+import glob
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lxml.cssselect import CSSSelector
+import lxml.html
+
+from crawler.extract import extractor
+from crawler.functions import parse_page, stream_page
+from synthetic import Site
+
+# (name, css, attribute or None for the text) like the old Parser had them
+FIELDS = [
+    ('title', 'title', None),
+    ('desc', 'meta[name=description]', 'content'),
+    ('kw', 'meta[name=keywords]', 'content'),
+    ('canonical', 'link[rel=canonical]', 'href'),
+    ('h1', 'h1', None),
+    ('h2', 'h2', None),
+]
+
+# css => CSSSelector, like the parser kept them
+_selectors = {}
+
+def compile_selector(css):
+    selector = _selectors.get(css)
+    if selector is None:
+        selector = _selectors[css] = CSSSelector(css)
+    return selector
+
+
+def by_selector(select):
+    def extract(html):
+        links = [e.get('href') for e in select(html, 'a')
+                                            if e.get('href') is not None]
+        out = {}
+        for name, css, attr in FIELDS:
+            elements = select(html, css)
+            if attr is None:
+                values = [e.text_content() for e in elements]
+            else:
+                values = [e.get(attr) for e in elements]
+            out[name] = ';'.join(values) if values else '--'
+        return links, out
+    return extract
+
+
+def big_page(size, chunk_size):
+    """
+    Yield a page of about size bytes in chunk_size chunks, made up as it
+    goes so none of it is around before it's needed.
+    """
+    yield ('<!DOCTYPE html>\n<html><head><title>A big page</title>'
+            '<meta name="description" content="Lots of links">'
+            '<link rel="canonical" href="/big"></head>\n<body><h1>Big</h1>\n')
+    sent = 0
+    n = 0
+    while sent < size:
+        parts = []
+        length = 0
+        while length < chunk_size:
+            part = ('<p>Paragraph {0} of lorem ipsum, dolor sit amet with '
+                    '<a href="/p/{1}">a link</a> in it.</p>\n'.format(n,
+                                                                n % 1000))
+            parts.append(part)
+            length += len(part)
+            n += 1
+        sent += length
+        yield ''.join(parts)
+    yield '</body></html>\n'
+
+
+def peak():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_big(kind, size, chunk_size, rounds):
+    url = 'http://127.0.0.1/big'
+    before = peak()
+    start = time.time()
+    for i in xrange(rounds):
+        if 'stream' == kind:
+            result = stream_page(big_page(size, chunk_size), url)
+        else:
+            result = parse_page(''.join(big_page(size, chunk_size)), url)
+        assert result is not None
+    print (time.time() - start) / rounds, peak() - before
+
+
+def big_pages(args):
+    print '{:.1f}MB pages, streamed in {:.0f}KB chunks'.format(
+                        args.big_size / 1048576.0, args.chunk_size / 1024.0)
+    for label, kind in (('parse_page', 'dom'), ('stream_page', 'stream')):
+        out = subprocess.check_output([sys.executable, __file__, '--run',
+                    kind, '--big-size', str(args.big_size), '--chunk-size',
+                    str(args.chunk_size), '--rounds', str(args.rounds)])
+        elapsed, grew = map(float, out.split())
+        print '  {:<20} {:>8.2f} pages/s {:>7.1f}MB more peak'.format(label,
+                                                1 / elapsed, grew / 1048576)
+
+
+def read_pages(paths):
+    pages = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(glob.glob(os.path.join(path, '*.html')) +
+                            glob.glob(os.path.join(path, '*.htm')))
+        else:
+            names = [path]
+        for name in names:
+            with open(name, 'rb') as f:
+                pages.append(f.read())
+    return pages
+
+
+def bench(func, items, rounds):
+    start = time.time()
+    for i in xrange(rounds):
+        for item in items:
+            func(item)
+    return len(items) * rounds / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='*')
+    parser.add_argument('--pages', type=int, default=500,
+                help='Synthetic pages to make without any paths')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--big-size', type=int, default=8 * 1024 * 1024)
+    parser.add_argument('--chunk-size', type=int, default=16 * 1024)
+    parser.add_argument('--run', choices=('dom', 'stream'),
+                help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        return run_big(args.run, args.big_size, args.chunk_size, args.rounds)
+
+    # first, a child's peak memory starts off at ours when it forks
+    big_pages(args)
+    pages = read_pages(args.paths)
+    if not pages:
+        site = Site(pages=args.pages, fan_out=50)
+        pages = [site.page(n) for n in xrange(args.pages)]
+    url = 'http://127.0.0.1/'
+    trees = [lxml.html.document_fromstring(page) for page in pages]
+    print '{} pages, {:.0f}KB on average'.format(len(pages),
+                        sum(map(len, pages)) / 1024.0 / len(pages))
+    print 'extracting from parsed pages'
+    for label, func in (
+            ('cssselect per call', by_selector(
+                                        lambda html, css: html.cssselect(css))),
+            ('compiled selectors', by_selector(
+                                    lambda html, css: compile_selector(css)(html))),
+            ('Extractor', extractor.extract)):
+        print '  {:<20} {:>8.0f} pages/s'.format(label,
+                                            bench(func, trees, args.rounds))
+    print 'parsing and extracting'
+    for label, func in (
+            ('parse_page', lambda page: parse_page(page, url)),
+            ('stream_page', lambda page: stream_page([page], url))):
+        print '  {:<20} {:>8.0f} pages/s'.format(label,
+                                            bench(func, pages, args.rounds))
+
+if __name__ == '__main__':
+    main()
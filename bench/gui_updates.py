@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+What the GUI thread has to keep up with, without wx: --events synthetic
+crawl signals (new urls, headers, notes, finished urls) replayed through
+the dispatcher's update coalescing and flushes into a `store.ColumnStore`
+the way `grids.URLGrid.apply_updates` does, next to the old handlers that
+posted a GUI event per signal and found each url's row with list.index.
+
+    python bench/gui_updates.py --events 100000
+
+The old handlers are quadratic, at 100k events they take most of a minute
+(--old-events to give them fewer).
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.sinks import Sink
+from crawler.store import COLUMNS, ColumnStore
+from crawler.threads import Dispatcher
+
+SERVERS = ('nginx', 'Apache', 'cloudflare')
+
+def make_events(count, fan_out=3):
+    """
+    Signals like a crawl sends them: each page's headers and fields, links
+    to fan_out new pages, sometimes a note, then done.
+    """
+    events = []
+    i = 0
+    while len(events) < count:
+        url = 'http://example.com/page-{}'.format(i)
+        events.append(('url_meta', (url, {'status': 200,
+                    'server': SERVERS[i % len(SERVERS)],
+                    'content_type': 'text/html',
+                    'title': u'Page {}'.format(i), 'h1': u'Heading {}'.format(i)})))
+        events.append(('url_links', (url, ['http://example.com/page-{}'.format(
+                        i * fan_out + k + 1) for k in xrange(fan_out)])))
+        if 0 == i % 10:
+            events.append(('send_note', (url, 'Redirected to {}/'.format(url))))
+        events.append(('url_done', url))
+        i += 1
+    return events[:count]
+
+
+class StoreSink(Sink):
+    """
+    Applies each batch to a ColumnStore, like the GUI does when it gets one.
+    """
+
+    def __init__(self):
+        self.store = ColumnStore(COLUMNS)
+        self.batches = 0
+
+    def updates(self, updates):
+        self.batches += 1
+        self.store.apply(updates)
+
+
+def replay(events):
+    sink = StoreSink()
+    dispatcher = Dispatcher(sink=sink, robots=False, metrics=False)
+    start = time.time()
+    for action, val in events:
+        dispatcher.handle_signal(action, val)
+        dispatcher.maybe_flush()
+    dispatcher.flush()
+    elapsed = time.time() - start
+    dispatcher.url_queue.close()
+    return elapsed, sink.batches, len(sink.store)
+
+
+class OldHandlers(object):
+    """
+    Main's event handlers as they were: one GUI event per signal, rows
+    found with list.index and every value set cell by cell.
+    """
+
+    def __init__(self):
+        self.urls = []
+        self.cells = {}
+        self.columns = dict((key, i) for i, key in enumerate(COLUMNS))
+        self.posted = 0
+
+    def get_row(self, url):
+        try:
+            return self.urls.index(url)
+        except ValueError:
+            return None
+
+    def event_url(self, url):
+        self.urls.append(url)
+        self.cells[self.get_row(url), 0] = url
+
+    def event_data(self, url, data):
+        row = self.get_row(url)
+        if row is not None:
+            for key, value in data.items():
+                if key in self.columns:
+                    self.cells[row, self.columns[key]] = value
+
+    def event_note(self, url, note):
+        row = self.get_row(url)
+        if row is not None:
+            self.cells[row, self.columns['notes']] = note
+
+    def handle(self, action, val):
+        self.posted += 1
+        if 'url_links' == action:
+            for link in val[1]:
+                self.event_url(link)
+        elif 'url_meta' == action:
+            self.event_data(*val)
+        elif 'send_note' == action:
+            self.event_note(*val)
+
+
+def replay_old(events):
+    handlers = OldHandlers()
+    handlers.event_url(events[0][1][0])
+    start = time.time()
+    for action, val in events:
+        handlers.handle(action, val)
+    return time.time() - start, handlers.posted, len(handlers.urls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--old-events', type=int,
+                help='Events for the old handlers (default: --events)')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    for label, func, count in (
+            ('old handlers', replay_old, args.old_events or args.events),
+            ('coalesced', replay, args.events)):
+        events = make_events(count)
+        elapsed, batches, rows = func(events)
+        print ('  {:<13} {:>7} events {:>9.0f} events/s {:>7} GUI batches '
+                '{:>7} rows'.format(label, count, count / elapsed, batches,
+                                                                    rows))
+
+
+if __name__ == '__main__':
+    main()
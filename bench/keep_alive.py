@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Requests a second, and how many connections the server saw, fetching
+pages from a local synthetic site the old way (a plain requests.get for
+every url) and through a `SessionPool` of keep-alive connections.
+
+    python bench/keep_alive.py --requests 2000 --threads 5
+
+The site runs in its own process so it doesn't count against the fetchers.
+"""
+import argparse
+import logging
+import os
+import sys
+from threading import Thread
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.functions import fetch_url
+from crawler.sessions import SessionPool
+from synthetic import fetch_stats, spawn
+
+def run(urls, threads, sessions=None):
+    def fetch(part):
+        for url in part:
+            if sessions is None:
+                fetch_url(url)
+            else:
+                fetch_url(url, sessions.get(url), sessions.timeout)
+    workers = [Thread(target=fetch, args=(urls[i::threads],))
+                                                    for i in xrange(threads)]
+    start = time.time()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0,
+                help='Mean milliseconds per response')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    site, url = spawn({'pages': args.requests, 'latency': args.latency})
+    try:
+        urls = ['{}p/{}'.format(url, i) for i in xrange(args.requests)]
+        print '{} requests, {} threads'.format(len(urls), args.threads)
+        for label, pooled in (('requests.get', False), ('SessionPool', True)):
+            sessions = None
+            if pooled:
+                sessions = SessionPool(pool_size=args.threads)
+            before = fetch_stats(url)
+            elapsed = run(urls, args.threads, sessions)
+            after = fetch_stats(url)
+            if sessions is not None:
+                sessions.close()
+            # less the one /__stats came in on
+            connections = after['connections'] - before['connections'] - 1
+            print '  {:<13} {:>7.0f} req/s  {:>5} connections'.format(label,
+                                        len(urls) / elapsed, connections)
+    finally:
+        site.kill()
+
+
+if __name__ == '__main__':
+    main()
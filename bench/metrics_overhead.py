@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+What the crawl metrics cost: the time per counter and timing update on
+their own (one at a time and batched through add), then whole crawls of a
+local site with metrics on and off, comparing pages a second and CPU
+seconds per thousand pages.
+
+    python bench/metrics_overhead.py --pages 2000 --rounds 7
+
+The site runs in another process so its CPU time isn't counted. A crawl's
+CPU time moves by a few percent from one run to the next, so the overhead
+is the median of each round's on/off pair, with the lowest and highest.
+"""
+import argparse
+import BaseHTTPServer
+import logging
+import os
+import resource
+import SocketServer
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.metrics import Metrics
+from crawler.threads import Dispatcher
+
+PAGES = 2000
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send the response in one go
+    wbufsize = -1
+
+    def do_GET(self):
+        i = int(self.path.strip('/') or 0)
+        links = ''.join('<a href="/{}">page {}</a>'.format((i * 7 + k) % PAGES,
+                                                k) for k in xrange(1, 11))
+        body = ('<html><head><title>Page {0}</title><meta name="description"'
+                ' content="Page {0}"></head><body><h1>Page {0}</h1>{1}{2}'
+                '</body></html>'.format(i, links, '<p>text</p>' * 200))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+def serve(pages):
+    global PAGES
+    PAGES = pages
+    server = Server(('127.0.0.1', 0), Handler)
+    print server.server_port
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def crawl(url, metrics, fetchers):
+    dispatcher = Dispatcher(base=url, fetchers=fetchers, exit_when_idle=True,
+                                            robots=False, metrics=metrics)
+    dispatcher.signal_queue.put(('add_urls', [url]))
+    start = time.time()
+    cpu = cpu_time()
+    dispatcher.start()
+    dispatcher.join()
+    return time.time() - start, cpu_time() - cpu
+
+
+def micro(n=200000):
+    metrics = Metrics()
+    start = time.time()
+    for i in xrange(n):
+        metrics.incr('pages')
+    incr = (time.time() - start) / n
+    start = time.time()
+    for i in xrange(n):
+        metrics.observe('parse', 0.001 * (i % 100))
+    observe = (time.time() - start) / n
+    batch = [('parse', 0.001 * i) for i in xrange(10)]
+    start = time.time()
+    for i in xrange(n / len(batch)):
+        metrics.add(timings=batch)
+    add = (time.time() - start) / n
+    return incr, observe, add
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=PAGES)
+    parser.add_argument('--rounds', type=int, default=7)
+    parser.add_argument('--fetchers', type=int, default=4)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        return serve(args.pages)
+    logging.disable(logging.ERROR)
+
+    incr, observe, add = micro()
+    print 'incr {:.2f}us, observe {:.2f}us, add {:.2f}us a timing'.format(
+                                    incr * 1e6, observe * 1e6, add * 1e6)
+
+    server = subprocess.Popen([sys.executable, __file__, '--serve',
+                        '--pages', str(args.pages)], stdout=subprocess.PIPE)
+    try:
+        url = 'http://127.0.0.1:{}/'.format(server.stdout.readline().strip())
+        totals = {True: [0.0, 0.0], False: [0.0, 0.0]}
+        overheads = []
+        # take turns so drift on the box hits both the same
+        for i in xrange(args.rounds):
+            cpus = {}
+            for metrics in (False, True):
+                elapsed, cpu = crawl(url, metrics, args.fetchers)
+                totals[metrics][0] += elapsed
+                totals[metrics][1] += cpu
+                cpus[metrics] = cpu
+            overheads.append((cpus[True] - cpus[False]) / cpus[False] * 100)
+        for metrics in (False, True):
+            elapsed, cpu = totals[metrics]
+            crawled = args.pages * args.rounds
+            print '{:<12} {:>7.1f} pages/s  {:>6.3f} CPU s/1000 pages'.format(
+                'metrics on' if metrics else 'metrics off',
+                crawled / elapsed, cpu / crawled * 1000)
+        overheads.sort()
+        print 'CPU overhead {:+.2f}% median ({:+.2f}% to {:+.2f}%)'.format(
+                    overheads[len(overheads) / 2], overheads[0], overheads[-1])
+    finally:
+        server.kill()
+
+
+if __name__ == '__main__':
+    main()
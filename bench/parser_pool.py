@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Pages parsed a second by the single Parser thread and by the ParserPool
+with more and more worker processes, on pages from the synthetic site
+(made in memory, nothing is fetched).
+
+    python bench/parser_pool.py --pages 5000 --processes 1 2 4 8
+
+Parsing's CPU bound, so the pool should go about as fast as the number of
+cores allows; past that more processes don't help.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+from Queue import Queue
+import sys
+from threading import Event
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.queues import STOP
+from crawler.threads import Parser, ParserPool
+from crawler.urls import Scope
+from synthetic import Site
+
+def run(pages, processes):
+    content = Queue()
+    signal = Queue()
+    scope = Scope('http://127.0.0.1/')
+    if processes:
+        parser = ParserPool(content, signal, scope, Event(), Event(),
+                                                                processes)
+    else:
+        parser = Parser(content, signal, scope, Event(), Event())
+    parser.start()
+    start = time.time()
+    for url, html in pages:
+        content.put((url, html, url))
+    content.join()
+    elapsed = time.time() - start
+    content.put(STOP)
+    parser.join()
+    return len(pages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=5000)
+    parser.add_argument('--page-size', type=int, default=32 * 1024)
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    site = Site(pages=args.pages, page_size=args.page_size)
+    pages = [('http://127.0.0.1/p/{}'.format(n), site.page(n))
+                                                for n in xrange(args.pages)]
+    print '{} pages of {}KB, {} cores'.format(args.pages,
+                        args.page_size // 1024, multiprocessing.cpu_count())
+    print '  {:<20} {:>8.0f} pages/s'.format('Parser thread', run(pages, 0))
+    for processes in args.processes:
+        print '  {:<20} {:>8.0f} pages/s'.format('ParserPool x{}'.format(
+                                    processes), run(pages, processes))
+
+
+if __name__ == '__main__':
+    main()
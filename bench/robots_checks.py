@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Allow/deny checks a second against big robots.txt files, ours next to the
+standard library's robotparser (which doesn't know about `*` or `$`, so it
+gets some answers wrong, but it's a baseline).
+
+    python bench/robots_checks.py [robots.txt ...]
+
+Without any files it makes one up that looks like a big real one: a
+thousand or so rules, a lot of them with wildcards.
+"""
+import argparse
+import os
+import random
+import robotparser
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.robots import parse_robots
+
+SECTIONS = ['wiki', 'w', 'api', 'search', 'user', 'account', 'shop', 'cart',
+            'checkout', 'static', 'media', 'blog', 'tag', 'category', 'print',
+            'admin', 'feeds', 'tmp', 'cgi-bin', 'ajax']
+
+def make_robots(rules=1000, seed=1):
+    rand = random.Random(seed)
+    lines = ['User-agent: Googlebot', 'Disallow: /nogoogle/', '',
+                'User-agent: *', 'Crawl-delay: 1']
+    for i in xrange(rules):
+        section = rand.choice(SECTIONS)
+        kind = rand.random()
+        if kind < 0.5:
+            path = '/{}/{}-{}'.format(section, rand.choice(SECTIONS), i)
+        elif kind < 0.8:
+            path = '/{}/*?{}='.format(section, rand.choice(SECTIONS))
+        elif kind < 0.9:
+            path = '/*.{}$'.format(rand.choice(['pdf', 'php', 'json', 'xml']))
+        else:
+            path = '/{}/*/{}*'.format(section, i)
+        field = 'Allow' if rand.random() < 0.1 else 'Disallow'
+        lines.append('{}: {}'.format(field, path))
+    return '\n'.join(lines) + '\n'
+
+
+def make_urls(count=20000, seed=2):
+    rand = random.Random(seed)
+    urls = []
+    for i in xrange(count):
+        path = '/{}/{}-{}'.format(rand.choice(SECTIONS), 
+                                        rand.choice(SECTIONS), rand.randint(0, 2000))
+        if rand.random() < 0.3:
+            path += '?{}={}'.format(rand.choice(SECTIONS), i)
+        elif rand.random() < 0.2:
+            path += rand.choice(['.pdf', '.html', '.php', '.json'])
+        urls.append('http://example.com' + path)
+    return urls
+
+
+def bench(check, urls):
+    start = time.time()
+    for url in urls:
+        check(url)
+    return len(urls) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--urls', type=int, default=20000)
+    args = parser.parse_args()
+
+    robots = [(path, open(path, 'rb').read()) for path in args.files]
+    if not robots:
+        robots = [('generated', make_robots())]
+    urls = make_urls(args.urls)
+    for name, text in robots:
+        start = time.time()
+        rules = parse_robots(text.decode('utf-8', 'replace'))
+        compile_time = time.time() - start
+        stdlib = robotparser.RobotFileParser()
+        stdlib.parse(text.splitlines())
+        print '{} ({} rules, compiled in {:.1f}ms)'.format(name, 
+                                        len(rules), compile_time * 1000)
+        print '  crawler.robots  {:>10.0f} checks/s'.format(
+                                                bench(rules.allowed, urls))
+        print '  robotparser     {:>10.0f} checks/s'.format(
+                bench(lambda url: stdlib.can_fetch('PyCrawl', url), urls))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Crawl a synthetic site (see synthetic.py) headless and report how it went
+as JSON: pages a second, CPU time, peak memory, queue depths over the
+crawl, the crawl metrics' timings and what the site served.
+
+    python bench/run.py --pages 5000 --latency 20 --fetchers 8 -o base.json
+    (change something)
+    python bench/run.py --pages 5000 --latency 20 --fetchers 8 \\
+                                            -o new.json --compare base.json
+
+--compare prints how the run did against an earlier one and exits with 1
+if pages a second, CPU per page or peak memory got worse by more than
+--tolerance. Run with the same settings on the same box, and take a few
+runs before believing a small difference.
+
+The site runs in its own process so it doesn't count against the crawler.
+It's all one host, so with --error-rate the crawler's backoff after 5xxs
+(and its retries of 503s) slows the whole crawl down, as it would for
+real. 1% of 2000 pages takes a couple of minutes, which is mostly waiting,
+so leave it off when timing anything else.
+"""
+import argparse
+from collections import Counter
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+from threading import Event, Thread
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.sinks import Sink
+from crawler.threads import Dispatcher, ENGINES, PARSE_MODES
+from synthetic import add_site_arguments, fetch_stats, site_settings, \
+    spawn
+
+# (result key, higher is better) checked by --compare
+COMPARED = [
+    ('pages_per_sec', True),
+    ('cpu_per_1000_pages', False),
+    ('peak_rss_mb', False),
+]
+
+class CountingSink(Sink):
+    """
+    Keeps nothing but a count of rows by status.
+    """
+
+    def __init__(self):
+        self.statuses = Counter()
+
+    def row(self, url, data):
+        self.statuses[str(data.get('status'))] += 1
+
+
+class QueueSampler(Thread):
+    """
+    Snapshots the crawl's metrics every interval seconds, keeping the
+    biggest and average value of each gauge (the queue sizes).
+    """
+    daemon = True
+
+    def __init__(self, metrics, interval=0.25):
+        Thread.__init__(self)
+        self.metrics = metrics
+        self.interval = interval
+        self.stopped = Event()
+        self.samples = 0
+        self.peaks = {}
+        self.totals = Counter()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        self.samples += 1
+        for name, value in self.metrics.snapshot()['gauges'].items():
+            value = value or 0
+            self.peaks[name] = max(self.peaks.get(name, 0), value)
+            self.totals[name] += value
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return dict((name, {'max': self.peaks[name],
+                        'mean': self.totals[name] / float(self.samples)})
+                    for name in self.peaks)
+
+
+def usage():
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    # parser processes, once they've exited
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return me, children
+
+
+def crawl(url, args):
+    sink = CountingSink()
+    dispatcher = Dispatcher(base=url, sink=sink, exit_when_idle=True,
+                    fetchers=args.fetchers, engine=args.engine,
+                    per_host=args.per_host, rate=args.rate,
+                    parsers=args.parsers,
+                    parse_mode=args.parse_mode, robots=not args.ignore_robots)
+    dispatcher.signal_queue.put(('add_urls', [url]))
+    sampler = QueueSampler(dispatcher.metrics)
+    before, children_before = usage()
+    start = time.time()
+    dispatcher.start()
+    sampler.start()
+    dispatcher.join()
+    elapsed = time.time() - start
+    queues = sampler.stop()
+    after, children_after = usage()
+    snapshot = dispatcher.metrics.snapshot()
+    pages = snapshot['pages']
+    cpu = {
+        'user': after.ru_utime - before.ru_utime,
+        'sys': after.ru_stime - before.ru_stime,
+        'children_user': children_after.ru_utime - children_before.ru_utime,
+        'children_sys': children_after.ru_stime - children_before.ru_stime,
+    }
+    total_cpu = sum(cpu.values())
+    return {
+        'pages': pages,
+        'elapsed': elapsed,
+        'pages_per_sec': pages / elapsed,
+        'cpu': cpu,
+        'cpu_per_1000_pages': total_cpu / pages * 1000 if pages else None,
+        # ru_maxrss is in KB on linux
+        'peak_rss_mb': after.ru_maxrss / 1024.0,
+        'children_peak_rss_mb': children_after.ru_maxrss / 1024.0,
+        'statuses': dict(sink.statuses),
+        'duplicates_avoided': dispatcher.duplicates_avoided,
+        'queues': queues,
+        'counters': snapshot['counters'],
+        'timings': snapshot['timings'],
+    }
+
+
+def compare(result, base, tolerance):
+    """
+    Print result against base, and return the names of whatever got worse
+    by more than tolerance (a fraction).
+    """
+    worse = []
+    print >> sys.stderr, '{:<20} {:>12} {:>12} {:>8}'.format('', 'base',
+                                                            'this', 'change')
+    for key, higher_is_better in COMPARED:
+        old, new = base.get(key), result.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / float(old)
+        regressed = change < -tolerance if higher_is_better \
+                                            else change > tolerance
+        if regressed:
+            worse.append(key)
+        print >> sys.stderr, '{:<20} {:>12.3f} {:>12.3f} {:>+7.1f}%{}'.format(
+                    key, old, new, change * 100, '  WORSE' if regressed else '')
+    return worse
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crawl a synthetic site '
+                                'and report the numbers as JSON.')
+    add_site_arguments(parser)
+    parser.add_argument('--fetchers', type=int, default=4)
+    parser.add_argument('--engine', choices=ENGINES, default='threads')
+    parser.add_argument('--per-host', type=int, default=10)
+    parser.add_argument('--rate', type=float,
+                help='Requests a second to the site, default no limit')
+    parser.add_argument('--parsers', type=int, default=0)
+    parser.add_argument('--parse-mode', choices=PARSE_MODES, default='dom')
+    parser.add_argument('--ignore-robots', action='store_true')
+    parser.add_argument('--label', help='Saved with the results')
+    parser.add_argument('-o', '--output', help='Write the JSON here too')
+    parser.add_argument('--compare', metavar='JSON',
+                help='Results of an earlier run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                help='How much worse counts as a regression '
+                        '(default: %(default)s)')
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    site, url = spawn(site_settings(args))
+    try:
+        result = crawl(url, args)
+        result['site'] = fetch_stats(url)
+    finally:
+        site.kill()
+    result['label'] = args.label
+    result['settings'] = dict((k, v) for k, v in vars(args).items()
+                    if k not in ('output', 'compare', 'tolerance', 'label'))
+    result['python'] = platform.python_version()
+    result['time'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+
+    out = json.dumps(result, indent=2, sort_keys=True)
+    print out
+    if args.output is not None:
+        with open(args.output, 'wb') as f:
+            f.write(out + '\n')
+    if args.compare is not None:
+        with open(args.compare, 'rb') as f:
+            base = json.load(f)
+        if base.get('settings') != result['settings']:
+            print >> sys.stderr, 'Warning: the runs used different settings'
+        if compare(result, base, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
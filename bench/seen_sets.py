@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Memory and adds a second for the seen-url sets: a plain set of url
+strings, `seen.FingerprintSet` and `seen.BloomFilter`, each filled with
+--urls urls in its own process. For the Bloom filter, also how many urls
+it hadn't seen it wrongly claims it had.
+
+    python bench/seen_sets.py --urls 10000000
+
+Peak memory is the whole process, python and all; the bytes column is
+just the set's own table where we know it.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.seen import BloomFilter, FingerprintSet
+
+class StringSet(set):
+    # the old way: the urls themselves
+    nbytes = None
+
+
+KINDS = {
+    'set': StringSet,
+    'fingerprints': FingerprintSet,
+    'bloom': lambda count: BloomFilter(capacity=count),
+}
+
+def make_url(i, host='www.example.com'):
+    return 'http://{}/section-{}/page-{}.html?id={}'.format(host, i % 97,
+                                                            i // 97, i)
+
+
+def run(kind, count, probes):
+    factory = KINDS[kind]
+    seen = factory(count) if 'bloom' == kind else factory()
+    start = time.time()
+    for i in xrange(count):
+        seen.add(make_url(i))
+    elapsed = time.time() - start
+    wrong = sum(make_url(i, 'other.example.com') in seen
+                                                    for i in xrange(probes))
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print elapsed, rss, seen.nbytes or 0, wrong
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=10000000)
+    parser.add_argument('--probes', type=int, default=100000,
+                help="Urls it hasn't seen to check for false positives")
+    parser.add_argument('--run', choices=sorted(KINDS),
+                help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        return run(args.run, args.urls, args.probes)
+
+    # what python and the test urls cost before any set, to take off
+    base = float(subprocess.check_output([sys.executable, '-c',
+        'import resource; print resource.getrusage('
+        'resource.RUSAGE_SELF).ru_maxrss / 1024.0']))
+    print '{} urls, {:.0f}MB for python itself'.format(args.urls, base)
+    for kind in ('set', 'fingerprints', 'bloom'):
+        out = subprocess.check_output([sys.executable, __file__, '--run',
+                    kind, '--urls', str(args.urls), '--probes',
+                    str(args.probes)])
+        elapsed, rss, nbytes, wrong = out.split()
+        nbytes = int(nbytes)
+        print ('  {:<13} {:>8.0f} adds/s {:>7.0f}MB peak {:>6.1f} bytes/url'
+                '{}'.format(kind, args.urls / float(elapsed), float(rss),
+                (float(rss) - base) * 1024 * 1024 / args.urls,
+                '  (table {:.0f}MB, {:.3f}% false positives)'.format(
+                    nbytes / 1048576.0, 100.0 * int(wrong) / args.probes)
+                                                        if nbytes else ''))
+
+
+if __name__ == '__main__':
+    main()
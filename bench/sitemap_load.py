@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Urls a second and peak memory reading a big made up sitemap set, through
+the streaming `sitemaps.SitemapLoader` and, for comparison, by parsing
+each whole document with lxml.etree.parse.
+
+    python bench/sitemap_load.py --urls 1000000 --per-file 50000
+
+The set is a sitemap index pointing at gzipped sitemaps of per-file urls
+each. Each way runs in its own process so their peak memory is separate.
+"""
+import argparse
+import gzip
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from threading import Event, Thread
+import time
+from Queue import Queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from lxml import etree
+
+from crawler.queues import STOP
+from crawler.sitemaps import SitemapLoader
+
+NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+def make_sitemaps(path, urls, per_file):
+    names = []
+    for start in xrange(0, urls, per_file):
+        name = 'sitemap-{}.xml.gz'.format(len(names))
+        with gzip.open(os.path.join(path, name), 'wb') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                    '<urlset xmlns="{}">\n'.format(NS))
+            for i in xrange(start, min(urls, start + per_file)):
+                f.write('<url><loc>http://example.com/page/{}</loc>'
+                        '<lastmod>2016-01-01</lastmod><changefreq>daily'
+                        '</changefreq><priority>0.5</priority></url>\n'
+                        .format(i))
+            f.write('</urlset>\n')
+        names.append(name)
+    index = os.path.join(path, 'sitemap.xml')
+    with open(index, 'wb') as f:
+        f.write('<sitemapindex xmlns="{}">\n'.format(NS))
+        for name in names:
+            f.write('<sitemap><loc>{}</loc></sitemap>\n'.format(name))
+        f.write('</sitemapindex>\n')
+    return index
+
+
+def run_loader(index):
+    sitemaps = Queue()
+    signal = Queue()
+    loader = SitemapLoader(sitemaps, signal, None, None, Event())
+    loader.start()
+    sitemaps.put(index)
+    # stand in for the dispatcher, just count them
+    counted = [0]
+    def consume():
+        while True:
+            action, batch = signal.get()
+            if batch is STOP:
+                break
+            counted[0] += len(batch)
+            loader.batch_done()
+    consumer = Thread(target=consume)
+    consumer.start()
+    sitemaps.join()
+    sitemaps.put(STOP)
+    loader.join()
+    signal.put((None, STOP))
+    consumer.join()
+    return counted[0]
+
+
+def run_whole(index):
+    count = 0
+    base = os.path.dirname(index)
+    for loc in etree.parse(index).iter('{%s}loc' % NS):
+        with gzip.open(os.path.join(base, loc.text)) as f:
+            doc = etree.parse(f)
+        count += len([l.text for l in doc.iter('{%s}loc' % NS)])
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=1000000)
+    parser.add_argument('--per-file', type=int, default=50000)
+    parser.add_argument('--run', nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run is not None:
+        how, index = args.run
+        start = time.time()
+        count = (run_loader if 'streaming' == how else run_whole)(index)
+        elapsed = time.time() - start
+        # ru_maxrss is in KB on linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+        print '{:<10} {:>8} urls {:>10.0f} urls/s  peak {:.0f}MB'.format(
+                                    how, count, count / elapsed, peak)
+        return
+
+    tmp = tempfile.mkdtemp()
+    try:
+        index = make_sitemaps(tmp, args.urls, args.per_file)
+        print 'an index of {}-url files:'.format(args.per_file)
+        for how in ('streaming', 'whole'):
+            subprocess.check_call([sys.executable, __file__,
+                                    '--run', how, index])
+        # the same urls in one big file, which the protocol doesn't allow
+        # but plenty of sites do anyway
+        shutil.rmtree(tmp)
+        tmp = tempfile.mkdtemp()
+        index = make_sitemaps(tmp, args.urls, args.urls)
+        print 'one {}-url file:'.format(args.urls)
+        for how in ('streaming', 'whole'):
+            subprocess.check_call([sys.executable, __file__,
+                                    '--run', how, index])
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Whether one host that's rate limiting us holds up the rest of the crawl:
+two local synthetic sites crawled together, one that answers 429 with a
+Retry-After past --rate-limit requests a second and one that doesn't. The
+fetchers either wait on the limited host's urls in `Scheduler.hold` (how
+they used to) or park them and get on with the other host (how they do
+now), and we see when each host's pages were done.
+
+    python bench/slow_hosts.py --pages 1000 --limited-pages 100
+
+Each site runs in its own process.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from urlparse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.sinks import Sink
+from crawler.threads import Dispatcher
+from synthetic import fetch_stats, spawn
+
+class Finished(Sink):
+    """
+    When the last page on each host was done, and how many there were.
+    """
+
+    def __init__(self):
+        self.start = time.time()
+        self.last = {}
+        self.pages = {}
+
+    def row(self, url, data):
+        host = urlsplit(url).netloc
+        self.last[host] = time.time() - self.start
+        self.pages[host] = self.pages.get(host, 0) + 1
+
+
+def blocking(fetcher):
+    # the old Fetcher.handle_url, which sent urls it was told to slow down
+    # for to the back of the queue
+    def handle_url(url):
+        with fetcher.scheduler.hold(url) as ticket:
+            if fetcher.process_url(url, ticket):
+                fetcher.urls.put(url)
+        return True
+    fetcher.handle_url = handle_url
+
+
+def crawl(urls, fetchers, block):
+    sink = Finished()
+    dispatcher = Dispatcher(fetchers=fetchers, exit_when_idle=True,
+                            robots=False, metrics=False, sink=sink)
+    if block:
+        for i in xrange(fetchers):
+            blocking(getattr(dispatcher, 'fetcher{}'.format(i)))
+    dispatcher.signal_queue.put(('add_urls', urls))
+    sink.start = time.time()
+    dispatcher.start()
+    dispatcher.join()
+    return sink
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=1000,
+                help='Pages on the site that lets us crawl as fast as we like')
+    parser.add_argument('--limited-pages', type=int, default=100)
+    parser.add_argument('--rate-limit', type=float, default=5.0)
+    parser.add_argument('--latency', type=float, default=10.0)
+    parser.add_argument('--fetchers', type=int, default=4)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    # fixed latency, so the only thing to back off from is the 429s
+    fast, fast_url = spawn({'pages': args.pages, 'latency': args.latency,
+                            'latency_dist': 'fixed'})
+    limited, limited_url = spawn({'pages': args.limited_pages,
+                            'latency': args.latency, 'latency_dist': 'fixed',
+                            'rate_limit': args.rate_limit, 'retry_after': 1})
+    try:
+        print ('{} pages free to crawl, {} limited to {:g} requests/s, '
+                '{} fetchers'.format(args.pages, args.limited_pages,
+                                    args.rate_limit, args.fetchers))
+        hosts = (('free', urlsplit(fast_url).netloc),
+                    ('limited', urlsplit(limited_url).netloc))
+        for label, block in (('waiting', True), ('parking', False)):
+            before = fetch_stats(limited_url).get('429', 0)
+            sink = crawl([fast_url, limited_url], args.fetchers, block)
+            print '  {}:'.format(label),
+            print ', '.join('{} {} pages by {:.1f}s'.format(name,
+                            sink.pages.get(host, 0), sink.last.get(host, 0))
+                                                    for name, host in hosts),
+            print '({} 429s)'.format(
+                                fetch_stats(limited_url)['429'] - before)
+    finally:
+        fast.kill()
+        limited.kill()
+
+
+if __name__ == '__main__':
+    main()
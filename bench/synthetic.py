@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+A made up website to crawl, served locally. Every page is generated from
+its number and the seed, so the same settings always give the same site:
+
+    python bench/synthetic.py --pages 5000 --fan-out 20 --port 8000
+
+Pages live at /p/<n> (/ is page 0) and each links to the next one, so the
+whole site is reachable, plus fan-out - 1 others picked at random. Knobs:
+
+    --page-size         roughly how big each page is, in bytes
+    --latency           milliseconds before each response starts, drawn
+                        from --latency-dist (fixed, uniform, exp or
+                        lognormal) around that mean
+    --error-rate        share of pages that are a 404, 500 or 503
+    --redirect-rate     share of pages that 301 to where they've moved
+    --duplicate-rate    share of links spelled differently to the page's
+                        own url (fragments, tracking params, escapes) that
+                        canonicalization should fold back together
+    --session-rate      share of links with a session id on the end,
+                        which it can't
+    --rate-limit        requests a second it takes before answering 429
+                        with a Retry-After of --retry-after seconds (0 for
+                        no limit), like a host that polices crawlers
+
+GET /__stats gives the requests served so far by status, and how many
+connections they came in on, as JSON.
+"""
+import argparse
+import BaseHTTPServer
+from collections import Counter
+import json
+import math
+import os
+import random
+import socket
+import SocketServer
+import subprocess
+import sys
+from threading import Lock, Thread
+import time
+from urllib import unquote
+import urllib2
+
+LATENCY_DISTS = ('fixed', 'uniform', 'exp', 'lognormal')
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--fan-out', type=int, default=10)
+    parser.add_argument('--page-size', type=int, default=8 * 1024)
+    parser.add_argument('--latency', type=float, default=0.0,
+                help='Mean milliseconds per response')
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTS,
+                default='exp')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--redirect-rate', type=float, default=0.0)
+    parser.add_argument('--duplicate-rate', type=float, default=0.0)
+    parser.add_argument('--session-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+
+
+SITE_ARGUMENTS = ('pages', 'fan_out', 'page_size', 'latency', 'latency_dist',
+                'error_rate', 'redirect_rate', 'duplicate_rate',
+                'session_rate', 'rate_limit', 'retry_after', 'seed')
+
+def site_settings(args):
+    """
+    The `Site` keyword arguments out of parsed `add_site_arguments` args.
+    """
+    return dict((name, getattr(args, name)) for name in SITE_ARGUMENTS)
+
+
+def spawn(settings, python=sys.executable):
+    """
+    Run a site with settings (`Site` keyword arguments) in its own process,
+    so serving it doesn't count against whatever's crawling it. Returns the
+    process and the site's url; kill the process when you're done.
+    """
+    command = [python, os.path.abspath(__file__), '--port', '0']
+    for name, value in sorted(settings.items()):
+        command += ['--' + name.replace('_', '-'), str(value)]
+    site = subprocess.Popen(command, stdout=subprocess.PIPE)
+    return site, site.stdout.readline().strip()
+
+
+def fetch_stats(url):
+    """
+    The /__stats of the site at url.
+    """
+    return json.load(urllib2.urlopen(url + '__stats'))
+
+
+class Site(object):
+    """
+    The pages themselves, see the module docs for what the settings do.
+    """
+
+    def __init__(self, pages=2000, fan_out=10, page_size=8 * 1024,
+                    latency=0.0, latency_dist='exp', error_rate=0.0,
+                    redirect_rate=0.0, duplicate_rate=0.0, session_rate=0.0,
+                    rate_limit=0.0, retry_after=1, seed=1):
+        if latency_dist not in LATENCY_DISTS:
+            raise ValueError('Unknown latency distribution: {}'.format(
+                                                                latency_dist))
+        self.pages = pages
+        self.fan_out = fan_out
+        self.page_size = page_size
+        self.latency = latency / 1000.0
+        self.latency_dist = latency_dist
+        self.error_rate = error_rate
+        self.redirect_rate = redirect_rate
+        self.duplicate_rate = duplicate_rate
+        self.session_rate = session_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        # when the rate limit lets the next request in
+        self.next_allowed = 0.0
+        self.seed = seed
+        self.stats = Counter()
+        self.lock = Lock()
+        # requests for the same page get the same latencies in turn
+        self.hits = Counter()
+
+    def random(self, n, salt=0):
+        return random.Random((self.seed * 1000003 + n) * 31 + salt)
+
+    def kind(self, n):
+        """
+        ('ok', None), ('error', status) or ('redirect', None) for page n.
+        """
+        if 0 == n:
+            return 'ok', None
+        rand = self.random(n)
+        roll = rand.random()
+        if roll < self.error_rate:
+            return 'error', rand.choice((404, 500, 503))
+        if roll < self.error_rate + self.redirect_rate:
+            return 'redirect', None
+        return 'ok', None
+
+    def delay(self, n):
+        if not self.latency:
+            return 0.0
+        with self.lock:
+            hit = self.hits[n]
+            self.hits[n] += 1
+        rand = self.random(n, hit + 1)
+        mean = self.latency
+        if 'fixed' == self.latency_dist:
+            return mean
+        if 'uniform' == self.latency_dist:
+            return rand.uniform(0, 2 * mean)
+        if 'exp' == self.latency_dist:
+            return rand.expovariate(1.0 / mean)
+        # sigma 1, with mu picked so the mean comes out right
+        return rand.lognormvariate(math.log(mean) - 0.5, 1.0)
+
+    def limited(self):
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.time()
+            if now < self.next_allowed:
+                return True
+            self.next_allowed = now + 1.0 / self.rate_limit
+            return False
+
+    def link(self, rand, n):
+        url = '/p/{}'.format(n)
+        if rand.random() < self.duplicate_rate:
+            url = rand.choice([
+                url + '#section-{}'.format(rand.randint(1, 9)),
+                url + '?utm_source=bench&utm_medium=link',
+                url.replace('/p/', '/%70/'),
+                url + '?',
+            ])
+        if rand.random() < self.session_rate:
+            url += '{}sid={:x}'.format('&' if '?' in url else '?',
+                                                rand.getrandbits(32))
+        return url
+
+    def page(self, n):
+        rand = self.random(n, -1)
+        links = [self.link(rand, (n + 1) % self.pages)]
+        for i in xrange(self.fan_out - 1):
+            links.append(self.link(rand, rand.randrange(self.pages)))
+        head = ('<!DOCTYPE html>\n<html><head><title>Page {0}</title>'
+                '<meta name="description" content="Synthetic page {0}">'
+                '<link rel="canonical" href="/p/{0}"></head>\n<body>'
+                '<h1>Page {0}</h1><h2>Links</h2>\n<ul>\n'.format(n))
+        body = [head]
+        body.extend('<li><a href="{}">Link {}</a></li>\n'.format(link, i)
+                                            for i, link in enumerate(links))
+        body.append('</ul>\n')
+        size = sum(len(part) for part in body)
+        filler = '<p>{}</p>\n'.format(' '.join(['lorem ipsum'] * 10))
+        if size < self.page_size:
+            body.append(filler * ((self.page_size - size) // len(filler)))
+        body.append('</body></html>\n')
+        return ''.join(body)
+
+    def respond(self, path):
+        """
+        (status, headers, body) for path.
+        """
+        page = unquote(path.split('?', 1)[0].split('#', 1)[0])
+        if page in ('/', ''):
+            n = 0
+        elif page.startswith(('/p/', '/moved/')):
+            try:
+                n = int(page.rsplit('/', 1)[1])
+            except ValueError:
+                n = -1
+        else:
+            n = -1
+        if not 0 <= n < self.pages:
+            return 404, {}, 'Not found'
+        if self.limited():
+            return 429, {'Retry-After': str(self.retry_after)}, 'Slow down'
+        time.sleep(self.delay(n))
+        kind, status = self.kind(n)
+        if 'error' == kind:
+            return status, {}, 'Error {}'.format(status)
+        if 'redirect' == kind and not page.startswith('/moved/'):
+            return 301, {'Location': '/moved/{}'.format(n)}, ''
+        return 200, {'Content-Type': 'text/html; charset=utf-8'}, self.page(n)
+
+    def connected(self):
+        with self.lock:
+            self.stats['connections'] += 1
+
+    def count(self, status, size):
+        with self.lock:
+            self.stats[status] += 1
+            self.stats['bytes'] += size
+
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # send each response in one go, and don't let Nagle hold the last bit
+    # of it back waiting on the client's delayed ACK
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.server.site.connected()
+
+    def do_GET(self):
+        site = self.server.site
+        if '/__stats' == self.path:
+            with site.lock:
+                status, headers, body = 200, {}, json.dumps(site.stats)
+        else:
+            status, headers, body = site.respond(self.path)
+            site.count(status, len(body))
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, site, address=('127.0.0.1', 0)):
+        BaseHTTPServer.HTTPServer.__init__(self, address, Handler)
+        self.site = site
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/'.format(self.server_port)
+
+    def start(self):
+        """
+        Serve from a background thread.
+        """
+        thread = Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self.url
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_site_arguments(parser)
+    parser.add_argument('--port', type=int, default=8000,
+                help='0 picks a free one')
+    args = parser.parse_args()
+    server = Server(Site(**site_settings(args)), ('127.0.0.1', args.port))
+    # the first line out is the url, for whoever started us
+    print server.url
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
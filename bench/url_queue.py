@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Peak memory and urls a second for the url frontier: every url queued and
+then taken off again, through the old queue (everything in memory, with a
+set of url strings for the seen urls) and `queues.URLQueue` (a bounded hot
+window that spills to disk, with a `seen.FingerprintSet`).
+
+    python bench/url_queue.py --urls 5000000
+
+Each runs in its own process so they don't share a peak.
+"""
+import argparse
+import os
+from Queue import Queue
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.queues import URLQueue
+
+class OldURLQueue(Queue):
+    """
+    The frontier as it was.
+    """
+
+    def __init__(self):
+        Queue.__init__(self)
+        self.urls = set()
+
+    def add_url(self, url):
+        if url not in self.urls:
+            self.put(url)
+            self.urls.add(url)
+            return True
+        else:
+            return False
+
+
+def make_url(i):
+    return 'http://www.example.com/section-{}/page-{}.html?id={}'.format(
+                                                        i % 97, i // 97, i)
+
+
+def run(kind, count, hot_size):
+    queue = OldURLQueue() if 'old' == kind else URLQueue(hot_size=hot_size)
+    start = time.time()
+    for i in xrange(count):
+        queue.add_url(make_url(i))
+    # and every one of them again, which should all be skipped
+    for i in xrange(0, count, 10):
+        queue.add_url(make_url(i))
+    put = time.time() - start
+    start = time.time()
+    for i in xrange(count):
+        queue.get_nowait()
+    get = time.time() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print '{} {} {}'.format(put, get, rss)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--urls', type=int, default=5000000)
+    parser.add_argument('--hot-size', type=int, default=10000)
+    parser.add_argument('--run', choices=('old', 'new'),
+                help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run is not None:
+        return run(args.run, args.urls, args.hot_size)
+
+    print '{} urls (and 10% of them again)'.format(args.urls)
+    for kind, label in (('old', 'Queue and set'), ('new', 'URLQueue')):
+        out = subprocess.check_output([sys.executable, __file__, '--run', kind,
+                        '--urls', str(args.urls), '--hot-size',
+                        str(args.hot_size)])
+        put, get, rss = map(float, out.split())
+        print ('  {:<14} {:>9.0f} puts/s {:>9.0f} gets/s {:>8.0f}MB peak'
+                .format(label, args.urls * 1.1 / put, args.urls / get, rss))
+
+
+if __name__ == '__main__':
+    main()
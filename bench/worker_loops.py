@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+CPU time per crawled url with the fetchers and parser blocking on their
+queues (what they do now) against them spinning on get_nowait (what they
+used to do), crawling a local synthetic site. Also the CPU burned by a
+crawl with nothing to do for a second.
+
+    python bench/worker_loops.py --pages 1000 --latency 20 --fetchers 5
+
+The spinning loops are recreated here, they're not in the crawler any more.
+The site's latency is fixed, so the scheduler never sees a slow response
+to back off from.
+"""
+import argparse
+from Queue import Empty
+import logging
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from crawler.queues import STOP
+from crawler.threads import Dispatcher, Fetcher, Parser
+from synthetic import spawn
+
+def spin(queue, handle, abrupt):
+    # the old loop: never block, just try again
+    while True:
+        try:
+            item = queue.get_nowait()
+        except Empty:
+            continue
+        try:
+            if item is STOP:
+                break
+            if not abrupt.is_set():
+                handle(item)
+        finally:
+            queue.task_done()
+
+
+class SpinningFetcher(Fetcher):
+
+    def run(self):
+        spin(self.urls, self.handle_url, self.abrupt)
+
+
+class SpinningParser(Parser):
+
+    def run(self):
+        spin(self.content, lambda item: self.parse_content(*item), self.abrupt)
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def make_dispatcher(url, fetchers, spinning, exit_when_idle=True):
+    dispatcher = Dispatcher(base=url, fetchers=fetchers, robots=False,
+                            exit_when_idle=exit_when_idle, metrics=False)
+    if spinning:
+        for i in xrange(fetchers):
+            getattr(dispatcher, 'fetcher{}'.format(i)).__class__ = \
+                                                            SpinningFetcher
+        dispatcher.parser.__class__ = SpinningParser
+    return dispatcher
+
+
+def crawl(url, fetchers, spinning):
+    dispatcher = make_dispatcher(url, fetchers, spinning)
+    dispatcher.signal_queue.put(('add_urls', [url]))
+    start = time.time()
+    cpu = cpu_time()
+    dispatcher.start()
+    dispatcher.join()
+    return dispatcher.url_queue.urls.count, time.time() - start, \
+                                                        cpu_time() - cpu
+
+
+def idle(url, fetchers, spinning, seconds=1.0):
+    dispatcher = make_dispatcher(url, fetchers, spinning, False)
+    dispatcher.start()
+    cpu = cpu_time()
+    time.sleep(seconds)
+    cpu = cpu_time() - cpu
+    dispatcher.signal_queue.put(('stop_now', None))
+    dispatcher.join()
+    return cpu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=20.0,
+                help='Mean milliseconds per response')
+    parser.add_argument('--fetchers', type=int, default=5)
+    args = parser.parse_args()
+    logging.disable(logging.ERROR)
+
+    site, url = spawn({'pages': args.pages, 'latency': args.latency,
+                        'latency_dist': 'fixed'})
+    try:
+        for label, spinning in (('spinning', True), ('blocking', False)):
+            pages, elapsed, cpu = crawl(url, args.fetchers, spinning)
+            print ('{:<9} {:>7.1f} pages/s {:>8.2f} CPU ms/page '
+                    '{:>6.2f} CPU s idle for 1s'.format(label,
+                    pages / elapsed, cpu / pages * 1000,
+                    idle(url, args.fetchers, spinning)))
+    finally:
+        site.kill()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,4 @@
-from crawler import Main
+from crawler.frames import Main
 import wx
 
 if __name__ == '__main__':
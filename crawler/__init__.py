@@ -1 +1,2 @@
-from .frames import Main
+# The GUI lives in crawler.frames, it isn't imported here so the rest of the
+# package (and the command line crawler) works without wx installed.
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+import json
+import logging
+import os
+import time
+
+class Checkpoint(object):
+    """
+    Everything needed to pick a crawl back up after it dies, kept in the
+    directory path:
+
+        settings.json   the dispatcher settings the crawl started with
+        crawl.log       a line for every url that went into the queue
+                        ("+ url") and every finished url with its row
+                        ("= JSON list")
+
+    The log is append-only so saving is just writing a line. It's flushed
+    to the OS every sync_interval seconds, which is enough to survive the
+    app crashing or being closed, and synced to disk on close. It's one
+    file so a url is always saved as seen before it's saved as done (and
+    before anything found on its page is). The urls still to crawl are the
+    seen ones that aren't done.
+    """
+
+    def __init__(self, path, sync_interval=5.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.settings_path = os.path.join(path, 'settings.json')
+        self.log_path = os.path.join(path, 'crawl.log')
+        self.log = None
+        self.last_sync = time.time()
+
+    def exists(self):
+        return os.path.exists(self.settings_path)
+
+    def start(self, settings):
+        """
+        Start a fresh checkpoint for a crawl with settings (a dict of
+        `threads.Dispatcher` keyword arguments).
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        tmp = self.settings_path + '.tmp'
+        with open(tmp, 'wb') as f:
+            json.dump(settings, f, indent=2)
+        os.rename(tmp, self.settings_path)
+        open(self.log_path, 'wb').close()
+
+    def load_settings(self):
+        with open(self.settings_path, 'rb') as f:
+            return dict((str(k), v) for k, v in json.load(f).items())
+
+    def read_seen(self):
+        """
+        Yield every url we've seen, in the order they were queued.
+        """
+        return self.read_lines('+ ')
+
+    def read_done(self):
+        """
+        Yield (url, row) for every url that was finished.
+        """
+        for line in self.read_lines('= '):
+            try:
+                url, data = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(url, unicode):
+                url = url.encode('utf-8')
+            yield url, data
+
+    def read_lines(self, prefix):
+        """
+        Yield the rest of each line in the log that starts with prefix.
+        """
+        if not os.path.exists(self.log_path):
+            return
+        with open(self.log_path, 'rb') as f:
+            for line in f:
+                # a line without a newline was cut off mid write, skip it
+                if line.startswith(prefix) and line.endswith('\n'):
+                    yield line[len(prefix):-1]
+
+    def write(self, line):
+        if self.log is None:
+            self.log = open(self.log_path, 'ab')
+            # if we died halfway through a line, make sure the next one
+            # starts on its own
+            if self.log.tell() > 0:
+                with open(self.log_path, 'rb') as check:
+                    check.seek(-1, 2)
+                    if check.read(1) != '\n':
+                        self.log.write('\n')
+        self.log.write(line)
+        self.log.write('\n')
+
+    def add_seen(self, url):
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        self.write('+ ' + url.replace('\r', '%0D').replace('\n', '%0A'))
+
+    def add_done(self, url, data):
+        try:
+            line = json.dumps([url, data])
+        except (TypeError, ValueError):
+            # not utf-8, keep the url at least
+            logging.warning('Could not checkpoint the row for {}'.format(url))
+            line = json.dumps([url, {}], encoding='latin-1')
+        self.write('= ' + line)
+
+    def sync(self, force=False):
+        if not force and time.time() - self.last_sync < self.sync_interval:
+            return
+        if self.log is not None:
+            self.log.flush()
+        self.last_sync = time.time()
+
+    def close(self):
+        if self.log is not None:
+            self.log.flush()
+            os.fsync(self.log.fileno())
+            self.log.close()
+            self.log = None
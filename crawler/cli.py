@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import argparse
+import logging
+import re
+import sys
+
+from .checkpoint import Checkpoint
+from .exporters import EXPORTERS, get_exporter
+from .recrawl import PreviousCrawl
+from .resolver import DNS_TTL
+from .sinks import TeeSink, WriterSink
+from .store import COLUMNS
+from .threads import Dispatcher, ENGINES, MAX_BYTES, PARSE_MODES
+from .urls import SCOPES
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Crawl a site without the '
+                'GUI, writing a row for each url to stdout or a file as '
+                'it finishes.')
+    parser.add_argument('url', nargs='?',
+                help='The url to start crawling from')
+    parser.add_argument('-o', '--output',
+                help='Write rows here instead of stdout')
+    parser.add_argument('-f', '--format', choices=EXPORTERS.keys(),
+                default='csv', help='Output format (default: %(default)s)')
+    parser.add_argument('--fetchers', type=int, default=2,
+                help='Fetcher threads, or requests in flight for the pool '
+                        'engine (default: %(default)s)')
+    parser.add_argument('--engine', choices=ENGINES, default='threads',
+                help='Fetch engine (default: %(default)s)')
+    parser.add_argument('--per-host', type=int, default=10,
+                help='Max requests in flight per host (default: %(default)s)')
+    parser.add_argument('--rate', type=float,
+                help='Max requests a second per host (default: no limit)')
+    parser.add_argument('--parsers', type=int, default=0,
+                help='Parser processes, 0 parses in a thread '
+                        '(default: %(default)s)')
+    parser.add_argument('--parse-mode', choices=PARSE_MODES, default='dom',
+                help='How pages are parsed (default: %(default)s)')
+    parser.add_argument('--scope', choices=SCOPES, default='host',
+                help='Which urls are part of the crawl (default: %(default)s)')
+    parser.add_argument('--ignore-robots', action='store_true',
+                help="Crawl urls even if robots.txt says not to")
+    parser.add_argument('--sitemap', action='append', default=[],
+                metavar='URL',
+                help='Also crawl every page this sitemap (or sitemap index, '
+                        'or local file) lists. Can be given more than once')
+    parser.add_argument('--robots-sitemaps', action='store_true',
+                help='Also crawl the pages in the sitemaps robots.txt lists')
+    parser.add_argument('--dns-ttl', type=float, default=DNS_TTL,
+                help='Seconds to cache host lookups for, 0 to look them up '
+                        'every time (default: %(default)s)')
+    parser.add_argument('--max-bytes', type=int, default=MAX_BYTES,
+                help='Cut pages off after this many bytes, 0 for no limit '
+                        '(default: %(default)s)')
+    parser.add_argument('--head-first', action='store_true',
+                help='Send a HEAD request first for links that look like '
+                        'images, PDFs, video and other binary files')
+    parser.add_argument('--db',
+                help='Also save the results to this sqlite database')
+    parser.add_argument('--incremental', action='store_true',
+                help="Re-crawl what's in --db, skipping pages that haven't "
+                        "changed since")
+    parser.add_argument('--checkpoint', metavar='DIR',
+                help='Save progress to DIR so the crawl can be resumed')
+    parser.add_argument('--resume', metavar='DIR',
+                help='Carry on with the crawl checkpointed in DIR, using its '
+                        'settings. Only urls finished from here on are '
+                        'written out.')
+    parser.add_argument('--metrics', metavar='FILE',
+                help='Write queue sizes, timings and throughput here as '
+                        'JSON when the crawl ends')
+    parser.add_argument('-v', '--verbose', action='store_true',
+                help='Log what the crawler is up to on stderr')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    level = logging.INFO if args.verbose else logging.WARNING
+    logging.basicConfig(level=level)
+
+    if args.incremental and args.db is None:
+        sys.stderr.write('--incremental needs a --db to compare with\n')
+        return 2
+
+    checkpoint = None
+    if args.resume is not None:
+        checkpoint = Checkpoint(args.resume)
+        if not checkpoint.exists():
+            sys.stderr.write('No checkpoint in {}\n'.format(args.resume))
+            return 2
+        settings = checkpoint.load_settings()
+    else:
+        if args.url is None or re.match(r'^https?://(.*?)$', args.url) is None:
+            sys.stderr.write('Invalid URL: {}\n'.format(args.url))
+            return 2
+        settings = dict(fetchers=args.fetchers, base=args.url,
+                    engine=args.engine, per_host=args.per_host,
+                    parsers=args.parsers, parse_mode=args.parse_mode,
+                    scope=args.scope, max_bytes=args.max_bytes or None,
+                    head_first=args.head_first, rate=args.rate,
+                    robots=not args.ignore_robots, sitemaps=args.sitemap,
+                    robots_sitemaps=args.robots_sitemaps,
+                    dns_ttl=args.dns_ttl or None)
+        if args.checkpoint is not None:
+            checkpoint = Checkpoint(args.checkpoint)
+            if checkpoint.exists():
+                sys.stderr.write('There is already a crawl checkpointed in '
+                                '{}, use --resume\n'.format(args.checkpoint))
+                return 2
+
+    # everything's checked, only now touch any files
+    out = sys.stdout
+    if args.output is not None:
+        try:
+            out = open(args.output, 'wb')
+        except IOError as e:
+            sys.stderr.write('Could not open {}: {}\n'.format(args.output,
+                                                                e.strerror))
+            return 2
+    if checkpoint is not None and args.resume is None:
+        checkpoint.start(settings)
+
+    sink = WriterSink(get_exporter(args.format, out, COLUMNS))
+    previous = None
+    if args.db is not None:
+        # sqlalchemy's only needed if you want a database
+        from .database import DatabaseSink, open_database
+        engine = open_database(args.db)
+        if args.incremental:
+            previous = PreviousCrawl.from_database(engine)
+        sink = TeeSink(sink, DatabaseSink(engine))
+
+    dispatcher = Dispatcher(exit_when_idle=True, sink=sink,
+                    checkpoint=checkpoint, resume=args.resume is not None,
+                    previous=previous, record_links=args.db is not None,
+                    metrics_path=args.metrics, **settings)
+    if args.resume is None:
+        dispatcher.signal_queue.put(('add_urls', [args.url]))
+    dispatcher.start()
+    try:
+        # join with a timeout so ctrl+c still gets through
+        while dispatcher.is_alive():
+            dispatcher.join(1)
+    except KeyboardInterrupt:
+        dispatcher.signal_queue.put(('stop_now', None))
+        dispatcher.join()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0 if dispatcher.sink_error is None else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
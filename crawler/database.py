@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+import logging
+from collections import OrderedDict
+from threading import Thread
+from Queue import Empty, Queue
+
+from sqlalchemy import create_engine, select
+
+from .models import base, URL, URLData
+from .queues import STOP
+from .sinks import Sink
+
+urls = URL.__table__
+url_data = URLData.__table__
+
+# sqlite won't take more than 999 parameters in one statement
+MAX_PARAMS = 500
+
+
+def open_database(path):
+    """
+    Get an engine for the sqlite database at path, creating the tables if
+    they aren't there yet.
+    """
+    engine = create_engine('sqlite:///{}'.format(path))
+    # WAL lets readers at it while we write and makes commits cheaper
+    engine.execute('PRAGMA journal_mode=WAL')
+    base.metadata.create_all(engine)
+    return engine
+
+
+def to_text(value):
+    if isinstance(value, unicode):
+        return value
+    if not isinstance(value, str):
+        value = str(value)
+    return value.decode('utf-8', 'replace')
+
+
+def read_rows(engine):
+    """
+    Yield (url, dict of key => value) for every url in the database.
+    """
+    query = select([urls.c.url, url_data.c.data_key, url_data.c.data_value],
+                from_obj=urls.outerjoin(url_data,
+                                        urls.c.id == url_data.c.url_id)
+                ).order_by(urls.c.id)
+    url, data = None, None
+    for row_url, key, value in engine.execute(query):
+        if row_url != url:
+            if url is not None:
+                yield url, data
+            url, data = row_url, {}
+        if key is not None:
+            data[key] = value
+    if url is not None:
+        yield url, data
+
+
+class DBWriter(Thread):
+    """
+    Writes finished rows to the database on its own thread so nobody else
+    ever waits on the disk. Rows are queued up by put and written batch_size
+    at a time with bulk inserts, one transaction per batch. Whatever's
+    waiting is written after flush_interval seconds even if the batch isn't
+    full. Writing a url again replaces what we had for it.
+    """
+    name = 'db-writer'
+    daemon = True
+
+    def __init__(self, engine, batch_size=2000, flush_interval=1.0):
+        Thread.__init__(self)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue()
+        self.written = 0
+
+    def put(self, url, data):
+        self.queue.put((url, data))
+
+    def close(self):
+        """
+        Write everything that's still queued and wait for the thread to exit.
+        """
+        self.queue.put(STOP)
+        self.join()
+
+    def run(self):
+        done = False
+        while not done:
+            batch = []
+            item = self.queue.get()
+            try:
+                while item is not STOP:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self.queue.get(timeout=self.flush_interval)
+                    except Empty:
+                        break
+                done = item is STOP
+                if batch:
+                    self.write(batch)
+            except Exception:
+                logging.exception('Writing {} rows to the database '
+                                                'failed'.format(len(batch)))
+            finally:
+                for i in xrange(len(batch) + done):
+                    self.queue.task_done()
+
+    def write(self, batch):
+        rows = OrderedDict()
+        for url, data in batch:
+            rows[to_text(url)] = data
+        with self.engine.begin() as conn:
+            ids = {}
+            keys = list(rows)
+            for i in xrange(0, len(keys), MAX_PARAMS):
+                chunk = keys[i:i + MAX_PARAMS]
+                conn.execute(urls.insert().prefix_with('OR IGNORE'),
+                                            [{'url': url} for url in chunk])
+                ids.update((url, id) for id, url in conn.execute(
+                        select([urls.c.id, urls.c.url]).where(
+                                                    urls.c.url.in_(chunk))))
+                conn.execute(url_data.delete().where(
+                    url_data.c.url_id.in_([ids[url] for url in chunk])))
+            values = [{'url_id': ids[url], 'data_key': key,
+                        'data_value': to_text(value)}
+                        for url, data in rows.items()
+                        for key, value in data.items()
+                        if value not in (None, '')]
+            if values:
+                conn.execute(url_data.insert(), values)
+        self.written += len(rows)
+
+
+class DatabaseSink(Sink):
+    """
+    Saves each finished row to a database through a `DBWriter`.
+    """
+
+    def __init__(self, engine, **kwargs):
+        self.writer = DBWriter(engine, **kwargs)
+        self.writer.start()
+
+    def row(self, url, data):
+        self.writer.put(url, data)
+
+    def close(self):
+        self.writer.close()
+        logging.info('Saved {} urls to the database'.format(
+                                                        self.writer.written))
@@ -13,6 +13,13 @@ class CrawlDialog(wx.Dialog):
     """
     The dialog to start a crawl and adjust all the settings, etc.
     """
+    
+    # (label, `urls.SCOPES` value) for the crawl scope choice
+    scopes = [
+        ('Same host only', 'host'),
+        ('Host and subdomains', 'subdomain'),
+        ('Only under the start URL', 'prefix'),
+    ]
     def __init__(self, *args, **kwargs):
         wx.Dialog.__init__(self, *args, **kwargs)
         
@@ -33,11 +40,61 @@ class CrawlDialog(wx.Dialog):
         fb_sizer.Add(self.fetcher_5)
         fb_panel.SetSizer(fb_sizer)
         
+        eb_panel = wx.Panel(self)
+        engine_box = wx.StaticBox(eb_panel, label='Fetch Engine')
+        eb_sizer = wx.StaticBoxSizer(engine_box, orient=wx.VERTICAL)
+        self.engine_threads = wx.RadioButton(eb_panel, label='Threads', 
+                                                        style=wx.RB_GROUP)
+        self.engine_pool = wx.RadioButton(eb_panel, label='Pool')
+        self.pool_size = wx.SpinCtrl(eb_panel, min=1, max=1000, initial=100)
+        self.per_host = wx.SpinCtrl(eb_panel, min=1, max=100, initial=10)
+        eb_sizer.Add(self.engine_threads)
+        eb_sizer.Add(self.engine_pool)
+        eb_sizer.Add(wx.StaticText(eb_panel, label='Requests in flight'))
+        eb_sizer.Add(self.pool_size)
+        eb_sizer.Add(wx.StaticText(eb_panel, label='Requests per host'))
+        eb_sizer.Add(self.per_host)
+        self.rate = wx.SpinCtrl(eb_panel, min=0, max=1000, initial=0)
+        eb_sizer.Add(wx.StaticText(eb_panel, 
+                            label='Requests a second per host (0 for no limit)'))
+        eb_sizer.Add(self.rate)
+        self.parsers = wx.SpinCtrl(eb_panel, min=0, max=64, initial=0)
+        eb_sizer.Add(wx.StaticText(eb_panel, 
+                            label='Parser processes (0 parses in a thread)'))
+        eb_sizer.Add(self.parsers)
+        self.streaming = wx.CheckBox(eb_panel, 
+                            label='Stream pages through the parser (low memory)')
+        eb_sizer.Add(self.streaming)
+        eb_panel.SetSizer(eb_sizer)
+        
         ub_panel = wx.Panel(self)
         url_box = wx.StaticBox(ub_panel, label='Start URL')
         ub_sizer = wx.StaticBoxSizer(url_box, orient=wx.VERTICAL)
         self.url_field = wx.TextCtrl(ub_panel, size=(378, 30,))
         ub_sizer.Add(self.url_field)
+        self.scope = wx.Choice(ub_panel, choices=[label for label, scope 
+                                                        in self.scopes])
+        self.scope.SetSelection(0)
+        ub_sizer.Add(self.scope)
+        self.ignore_robots = wx.CheckBox(ub_panel, label='Ignore robots.txt')
+        ub_sizer.Add(self.ignore_robots)
+        ub_sizer.Add(wx.StaticText(ub_panel, 
+                    label='Also crawl the pages in this sitemap (optional)'))
+        self.sitemap_field = wx.TextCtrl(ub_panel, size=(378, 30,))
+        ub_sizer.Add(self.sitemap_field)
+        self.robots_sitemaps = wx.CheckBox(ub_panel, 
+                    label='And the sitemaps listed in robots.txt')
+        ub_sizer.Add(self.robots_sitemaps)
+        ub_sizer.Add(wx.StaticText(ub_panel, 
+                    label='Save progress to this folder (optional)'))
+        self.checkpoint = wx.DirPickerCtrl(ub_panel, size=(378, -1))
+        ub_sizer.Add(self.checkpoint)
+        ub_sizer.Add(wx.StaticText(ub_panel, 
+                    label='Also save the results to this database (optional)'))
+        self.database = wx.FilePickerCtrl(ub_panel, size=(378, -1),
+                    wildcard='SQLite databases (*.db)|*.db|All files|*',
+                    style=wx.FLP_SAVE | wx.FLP_USE_TEXTCTRL)
+        ub_sizer.Add(self.database)
         ub_panel.SetSizer(ub_sizer)
         
         ok_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -48,6 +105,7 @@ class CrawlDialog(wx.Dialog):
         
         vbox.Add(ub_panel, proportion=1, flag=wx.ALL|wx.EXPAND, border=5)
         vbox.Add(fb_panel, proportion=2, flag=wx.ALL|wx.EXPAND, border=5)
+        vbox.Add(eb_panel, proportion=2, flag=wx.ALL|wx.EXPAND, border=5)
         vbox.Add(ok_sizer, flag=wx.ALIGN_CENTER|wx.TOP|wx.BOTTOM, border=10)
         
         self.SetSizer(vbox)
@@ -60,7 +118,11 @@ class CrawlDialog(wx.Dialog):
         self.Bind(wx.EVT_RADIOBUTTON, self.set_fetcher_3, self.fetcher_3)
         self.Bind(wx.EVT_RADIOBUTTON, self.set_fetcher_4, self.fetcher_4)
         self.Bind(wx.EVT_RADIOBUTTON, self.set_fetcher_5, self.fetcher_5)
+        self.Bind(wx.EVT_RADIOBUTTON, self.set_engine_threads, 
+                                                    self.engine_threads)
+        self.Bind(wx.EVT_RADIOBUTTON, self.set_engine_pool, self.engine_pool)
         self.num_fetcher = 2
+        self.engine = 'threads'
         
     
     def on_okay(self, event):
@@ -70,7 +132,23 @@ class CrawlDialog(wx.Dialog):
         if match is None:
             wx.MessageBox('Invalid URL', 'Error', wx.OK | wx.ICON_ERROR)
         else:
-            send_event(self.GetParent(), StartEvent(url, self.num_fetcher))
+            parse_mode = 'stream' if self.streaming.GetValue() else 'dom'
+            scope = self.scopes[self.scope.GetSelection()][1]
+            if 'pool' == self.engine:
+                fetchers = self.pool_size.GetValue()
+            else:
+                fetchers = self.num_fetcher
+            checkpoint = self.checkpoint.GetPath() or None
+            sitemap = self.sitemap_field.GetValue().strip()
+            send_event(self.GetParent(), StartEvent(url, fetchers, 
+                                    self.engine, self.per_host.GetValue(),
+                                    self.parsers.GetValue(), parse_mode,
+                                    scope, checkpoint,
+                                    self.rate.GetValue() or None,
+                                    not self.ignore_robots.GetValue(),
+                                    [sitemap] if sitemap else [],
+                                    self.robots_sitemaps.GetValue(),
+                                    self.database.GetPath() or None))
             self.Destroy()
         
     def on_cancel(self, event):
@@ -90,3 +168,9 @@ class CrawlDialog(wx.Dialog):
     
     def set_fetcher_5(self, event):
         self.num_fetcher = 5
+    
+    def set_engine_threads(self, event):
+        self.engine = 'threads'
+    
+    def set_engine_pool(self, event):
+        self.engine = 'pool'
@@ -1,51 +1,56 @@
 import wx
 
-ID_NEW_URL = wx.NewId()
-ID_NEW_DATA = wx.NewId()
-ID_NEW_NOTE = wx.NewId()
+from .sinks import Sink
+
+ID_BATCH = wx.NewId()
 ID_START_CRAWL = wx.NewId()
 
 def send_event(notify, result):
     wx.PostEvent(notify, result)
 
-class NewUrlEvent(wx.PyEvent):
+class BatchEvent(wx.PyEvent):
     """
-    Event class for a new URL
+    Event with a batch of updates from the crawl: an ordered dict of
+    url => dict of column => value. New urls come with an empty dict.
     """
-    def __init__(self, url):
+    def __init__(self, updates):
         wx.PyEvent.__init__(self)
-        self.SetEventType(ID_NEW_URL)
-        self.url = url
+        self.SetEventType(ID_BATCH)
+        self.updates = updates
 
 
-class NewURLDataEvent(wx.PyEvent):
+class WxSink(Sink):
     """
-    Event class for new data about a given url
+    Sends batches of crawl updates to the GUI as `BatchEvent`s.
     """
-    def __init__(self, url, data):
-        wx.PyEvent.__init__(self)
-        self.SetEventType(ID_NEW_DATA)
-        self.url = url
-        self.data = data
-
-
-class NewNoteEvent(wx.PyEvent):
-    """
-    Event for a new note!
-    """
-    def __init__(self, url, note):
-        wx.PyEvent.__init__(self)
-        self.SetEventType(ID_NEW_NOTE)
-        self.url = url
-        self.note = note
+    def __init__(self, gui):
+        self.gui = gui
+    
+    def updates(self, updates):
+        send_event(self.gui, BatchEvent(updates))
 
 
 class StartEvent(wx.PyEvent):
     """
     Event for starting the crawler
     """
-    def __init__(self, start_url, num_fetchers=2):
+    def __init__(self, start_url, num_fetchers=2, engine='threads', 
+                                per_host=10, parsers=0, parse_mode='dom',
+                                scope='host', checkpoint=None, rate=None,
+                                robots=True, sitemaps=(),
+                                robots_sitemaps=False, db=None):
         wx.PyEvent.__init__(self)
         self.SetEventType(ID_START_CRAWL)
         self.start_url = start_url
         self.fetchers = num_fetchers
+        self.engine = engine
+        self.per_host = per_host
+        self.parsers = parsers
+        self.parse_mode = parse_mode
+        self.scope = scope
+        self.checkpoint = checkpoint
+        self.rate = rate
+        self.robots = robots
+        self.sitemaps = sitemaps
+        self.robots_sitemaps = robots_sitemaps
+        self.db = db
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+import csv
+import json
+
+encode = json.JSONEncoder().encode
+
+class Exporter(object):
+    """
+    Writes crawl results to stream one row (a list of values in the same
+    order as columns) at a time, so nothing has to be built up in memory
+    first. The header, if the format has one, goes out on creation and
+    anything that has to come after the rows goes out on close.
+    
+    Subclasses implement write, and write_header and close if they need
+    them; register them in `EXPORTERS` to offer them everywhere.
+    """
+    __metaclass__ = ABCMeta
+
+    def __init__(self, stream, columns):
+        self.stream = stream
+        self.columns = list(columns)
+        self.write_header()
+
+    def write_header(self):
+        pass
+
+    @abstractmethod
+    def write(self, values):
+        """
+        Write one row.
+        """
+
+    def close(self):
+        self.stream.flush()
+
+
+class CSVExporter(Exporter):
+
+    def write_header(self):
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(self.columns)
+
+    def write(self, values):
+        self.writer.writerow([v.encode('utf-8') if isinstance(v, unicode)
+                                                    else v for v in values])
+
+
+class JSONLinesExporter(Exporter):
+    """
+    One JSON object per line.
+    """
+
+    def write_header(self):
+        # the keys are the same every time, so only encode them once
+        self.keys = [json.dumps(c) + ': ' for c in self.columns]
+
+    def encode_row(self, values):
+        return '{' + ', '.join([k + encode(v) for k, v
+                                    in zip(self.keys, values)]) + '}'
+
+    def write(self, values):
+        self.stream.write(self.encode_row(values) + '\n')
+
+
+class JSONExporter(JSONLinesExporter):
+    """
+    A JSON list with an object per row, which is what exports have always
+    been. The list isn't finished until close, use jsonl if you want to
+    read the file while it's still being written.
+    """
+
+    def write_header(self):
+        JSONLinesExporter.write_header(self)
+        self.stream.write('[')
+        self.separator = '\n'
+
+    def write(self, values):
+        self.stream.write(self.separator + self.encode_row(values))
+        self.separator = ',\n'
+
+    def close(self):
+        self.stream.write('\n]\n')
+        JSONLinesExporter.close(self)
+
+
+class YAMLExporter(JSONLinesExporter):
+    """
+    A YAML list with one mapping per row. Each is written in flow style,
+    which is the same as JSON, so it's quick and can be written as we go.
+    """
+
+    def write(self, values):
+        self.stream.write('- ' + self.encode_row(values) + '\n')
+
+
+# format => (exporter, description), in the order they're offered
+EXPORTERS = OrderedDict([
+    ('csv', (CSVExporter, 'Comma Separated')),
+    ('json', (JSONExporter, 'JSON')),
+    ('jsonl', (JSONLinesExporter, 'JSON Lines')),
+    ('yaml', (YAMLExporter, 'YAML')),
+])
+
+
+def get_exporter(format, stream, columns):
+    try:
+        cls = EXPORTERS[format][0]
+    except KeyError:
+        raise ValueError('Unknown export format: {}'.format(format))
+    return cls(stream, columns)
+
+
+def export_store(store, exporter, chunk_size=10000):
+    """
+    Write every row in store (a `store.ColumnStore`) with exporter, a chunk
+    at a time. This is a generator that yields (rows done, total rows) after
+    each chunk so callers can show progress. Rows added after it starts
+    aren't included.
+    """
+    total = len(store)
+    for start in xrange(0, total, chunk_size):
+        stop = min(start + chunk_size, total)
+        for values in store.iter_rows(start, stop):
+            exporter.write(values)
+        yield stop, total
+    exporter.close()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+from urlparse import urljoin
+
+class Field(object):
+    """
+    Something to pull out of a page: the text (attr=None) or the attribute
+    attr of every `tag` element whose attributes equal those in match.
+    Field('desc', 'meta', 'content', {'name': 'description'}) is the same
+    as the css `meta[name=description]` and grabbing content.
+    """
+
+    def __init__(self, name, tag, attr=None, match=None):
+        self.name = name
+        self.tag = tag
+        self.attr = attr
+        self.match = match or {}
+
+    def matches(self, element):
+        for key, value in self.match.items():
+            if element.get(key) != value:
+                return False
+        return True
+
+    def value(self, element):
+        if self.attr is None:
+            # text_content gives a "smart" string that keeps the whole tree
+            # alive as long as it's around, we only want the text.
+            return unicode(element.text_content())
+        return element.get(self.attr)
+
+    def join(self, values):
+        """
+        Squash everything we found into one string, or None if there was
+        nothing there.
+        """
+        values = [v for v in values if v is not None]
+        if not values:
+            return None
+        if len(values) == 1:
+            return values[0]
+        if self.attr is None:
+            return ';'.join(v.strip() for v in values)
+        return ';'.join(values)
+
+
+DEFAULT_FIELDS = (
+    Field('title', 'title'),
+    Field('desc', 'meta', 'content', {'name': 'description'}),
+    Field('kw', 'meta', 'content', {'name': 'keywords'}),
+    Field('canonical', 'link', 'href', {'rel': 'canonical'}),
+    Field('h1', 'h1'),
+    Field('h2', 'h2'),
+)
+
+
+class Extractor(object):
+    """
+    Collects links and every registered field from a parsed page in a
+    single walk over the tree, rather than one cssselect call (and one walk)
+    per field. Registering a field doesn't add another pass.
+    """
+
+    def __init__(self, fields=DEFAULT_FIELDS):
+        self.fields = []
+        self.by_tag = {}
+        self.tags = set(['a'])
+        for field in fields:
+            self.register(field)
+
+    def register(self, field):
+        self.fields.append(field)
+        self.by_tag.setdefault(field.tag, []).append(field)
+        self.tags.add(field.tag)
+
+    def target(self, url=None, max_text=4096):
+        """
+        Get a fresh `ExtractTarget` for streaming a page through lxml's
+        feed parser.
+        """
+        return ExtractTarget(self, url, max_text)
+
+    def extract(self, html, url=None):
+        """
+        Walk html (an `Element` from lxml) once. Returns a list of the
+        hrefs of every link and a dict of field name => value, with '--' for
+        fields that weren't on the page. If url (where the page came from)
+        is given links are made absolute, honoring any <base href>.
+        """
+        links = []
+        base_href = None
+        found = dict((f.name, []) for f in self.fields)
+        for element in html.iter('base', *self.tags):
+            tag = element.tag
+            if 'a' == tag:
+                href = element.get('href')
+                if href is not None:
+                    links.append(href)
+            elif 'base' == tag and base_href is None:
+                base_href = element.get('href')
+            for field in self.by_tag.get(tag, ()):
+                if field.matches(element):
+                    found[field.name].append(field.value(element))
+
+        out = {}
+        for field in self.fields:
+            value = field.join(found[field.name])
+            out[field.name] = '--' if value is None else value
+        return resolve_links(links, url, base_href), out
+
+
+class ExtractTarget(object):
+    """
+    A parser target (see lxml's `HTMLParser(target=...)`) that picks out
+    the same links and fields as `Extractor.extract` from parser events,
+    without ever building a tree. Text fields keep at most max_text
+    characters each and links are only kept once however often they turn
+    up, so memory per page stays bounded by what's on it rather than how
+    big it is. close() returns the same (links, data) as extract(), less
+    any repeated links.
+    """
+
+    def __init__(self, extractor, url=None, max_text=4096):
+        self.extractor = extractor
+        self.url = url
+        self.max_text = max_text
+        self.links = []
+        self.seen_links = set()
+        self.base_href = None
+        self.found = dict((f.name, []) for f in extractor.fields)
+        # [field, depth, text parts, length] for text fields we're inside
+        self.capturing = []
+
+    def start(self, tag, attrib):
+        for capture in self.capturing:
+            capture[1] += 1
+        if 'a' == tag:
+            href = attrib.get('href')
+            if href is not None and href not in self.seen_links:
+                self.seen_links.add(href)
+                self.links.append(href)
+        elif 'base' == tag and self.base_href is None:
+            self.base_href = attrib.get('href')
+        for field in self.extractor.by_tag.get(tag, ()):
+            if not field.matches(attrib):
+                continue
+            if field.attr is None:
+                self.capturing.append([field, 1, [], 0])
+            else:
+                self.found[field.name].append(attrib.get(field.attr))
+
+    def data(self, text):
+        for capture in self.capturing:
+            room = self.max_text - capture[3]
+            if room > 0:
+                capture[2].append(text[:room])
+                capture[3] += min(room, len(text))
+
+    def end(self, tag):
+        still = []
+        for capture in self.capturing:
+            capture[1] -= 1
+            if capture[1] > 0:
+                still.append(capture)
+            else:
+                self.found[capture[0].name].append(''.join(capture[2]))
+        self.capturing = still
+
+    def close(self):
+        out = {}
+        for field in self.extractor.fields:
+            value = field.join(self.found[field.name])
+            out[field.name] = '--' if value is None else value
+        return resolve_links(self.links, self.url, self.base_href), out
+
+
+def resolve_links(hrefs, url=None, base_href=None):
+    """
+    Make hrefs absolute: relative to base_href (itself relative to url) if
+    the page had one, or relative to url. Leaves them alone without a url.
+    """
+    if url is None:
+        return hrefs
+    base = url
+    if base_href:
+        base = urljoin(url, base_href.strip())
+    return [urljoin(base, href.strip()) for href in hrefs]
+
+
+# the extractor parse_page uses unless told otherwise. Register fields on it
+# before the crawl starts so the parser pool's processes get them too.
+extractor = Extractor()
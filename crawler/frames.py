@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+from threading import Thread
 import webbrowser
 
-import tablib
 import wx
 
+from .checkpoint import Checkpoint
 from .dialogs import CrawlDialog
-from .events import ID_NEW_URL, ID_NEW_DATA, ID_NEW_NOTE, ID_START_CRAWL
+from .events import ID_BATCH, ID_START_CRAWL, WxSink
+from .exporters import EXPORTERS, export_store, get_exporter
 from .grids import URLGrid
 from .menus import MainMenu
+from .metrics import describe
 from .models import URL, URLData, base
+from .sinks import TeeSink
 from .threads import Dispatcher
 
 
@@ -24,7 +28,6 @@ class Main(wx.Frame):
         sizer = wx.BoxSizer(wx.VERTICAL)
         self.panel = wx.Panel(self, wx.ID_ANY)
         self.panel.SetSizer(sizer)
-        self.urls = []
         self.crawling = False
         self.CreateStatusBar()
         
@@ -35,9 +38,16 @@ class Main(wx.Frame):
         # set up the grid
         self.grid = URLGrid(sizer, self.panel)
         
+        # live numbers from the crawl under the grid
+        self.stats = wx.StaticText(self.panel, label='')
+        sizer.Add(self.stats, 0, wx.EXPAND|wx.ALL, 3)
+        self.stats_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.update_stats, self.stats_timer)
+        
         # Bind menu events
         self.Bind(wx.EVT_MENU, self.menu_exit, self.menu.file_menu.exit)
         self.Bind(wx.EVT_MENU, self.menu_new, self.menu.file_menu.new_crawl)
+        self.Bind(wx.EVT_MENU, self.menu_resume, self.menu.file_menu.resume)
         self.Bind(wx.EVT_MENU, self.menu_save, self.menu.file_menu.export)
         self.Bind(wx.EVT_MENU, self.menu_stop, self.menu.file_menu.stop)
         self.Bind(wx.EVT_MENU, self.menu_stop_abrupt, self.menu.file_menu.stop_abrupt)
@@ -47,9 +57,7 @@ class Main(wx.Frame):
         self.Bind(wx.EVT_CLOSE, self.menu_exit)
         
         # Bind events from worker thread
-        self.Connect(-1, -1, ID_NEW_URL, self.event_url)
-        self.Connect(-1, -1, ID_NEW_DATA, self.event_data)
-        self.Connect(-1, -1, ID_NEW_NOTE, self.event_note)
+        self.Connect(-1, -1, ID_BATCH, self.event_batch)
         self.Connect(-1, -1, ID_START_CRAWL, self.event_start)
         
         self.dispatcher = None
@@ -57,6 +65,7 @@ class Main(wx.Frame):
         self.Show()
         
     def menu_exit(self, event):
+        self.stats_timer.Stop()
         if self.crawling:
             self.stop_dispatcher()
         self.Destroy()
@@ -65,10 +74,26 @@ class Main(wx.Frame):
         if self.crawling:
             wx.MessageBox('Already crawling', 'Error', wx.OK | wx.ICON_ERROR)
             return
-        dlg = CrawlDialog(self, title="Start a New Crawl", size=(400, 300))
+        dlg = CrawlDialog(self, title="Start a New Crawl", size=(400, 830))
         dlg.ShowModal()
         dlg.Destroy()
     
+    def menu_resume(self, event):
+        if self.crawling:
+            wx.MessageBox('Already crawling', 'Error', wx.OK | wx.ICON_ERROR)
+            return
+        dialog = wx.DirDialog(self, message='Choose the crawl folder')
+        if dialog.ShowModal() == wx.ID_OK:
+            checkpoint = Checkpoint(dialog.GetPath())
+            if not checkpoint.exists():
+                wx.MessageBox('There is no saved crawl in that folder', 
+                                        'Error', wx.OK | wx.ICON_ERROR)
+            else:
+                self.start_dispatcher(checkpoint.load_settings(), 
+                                                checkpoint, resume=True)
+                self.SetStatusText('Resuming crawl...')
+        dialog.Destroy()
+    
     def menu_stop(self, event):
         if self.crawling:
             self.dispatcher.signal_queue.put(('stop', None))
@@ -84,44 +109,53 @@ class Main(wx.Frame):
             self.SetStatusText('Start a crawl first.')
     
     def menu_save(self, event):
-        if not self.urls:
+        store = self.grid.store
+        if not len(store):
             self.SetStatusText('Nothing here yet!')
             return
+        wildcard = '|'.join('{0} (*.{1})|*.{1}'.format(desc, ext) 
+                                for ext, (cls, desc) in EXPORTERS.items())
         dialog = wx.FileDialog(self, message='Choose a file', 
-                        style=wx.FD_SAVE,
-                        wildcard='Comma Separated (*.csv)|*.csv|'
-                            'JSON (*.json)|*.json|YAML (*.yaml)|*.yaml')
+                        style=wx.FD_SAVE, wildcard=wildcard)
         if dialog.ShowModal() == wx.ID_OK:
             index = dialog.GetFilterIndex()
-            self.filetype = ['csv', 'json', 'yaml'][index]
+            self.filetype = EXPORTERS.keys()[index]
             self.dirname = dialog.GetDirectory()
             filename = dialog.GetFilename()
             self.filename = '{}.{}'.format(filename, self.filetype)
             self.full_path = os.path.join(self.dirname, self.filename)
-            headers = []
-            for key in self.grid.get_cols().keys():
-                headers.append(key)
-            dataset = tablib.Dataset(headers=headers)
-            for url, row in self.urls.items():
-                rv = [url]
-                for h in headers[1:]:
-                    col = self.grid.get_col_data(h)
-                    value = self.grid.GetCellValue(row, col[0])
-                    rv.append(value)
-                dataset.append(rv)
             try:
-                with open(self.full_path, 'wb') as f:
-                    if 'json' == self.filetype:
-                        f.write(dataset.json)
-                    elif 'yaml' == self.filetype:
-                        f.write(dataset.yaml)
-                    else:
-                        f.write(dataset.csv)
-            except Exception, e:
+                f = open(self.full_path, 'wb')
+                exporter = get_exporter(self.filetype, f, store.columns)
+            except Exception as e:
                 self.SetStatusText('An error occured: {}'.format(e))
+                return
+            # big crawls take a while to write out, do it off the GUI thread.
+            # The crawl keeps adding to and changing the live store while
+            # that runs, so export a copy of it as it is now.
+            export = Thread(target=self.export, args=(store.snapshot(),
+                                                exporter, self.full_path))
+            export.daemon = True
+            export.start()
         else:
             self.SetStatusText('No saving?')
     
+    def export(self, store, exporter, path):
+        # runs on its own thread, so only talk to the GUI via CallAfter
+        try:
+            total = 0
+            for done, total in export_store(store, exporter):
+                wx.CallAfter(self.SetStatusText, 
+                    'Exporting... {}%'.format(done * 100 // total))
+        except Exception as e:
+            wx.CallAfter(self.SetStatusText, 
+                                    'An error occured: {}'.format(e))
+        else:
+            wx.CallAfter(self.SetStatusText, 
+                                'Exported {} rows to {}'.format(total, path))
+        finally:
+            exporter.stream.close()
+    
     def menu_about(self, event):
         info = wx.AboutDialogInfo()
         info.Name = 'PyCrawler'
@@ -172,41 +206,73 @@ class Main(wx.Frame):
                 'https://github.com/chrisguitarguy/Python-Crawler/wiki'
                 ' for documentation')
     
-    def event_url(self, event):
-        self.urls.append(event.url)
-        self.grid.AppendRows(1)
-        i = self.get_row(event.url)
-        if i is not None:
-            self.grid.SetCellValue(i, 0, event.url)
-    
-    def event_data(self, event):
-        row = self.get_row(event.url)
-        if row is not None:
-            for key, value in event.data.items():
-                col = self.grid.get_col_data(key)
-                if col is None:
-                    continue
-                if isinstance(value, basestring):
-                    value = value.encode('ascii', 'ignore')
-                else:
-                    value = str(value)
-                self.grid.SetCellValue(row, col[0], value)
-    
-    def event_note(self, event):
-        row = self.get_row(event.url)
-        if row is None:
-            return
-        col = self.grid.get_col_data('notes')
-        self.grid.SetCellValue(row, col[0], event.note)
+    def event_batch(self, event):
+        self.grid.apply_updates(event.updates)
     
     def event_start(self, event):
-        self.crawling = True
-        self.dispatcher = Dispatcher(gui=self, 
-                           fetchers=event.fetchers, base=event.start_url)
+        settings = dict(fetchers=event.fetchers, base=event.start_url,
+                           engine=event.engine, per_host=event.per_host,
+                           parsers=event.parsers, parse_mode=event.parse_mode,
+                           scope=event.scope, rate=event.rate,
+                           robots=event.robots, sitemaps=event.sitemaps,
+                           robots_sitemaps=event.robots_sitemaps)
+        checkpoint = None
+        if event.checkpoint is not None:
+            checkpoint = Checkpoint(event.checkpoint)
+            if checkpoint.exists():
+                wx.MessageBox('There is already a crawl saved in that folder, '
+                    'use Resume Crawl to carry on with it', 'Error', 
+                    wx.OK | wx.ICON_ERROR)
+                return
+        sink = None
+        if event.db is not None:
+            sink = self.database_sink(event.db)
+            if sink is None:
+                return
+        if checkpoint is not None:
+            checkpoint.start(settings)
+        self.start_dispatcher(settings, checkpoint, sink=sink)
         self.dispatcher.signal_queue.put(('add_urls', [event.start_url]))
-        self.dispatcher.start()
         self.SetStatusText('Crawling...')
     
+    def database_sink(self, path):
+        """
+        A sink that shows the crawl in the grid and saves it to the database
+        at path too, or None (after telling the user) if that won't open.
+        """
+        try:
+            # sqlalchemy's only needed if you want a database
+            from .database import DatabaseSink, open_database
+            engine = open_database(path)
+        except Exception as e:
+            wx.MessageBox("Couldn't open the database: {}".format(e),
+                                            'Error', wx.OK | wx.ICON_ERROR)
+            return None
+        return TeeSink(WxSink(self), DatabaseSink(engine))
+    
+    def start_dispatcher(self, settings, checkpoint=None, resume=False,
+                                                                sink=None):
+        self.crawling = True
+        # keep the metrics with the rest of the saved crawl
+        metrics_path = None
+        if checkpoint is not None:
+            metrics_path = os.path.join(checkpoint.path, 'metrics.json')
+        # the only sink we pass is the database's, which can keep the links
+        # for a later re-crawl
+        self.dispatcher = Dispatcher(gui=self, checkpoint=checkpoint, 
+                    resume=resume, metrics_path=metrics_path, sink=sink,
+                    record_links=sink is not None, **settings)
+        self.dispatcher.start()
+        self.stats_timer.Start(1000)
+    
+    def update_stats(self, event):
+        if self.dispatcher is None:
+            return
+        self.stats.SetLabel(describe(self.dispatcher.metrics.snapshot()))
+        if not self.dispatcher.is_alive():
+            # one last time, with the final numbers
+            self.stats_timer.Stop()
+    
     def stop_dispatcher(self):
         if not self.crawling:
             return
@@ -218,7 +284,4 @@ class Main(wx.Frame):
         self.crawling = False
     
     def get_row(self, url):
-        try:
-            return self.urls.index(url)
-        except:
-            return None
+        return self.grid.get_row(url)
@@ -1,48 +1,176 @@
 import logging
+import time
+from urlparse import urlsplit
 
+from lxml import etree
 import lxml.html as parser
 import requests
 from requests.exceptions import ConnectionError, RequestException, \
     Timeout, SSLError
 
-def fetch_url(url):
+from .extract import extractor as default_extractor
+
+# bytes read at a time when streaming a response body
+CHUNK_SIZE = 16 * 1024
+
+def fetch_url(url, session=None, timeout=None, stream=False, 
+                    extra_headers=None, max_bytes=None, head_first=False,
+                    timings=None):
     """
     Fetch a url! this is a simple wrapper around request.get that grabs
-    whatever url is thrown at it and returns the content, headers, status
-    and whatever notes we may have.
+    whatever url is thrown at it and returns the content, headers, status,
+    whatever notes we may have and the url we ended up at after redirects.
+
+    Pass a `requests.Session` as session to reuse its pooled connections,
+    and a (connect, read) tuple as timeout so a hung server can't stall a
+    fetcher forever.
+    
+    Only HTML bodies are downloaded: for anything else the connection is
+    closed as soon as the headers are in, and content is None. HTML bodies
+    are cut off after max_bytes, if it's set. With head_first, urls that
+    look like binary files (see `looks_binary`) get a HEAD request first
+    so we don't even start a download unless it turns out to be a page.
+    
+    With stream=True the body of an HTML page isn't read up front: content
+    is a `Body` iterator over its chunks instead (see `stream_page`).
+    
+    extra_headers are sent along with the request, like the conditional
+    ones for a re-crawl.
+    
+    Pass a dict as timings and it gets `ttfb`, the seconds until the
+    response headers were in, and `body`, the `Body` for HTML pages (which
+    knows how long it's been reading and how much).
     """
     content = None
     headers = None
     notes = None
     status = None
+    final_url = url
     headers = {'User-Agent': 'PyCrawl 0.1'}
+    if extra_headers:
+        headers.update(extra_headers)
+    client = requests if session is None else session
     try:
-        resp = requests.get(url, headers=headers)
+        resp = None
+        if head_first and looks_binary(url):
+            resp = client.head(url, headers=headers, timeout=timeout, 
+                                                    allow_redirects=True)
+            # some servers don't do HEAD, or only say html when you GET
+            if resp.status_code in (405, 501) or is_html(resp.headers):
+                resp.close()
+                resp = None
+        if resp is None:
+            resp = client.get(url, headers=headers, timeout=timeout, 
+                                                                stream=True)
     except ValueError as e:
         logging.error('Invalid url on {} - {}'.format(url, e))
-        note = 'invalid url'
+        notes = 'invalid url'
     except ConnectionError as e:
         logging.error('Could not connect to {}: {}'.format(url, e))
-        note = 'Could not connect'
+        notes = 'Could not connect'
     except SSLError as e:
         # this should ever happen.
         logging.error("Couldn't verify SSL cert for {}: {}".format(url, e))
-        note = 'SSL error: could not verify'
+        notes = 'SSL error: could not verify'
     except Timeout as e:
         logging.error('{} timed out: {}'.format(url, e))
-        note = 'Request timed out'
+        notes = 'Request timed out'
     except (RequestException, Exception) as e:
         logging.error('General error on {}: {}'.format(url, e))
-        note = 'Something when horribly wrong'
+        notes = 'Something when horribly wrong'
     else:
+        final_url = resp.url
+        if timings is not None:
+            timings['ttfb'] = resp.elapsed.total_seconds()
         if url != resp.url:
             notes = 'Redirected to: {}'.format(resp.url)
-        if 'text/html' in resp.headers.get('content-type', ''):
-            content = resp.content
+        if is_html(resp.headers) and 'HEAD' != resp.request.method:
+            content = body = Body(resp, max_bytes)
+            if timings is not None:
+                timings['body'] = body
+            if not stream:
+                try:
+                    content = ''.join(body)
+                except (RequestException, Exception) as e:
+                    logging.error('Error reading {}: {}'.format(url, e))
+                    notes = 'Could not read the page'
+                    content = None
+                else:
+                    if body.truncated:
+                        notes = join_notes(notes, body.note())
+        else:
+            # don't download what we're not going to parse
+            resp.close()
         headers = resp.headers
         status = resp.status_code
     finally:
-        return content, headers, status, notes
+        return content, headers, status, notes, final_url
+
+
+# path endings that are almost never HTML, for `fetch_url`'s head_first
+BINARY_EXTENSIONS = frozenset([
+    '7z', 'avi', 'bmp', 'bz2', 'dmg', 'doc', 'docx', 'exe', 'flac', 'flv',
+    'gif', 'gz', 'ico', 'iso', 'jpeg', 'jpg', 'm4a', 'm4v', 'mkv', 'mov',
+    'mp3', 'mp4', 'mpeg', 'mpg', 'ogg', 'otf', 'pdf', 'png', 'ppt', 'pptx',
+    'rar', 'svg', 'tar', 'tgz', 'tif', 'tiff', 'ttf', 'wav', 'webm', 'webp',
+    'wmv', 'woff', 'woff2', 'xls', 'xlsx', 'zip',
+])
+
+def looks_binary(url):
+    path = urlsplit(url).path
+    if '.' not in path.rsplit('/', 1)[-1]:
+        return False
+    return path.rsplit('.', 1)[-1].lower() in BINARY_EXTENSIONS
+
+
+def is_html(headers):
+    return 'text/html' in headers.get('content-type', '')
+
+
+class Body(object):
+    """
+    The body of a streamed response, one chunk at a time, stopping (and
+    closing the connection) once max_bytes have been read. truncated says
+    whether that happened. size is the bytes read so far and read_time the
+    seconds spent waiting on them (not whatever's done with each chunk).
+    """
+
+    def __init__(self, resp, max_bytes=None):
+        self.resp = resp
+        self.max_bytes = max_bytes
+        self.truncated = False
+        self.size = 0
+        self.read_time = 0.0
+
+    def __iter__(self):
+        left = self.max_bytes
+        chunks = self.resp.iter_content(CHUNK_SIZE)
+        while True:
+            start = time.time()
+            chunk = next(chunks, None)
+            self.read_time += time.time() - start
+            if chunk is None:
+                break
+            if left is not None:
+                if len(chunk) > left:
+                    chunk = chunk[:left]
+                    self.truncated = True
+                left -= len(chunk)
+            self.size += len(chunk)
+            yield chunk
+            if self.truncated:
+                self.resp.close()
+                break
+
+    def close(self):
+        self.resp.close()
+
+    def note(self):
+        return 'Page cut off at {} bytes'.format(self.max_bytes)
+
+
+def join_notes(*notes):
+    return '; '.join(n for n in notes if n) or None
 
 
 def parse_headers(headers):
@@ -54,6 +182,10 @@ def parse_headers(headers):
         'size': headers.get('content-length', '-1'),
         'x_robots': headers.get('x-robots-tag', '--')
     }
+    # validators, so a later crawl can ask if the page changed
+    for key, header in (('etag', 'etag'), ('last_modified', 'last-modified')):
+        if header in headers:
+            out[key] = headers[header]
     content_type = headers.get('content-type')
     if content_type is not None:
         out['content_type'] = content_type.split(';', 1)[0]
@@ -79,40 +211,62 @@ def parse_content(content, base_href=None):
     return rv
 
 
-def fetch_element_text(html, css):
+def parse_page(content, url=None, scope=None, extractor=None):
     """
-    Fetch the given elements specified by the css from html 
-    (an `Element` from lxml). Used for things like h1's, h2's, titles:
-    anything that we need text content from.
+    Parse a page's HTML and pull out everything the crawler cares about.
+    Returns a (links, data) tuple, or None if the page couldn't be parsed.
+    links is the set of absolute links on the page (resolved against url,
+    where the page came from) that scope says are part of the crawl. This
+    lives at module level so the parser pool can send it to worker
+    processes.
+    
+    scope is a `urls.Scope` or any callable taking a url, None keeps every
+    link. extractor is the `extract.Extractor` to use, `extract.extractor`
+    by default.
     """
-    rv = None
-    elements = html.cssselect(css)
-    if len(elements) == 1:
-        rv = elements[0].text_content()
-    elif len(elements) > 1:
-        rv = ';'.join([e.text_content().strip() 
-                                    for e in elements if e is not None])
-    return rv
+    parsed = parse_content(content)
+    if parsed is None:
+        return None
+    
+    if extractor is None:
+        extractor = default_extractor
+    try:
+        hrefs, out = extractor.extract(parsed, url)
+    except Exception as e:
+        logging.error('Could not extract page data: {}'.format(e))
+        return None
+    
+    return in_scope(hrefs, scope), out
 
 
-def fetch_element_att(html, css, attr):
+def stream_page(chunks, url=None, scope=None, extractor=None):
     """
-    Fetch the given elements specifed by the css selector from html
-    (an `Element` from lxml) and return the attribute (attr) of each.
+    Like `parse_page`, but feeds an iterable of HTML chunks (straight off
+    the response) through lxml's event parser instead of building a whole
+    document, so big pages don't need much memory. (libxml2's HTML push
+    parser does hang on to the raw page until it's done, so a page still
+    costs about three times its size, against fifteen times for the tree.)
     """
-    rv = None
-    elements = html.cssselect(css)
-    if len(elements) == 1:
-        rv = elements[0].get(attr)
-    elif len(elements) > 1:
-        rv = ';'.join([e.get(attr) for e in elements])
-    return rv
+    if extractor is None:
+        extractor = default_extractor
+    html_parser = etree.HTMLParser(target=extractor.target(url))
+    try:
+        for chunk in chunks:
+            html_parser.feed(chunk)
+        hrefs, out = html_parser.close()
+    except Exception as e:
+        logging.error('Could not stream page data: {}'.format(e))
+        return None
+    return in_scope(hrefs, scope), out
 
-def fetch_links(html):
+
+def in_scope(hrefs, scope=None):
     """
-    Fetch all links on a given page and return their hrefs in a list
+    The set of hrefs that scope says are part of the crawl (all of them if 
+    it's None).
     """
-    elements = html.cssselect('a')
-    return [e.get('href') for e in elements if e.get('href') is not None]
-    
-        
+    links = set()
+    for l in hrefs:
+        if scope is None or scope(l):
+            links.add(l)
+    return links
@@ -2,6 +2,42 @@ from collections import OrderedDict
 
 import wx.grid
 
+from .store import ColumnStore
+
+class URLTable(wx.grid.PyGridTableBase):
+    """
+    A virtual table for the grid: nothing is stored in wx cells, the grid
+    asks for the values of whatever rows are on screen and we look them up
+    in a `ColumnStore`.
+    """
+
+    def __init__(self, store, labels):
+        wx.grid.PyGridTableBase.__init__(self)
+        self.store = store
+        self.labels = labels
+
+    def GetNumberRows(self):
+        return len(self.store)
+
+    def GetNumberCols(self):
+        return len(self.labels)
+
+    def IsEmptyCell(self, row, col):
+        return not self.store.get(row, col)
+
+    def GetValue(self, row, col):
+        value = self.store.get(row, col)
+        if isinstance(value, unicode):
+            value = value.encode('ascii', 'ignore')
+        return value
+
+    def SetValue(self, row, col, value):
+        pass # read only
+
+    def GetColLabelValue(self, col):
+        return self.labels[col]
+
+
 class URLGrid(wx.grid.Grid):
     """
     The grid object (table) for displaying all the data about the URLs.
@@ -29,7 +65,10 @@ class URLGrid(wx.grid.Grid):
     def __init__(self, sizer, *args, **kwargs):
         wx.grid.Grid.__init__(self, *args, **kwargs)
         
-        self.CreateGrid(0, len(self.get_cols()))
+        cols = self.get_cols()
+        self.store = ColumnStore(cols.keys())
+        self.table = URLTable(self.store, [data[1] for data in cols.values()])
+        self.SetTable(self.table, True)
         self.SetDefaultColSize(50)
         self.EnableEditing(False)
         self.DefaultCellOverflow = False
@@ -38,8 +77,7 @@ class URLGrid(wx.grid.Grid):
         
         self.DefaultColumnLabelSize = 14
         self.SetRowLabelSize(0)
-        for key, data in self.get_cols().items():
-            self.SetColLabelValue(data[0], data[1])
+        for key, data in cols.items():
             self.SetColSize(data[0], data[2])
     
     @classmethod
@@ -49,3 +87,23 @@ class URLGrid(wx.grid.Grid):
     @classmethod
     def get_col_data(cls, col):
         return cls.column_map.get(col)
+    
+    def get_row(self, url):
+        return self.store.get_row(url)
+    
+    def apply_updates(self, updates):
+        """
+        Apply a batch of updates (url => dict of column key => value) in one
+        go. Rows are added for urls we haven't seen, and keys we don't have a
+        column for are ignored.
+        """
+        added = self.store.apply(updates)
+        self.BeginBatch()
+        try:
+            if added:
+                msg = wx.grid.GridTableMessage(self.table,
+                            wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED, added)
+                self.ProcessTableMessage(msg)
+            self.ForceRefresh()
+        finally:
+            self.EndBatch()
@@ -6,12 +6,15 @@ ID_LIST = wx.NewId()
 ID_DOCS = wx.NewId()
 ID_UPDATES = wx.NewId()
 ID_STOP_ABRUPT = wx.NewId()
+ID_RESUME = wx.NewId()
 
 class FileMenu(wx.Menu):
     def __init__(self):
         wx.Menu.__init__(self)
         
         self.new_crawl = self.Append(wx.ID_NEW, '&New', 'New Crawl')
+        self.resume = self.Append(ID_RESUME, 'Resume Crawl', 
+                    'Carry on with a crawl that was saved to a folder')
         #self.check_single = self.Append(wx.NewId(), 'Check Single', 
         #                                           'Check a single url')
         #self.check_list = self.Append(ID_LIST, 'Check List', 
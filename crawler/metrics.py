@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+from bisect import bisect_left
+from collections import deque
+import json
+from threading import Lock
+import time
+
+# histogram bucket edges in seconds: 10us, 20us ... about 5 minutes
+TIME_BUCKETS = tuple(0.00001 * 2 ** i for i in xrange(25))
+
+
+class Histogram(object):
+    """
+    Counts of values by bucket (values up to each of bounds, and one more
+    for anything bigger), plus the count, total, min and max, so the
+    percentiles we give back are only as exact as the buckets.
+    """
+
+    def __init__(self, bounds=TIME_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        """
+        Roughly the value p percent of values are under: find the bucket it
+        falls in and guess it's spread evenly through that.
+        """
+        if not self.count:
+            return None
+        wanted = self.count * p / 100.0
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= wanted:
+                low = max(self.bounds[i - 1] if i else 0.0, self.min)
+                high = min(self.bounds[i] if i < len(self.bounds) 
+                                                else self.max, self.max)
+                return low + (high - low) * (wanted - seen) / n
+            seen += n
+        return self.max
+
+    def summary(self):
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count, 'mean': self.total / self.count,
+                'min': self.min, 'max': self.max,
+                'p50': self.percentile(50), 'p90': self.percentile(90),
+                'p99': self.percentile(99)}
+
+
+class Metrics(object):
+    """
+    Numbers about a crawl as it runs, safe to update from any thread:
+    counters (incr), timings in seconds (observe, kept as `Histogram`s)
+    and gauges, functions called for their current value whenever we take
+    a snapshot (like queue sizes), so they cost nothing in between.
+
+    snapshot gives all of it as a dict that dumps straight to JSON, along
+    with pages a second overall and over the last few seconds.
+
+    Anything busy should save up its numbers and hand them to add in one
+    go, the lock is most of what an update costs.
+    """
+
+    def __init__(self, window=10.0):
+        self.start = time.time()
+        self.window = window
+        self.counters = {}
+        self.timings = {}
+        self.gauges = {}
+        # (time, pages) from recent snapshots, for the recent rate
+        self.marks = deque()
+        self.lock = Lock()
+
+    def incr(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Histogram()
+            timing.add(seconds)
+
+    def add(self, counters=(), timings=()):
+        """
+        A batch of incr and observe calls, as (name, n) and (name, seconds)
+        pairs, for one trip through the lock instead of one each.
+        """
+        with self.lock:
+            for name, n in counters:
+                self.counters[name] = self.counters.get(name, 0) + n
+            for name, seconds in timings:
+                timing = self.timings.get(name)
+                if timing is None:
+                    timing = self.timings[name] = Histogram()
+                timing.add(seconds)
+
+    def gauge(self, name, func):
+        self.gauges[name] = func
+
+    def snapshot(self):
+        now = time.time()
+        with self.lock:
+            counters = dict(self.counters)
+            timings = dict((name, timing.summary())
+                                for name, timing in self.timings.items())
+            pages = counters.get('pages', 0)
+            self.marks.append((now, pages))
+            marks = self.marks
+            while len(marks) > 2 and now - marks[1][0] >= self.window:
+                marks.popleft()
+            since, then = self.marks[0]
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception:
+                gauges[name] = None
+        elapsed = now - self.start
+        rate = pages / elapsed if elapsed else 0.0
+        # the first time there's nothing recent to go on
+        recent = (pages - then) / (now - since) if now > since else rate
+        return {
+            'elapsed': elapsed,
+            'pages': pages,
+            'pages_per_sec': rate,
+            'recent_pages_per_sec': recent,
+            'bytes': counters.get('bytes', 0),
+            'counters': counters,
+            'gauges': gauges,
+            'timings': timings,
+        }
+
+    def dump(self, path):
+        with open(path, 'wb') as f:
+            json.dump(self.snapshot(), f, indent=2, sort_keys=True)
+
+
+class NullMetrics(Metrics):
+    """
+    Takes everything and keeps none of it, for when you don't want metrics.
+    """
+
+    def incr(self, name, n=1):
+        pass
+
+    def observe(self, name, seconds):
+        pass
+
+    def add(self, counters=(), timings=()):
+        pass
+
+
+def describe(snapshot):
+    """
+    A one line summary of a snapshot, for the status bar or the log.
+    """
+    gauges = snapshot['gauges']
+    fetch = snapshot['timings'].get('ttfb', {}).get('p50')
+    parts = ['{:.1f} pages/s'.format(snapshot['recent_pages_per_sec']),
+        '{} pages'.format(snapshot['pages']),
+        '{:.1f}MB'.format(snapshot['bytes'] / (1024.0 * 1024.0))]
+    if fetch is not None:
+        parts.append('fetch p50 {:.0f}ms'.format(fetch * 1000))
+    parts.append('queues: urls {} content {} signals {}'.format(
+                    gauges.get('url_queue'), gauges.get('content_queue'),
+                    gauges.get('signal_queue')))
+    return ' | '.join(parts)
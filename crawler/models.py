@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import Integer, Column, ForeignKey, String, Text
+from sqlalchemy import Integer, Column, ForeignKey, Index, String, Text
 from sqlalchemy.orm import relationship, backref
 from sqlalchemy.ext.declarative import declarative_base
 
@@ -9,7 +9,7 @@ class URL(base):
     __tablename__ = 'urls'
     
     id = Column(Integer, primary_key=True)
-    url = Column(String(255), unique=True)
+    url = Column(String(255), unique=True, index=True)
     
     def __init__(self, url):
         self.url = url
@@ -26,6 +26,9 @@ class URLData(base):
     data_key = Column(String(255))
     data_value = Column(Text)
     
+    __table_args__ = (Index('ix_url_data_url_id_data_key', 'url_id', 
+                                                            'data_key'),)
+    
     def __init__(self, url_id, key, value):
         self.url_id = url_id
         self.data_key = key
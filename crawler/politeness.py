@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+from contextlib import contextmanager
+from email.utils import mktime_tz, parsedate_tz
+from threading import Condition
+import time
+from urlparse import urlsplit
+
+# responses that mean the server wants us to slow down, these get retried
+SLOW_DOWN = (429, 503)
+
+def parse_retry_after(value):
+    """
+    Seconds to wait from a Retry-After header, which is either a number of
+    seconds or an HTTP date. None if it's missing or makes no sense.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return max(0.0, mktime_tz(parsed) - time.time())
+
+
+class HostState(object):
+    """
+    What the scheduler knows about one host.
+    """
+    __slots__ = ('in_flight', 'next_time', 'not_before', 'backoff',
+                    'backed_off', 'crawl_delay', 'latency', 'fastest',
+                    'errors')
+
+    def __init__(self):
+        self.in_flight = 0
+        # when the next request may start, by rate and by Retry-After
+        self.next_time = 0.0
+        self.not_before = 0.0
+        # extra seconds between requests while the host is struggling
+        self.backoff = 0.0
+        # when it last went up
+        self.backed_off = 0.0
+        self.crawl_delay = 0.0
+        # moving average and best response times
+        self.latency = None
+        self.fastest = None
+        self.errors = 0
+
+
+class Ticket(object):
+    """
+    Handed out by `Scheduler.hold`, tell it how the request went with done.
+    """
+
+    def __init__(self, scheduler, url, state):
+        self.scheduler = scheduler
+        self.url = url
+        self.state = state
+        self.start = time.time()
+
+    def done(self, status, headers=None):
+        """
+        Report the response status (None if the request failed) and
+        headers. Returns True if the url should be tried again later.
+        """
+        return self.scheduler.feedback(self, status, headers,
+                                                    time.time() - self.start)
+
+
+class Scheduler(object):
+    """
+    Sits between the url queue and the fetchers and keeps us polite: no
+    more than per_host requests in flight to a host at once, and at most
+    rate requests a second to it (None for no limit). Crawl-delay from
+    robots.txt is honored too (see set_crawl_delay). hold waits for the
+    host, try_hold says how long it would have to instead (busy_wait
+    seconds, when it's only waiting for a request to finish).
+
+    It also backs off by itself. Errors, 429s and 503s, or responses
+    getting a lot slower than the fastest we've seen (slow_factor times),
+    double the extra delay between requests to that host, starting at
+    min_backoff and up to max_backoff seconds. Healthy responses halve it
+    again. A Retry-After header pauses the host for as long as it says (up
+    to max_retry_after), and 429s and 503s are retried up to retries times.
+    """
+
+    def __init__(self, rate=None, per_host=10, min_backoff=0.25,
+                        max_backoff=30.0, slow_factor=4.0,
+                        max_retry_after=300.0, retries=3, busy_wait=0.05):
+        self.rate = rate
+        self.per_host = per_host
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.slow_factor = slow_factor
+        self.max_retry_after = max_retry_after
+        self.retries = retries
+        self.busy_wait = busy_wait
+        self.hosts = {}
+        self.attempts = {}
+        self.cond = Condition()
+
+    def get_host(self, url):
+        # call with the lock held
+        host = urlsplit(url).netloc.lower()
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState()
+        return state
+
+    def set_crawl_delay(self, host, delay):
+        with self.cond:
+            self.get_host('//' + host).crawl_delay = delay
+
+    def interval(self, state):
+        # seconds between request starts for a host
+        base = 1.0 / self.rate if self.rate else 0.0
+        return max(base, state.crawl_delay) + state.backoff
+
+    @contextmanager
+    def hold(self, url):
+        """
+        Block until url's host can take another request, and count it as
+        in flight for the duration of the with block. Gives a `Ticket`.
+        """
+        with self.cond:
+            state = self.get_host(url)
+            while True:
+                if state.in_flight >= self.per_host:
+                    self.cond.wait()
+                    continue
+                now = time.time()
+                wait = max(state.next_time, state.not_before) - now
+                if wait <= 0:
+                    break
+                # sleep without the lock (Condition.wait's timeout polls)
+                self.cond.release()
+                try:
+                    time.sleep(wait)
+                finally:
+                    self.cond.acquire()
+            self.take(state, now)
+        ticket = Ticket(self, url, state)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def try_hold(self, url):
+        """
+        hold without the waiting: (`Ticket`, 0) if url's host can take
+        another request right now, otherwise (None, seconds until it's
+        worth asking again). Give the ticket back with release once the
+        request is done.
+        """
+        with self.cond:
+            state = self.get_host(url)
+            if state.in_flight >= self.per_host:
+                # no telling when one of them will finish
+                return None, self.busy_wait
+            now = time.time()
+            wait = max(state.next_time, state.not_before) - now
+            if wait > 0:
+                return None, wait
+            self.take(state, now)
+        return Ticket(self, url, state), 0
+
+    def take(self, state, now):
+        # call with the lock held
+        state.in_flight += 1
+        state.next_time = max(now, state.next_time) + self.interval(state)
+
+    def release(self, ticket):
+        with self.cond:
+            ticket.state.in_flight -= 1
+            self.cond.notify_all()
+
+    def feedback(self, ticket, status, headers, elapsed):
+        state = ticket.state
+        with self.cond:
+            if status is None or status >= 500 or status in SLOW_DOWN:
+                state.errors += 1
+                self.back_off(state, ticket)
+                if status in SLOW_DOWN:
+                    retry_after = None
+                    if headers is not None:
+                        retry_after = parse_retry_after(
+                                                headers.get('retry-after'))
+                    if retry_after is not None:
+                        retry_after = min(retry_after, self.max_retry_after)
+                        state.not_before = max(state.not_before,
+                                                    time.time() + retry_after)
+                    attempts = self.attempts.get(ticket.url, 0) + 1
+                    if attempts <= self.retries:
+                        self.attempts[ticket.url] = attempts
+                        return True
+            else:
+                if state.latency is None:
+                    state.latency = elapsed
+                else:
+                    state.latency = 0.8 * state.latency + 0.2 * elapsed
+                if state.fastest is None or elapsed < state.fastest:
+                    state.fastest = elapsed
+                if state.latency > self.slow_factor * max(state.fastest, 0.01):
+                    self.back_off(state, ticket)
+                else:
+                    state.backoff /= 2
+                    if state.backoff < self.min_backoff / 4:
+                        state.backoff = 0.0
+            self.attempts.pop(ticket.url, None)
+            return False
+
+    def back_off(self, state, ticket):
+        # requests that were already in flight when we last backed off
+        # tell us nothing new, don't let a burst of them compound
+        if ticket.start < state.backed_off:
+            return
+        state.backoff = min(self.max_backoff,
+                                max(self.min_backoff, state.backoff * 2))
+        state.backed_off = time.time()
@@ -1,15 +1,132 @@
 # -*- coding: utf-8 -*-
+from collections import deque
 from Queue import Queue
+from tempfile import TemporaryFile
+
+from .seen import FingerprintSet
+
+# Put onto a worker's queue to wake it up and tell it to exit.
+STOP = object()
+
 
 class URLQueue(Queue):
-    def __init__(self):
-        Queue.__init__(self)
-        self.urls = set()
+    """
+    A FIFO queue of urls that only takes any url once. At most hot_size
+    pending urls are kept in memory; once that fills up new urls go to an
+    append-only segment file (in spill_dir, or the system temp dir) and are
+    read back in order as the queue drains. Anything that's not a url (like
+    STOP) always goes after every url.
     
+    seen is what remembers the urls we've already had, anything with an
+    add(url) that returns True for new urls. A `seen.FingerprintSet` by
+    default, or a `seen.BloomFilter` for huge crawls.
+    """
+
+    def __init__(self, hot_size=10000, spill_dir=None, seen=None):
+        self.hot_size = hot_size
+        self.spill_dir = spill_dir
+        Queue.__init__(self)
+        if seen is None:
+            seen = FingerprintSet()
+        self.urls = seen
+
     def add_url(self, url):
-        if url not in self.urls:
+        if self.urls.add(url):
             self.put(url)
-            self.urls.add(url)
             return True
         else:
             return False
+
+    def mark_seen(self, url):
+        """
+        Remember url as seen without queueing it.
+        """
+        return self.urls.add(url)
+
+    def clear(self):
+        """
+        Drop every pending url (but still remember the ones we've seen).
+        """
+        with self.mutex:
+            self.queue.clear()
+            self.tail.clear()
+            self.reset_spill()
+
+    def close(self):
+        with self.mutex:
+            if self.spill is not None:
+                self.spill.close()
+                self.spill = None
+            self.spilled = 0
+
+    # Queue hooks, these are all called with self.mutex held
+
+    def _init(self, maxsize):
+        self.queue = deque()
+        self.tail = deque()
+        self.spill = None
+        self.spilled = 0
+        self.read_pos = 0
+        # is the spill file positioned at its end, ready to append?
+        self.appending = False
+
+    def _qsize(self, len=len):
+        return len(self.queue) + self.spilled + len(self.tail)
+
+    def _put(self, item):
+        if not isinstance(item, basestring):
+            self.tail.append(item)
+        elif self.spilled or len(self.queue) >= self.hot_size:
+            self.spill_url(item)
+        else:
+            self.queue.append(item)
+
+    def _get(self):
+        if not self.queue and self.spilled:
+            self.refill()
+        if self.queue:
+            return self.queue.popleft()
+        return self.tail.popleft()
+
+    def spill_url(self, url):
+        if self.spill is None:
+            self.spill = TemporaryFile(dir=self.spill_dir)
+        # each line starts with u or b, so urls come back the type they went
+        # in as
+        if isinstance(url, unicode):
+            line = 'u' + url.encode('utf-8')
+        else:
+            line = 'b' + url
+        line = line.replace('\r', '%0D').replace('\n', '%0A')
+        if not self.appending:
+            self.spill.seek(0, 2)
+            self.appending = True
+        self.spill.write(line + '\n')
+        self.spilled += 1
+
+    def refill(self):
+        """
+        Read the next batch of spilled urls back into memory.
+        """
+        self.spill.flush()
+        self.spill.seek(self.read_pos)
+        for i in xrange(0, min(self.hot_size, self.spilled)):
+            line = self.spill.readline()
+            if 'u' == line[0]:
+                self.queue.append(line[1:-1].decode('utf-8'))
+            else:
+                self.queue.append(line[1:-1])
+            self.spilled -= 1
+        self.read_pos = self.spill.tell()
+        self.appending = False
+        if not self.spilled:
+            self.reset_spill()
+
+    def reset_spill(self):
+        # everything on disk has been read (or dropped), start over
+        if self.spill is not None:
+            self.spill.seek(0)
+            self.spill.truncate()
+        self.appending = False
+        self.spilled = 0
+        self.read_pos = 0
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from hashlib import sha1
+
+# what the fetcher found out about a url we'd crawled before
+NOT_MODIFIED = 'not_modified' # the server said 304
+UNCHANGED = 'unchanged' # we downloaded it, but it hashed the same
+CHANGED = 'changed'
+
+def content_hash(content):
+    return sha1(content).hexdigest()
+
+
+def hash_chunks(chunks, digest):
+    """
+    Pass chunks straight through, adding each to digest (a hashlib object)
+    on the way.
+    """
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def split_links(links):
+    if not links:
+        return []
+    return links.split('\n')
+
+
+def join_links(links):
+    return '\n'.join(sorted(links))
+
+
+class PreviousCrawl(object):
+    """
+    What we found last time we crawled a site: url => the row we saved for
+    it. Rows from crawls run with links recorded have the page's `etag`,
+    `last_modified`, `hash` (of the body) and `links` (newline separated)
+    along with the usual columns, which is what lets the fetcher ask the
+    server whether anything changed and skip pages that didn't.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = dict(rows)
+
+    @classmethod
+    def from_database(cls, engine):
+        # sqlalchemy's only needed if there's a database
+        from .database import read_rows
+        return cls(read_rows(engine))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get(self, url):
+        return self.rows.get(url)
+
+    def headers(self, row):
+        """
+        The conditional request headers for a url whose previous row is row.
+        """
+        headers = {}
+        if row.get('etag'):
+            headers['If-None-Match'] = row['etag'].encode('utf-8')
+        if row.get('last_modified'):
+            headers['If-Modified-Since'] = row['last_modified'].encode('utf-8')
+        return headers
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+import socket
+from socket import timeout as SocketTimeout
+from threading import Event, Lock, local
+import time
+
+from requests.adapters import DEFAULT_POOLBLOCK, HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.poolmanager import PoolManager
+from urllib3.util import connection
+
+# how long lookups are kept. getaddrinfo doesn't tell us the records' own
+# TTLs so these stand in for them.
+DNS_TTL = 5 * 60.0
+NEGATIVE_TTL = 30.0
+
+class DNSCache(object):
+    """
+    getaddrinfo results by host and port, shared by every fetcher. Answers
+    are kept for ttl seconds and failed lookups (the host doesn't exist,
+    say) for negative_ttl, with the least recently used thrown out past
+    max_size. When a bunch of fetchers want the same host at once only one
+    of them asks the resolver, the rest wait for its answer.
+
+    hits, misses and negative_hits (failures answered from the cache)
+    count how it's doing.
+    """
+
+    def __init__(self, ttl=DNS_TTL, negative_ttl=NEGATIVE_TTL, max_size=10000,
+                                                resolve=socket.getaddrinfo):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.resolve = resolve
+        # key => (addresses or the error, expires)
+        self.entries = OrderedDict()
+        # key => Event, for lookups somebody's already doing
+        self.lookups = {}
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'negative_hits': self.negative_hits, 'size': len(self)}
+
+    def getaddrinfo(self, host, port, family=0, socktype=0, proto=0,
+                                                                flags=0):
+        """
+        Same as `socket.getaddrinfo`, but cached.
+        """
+        key = (host, port, family, socktype, proto, flags)
+        while True:
+            with self.lock:
+                entry = self.entries.pop(key, None)
+                if entry is not None and entry[1] >= time.time():
+                    self.entries[key] = entry
+                    result = entry[0]
+                    if isinstance(result, Exception):
+                        self.negative_hits += 1
+                        raise result
+                    self.hits += 1
+                    return result
+                lookup = self.lookups.get(key)
+                if lookup is None:
+                    lookup = self.lookups[key] = Event()
+                    self.misses += 1
+                    break
+            # someone else is on it, then go again with what they found
+            lookup.wait()
+        try:
+            result = self.resolve(host, port, family, socktype, proto, flags)
+        except socket.gaierror as e:
+            self.store(key, e, self.negative_ttl)
+            raise
+        except Exception:
+            self.store(key, None, 0)
+            raise
+        self.store(key, result, self.ttl)
+        return result
+
+    def store(self, key, result, ttl):
+        with self.lock:
+            if ttl > 0 and result is not None:
+                self.entries[key] = (result, time.time() + ttl)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+            self.lookups.pop(key).set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# how long the last connection this thread opened took, see pop_timings
+_timings = local()
+
+def create_connection(cache, address, *args, **kwargs):
+    """
+    urllib3's create_connection, but looking the host up in cache (a
+    `DNSCache`) and connecting to the first address that works. urllib3
+    doesn't need to resolve an IP address, so the lookup's all ours.
+    """
+    host, port = address
+    if host.startswith('['):
+        host = host.strip('[]')
+    error = None
+    start = time.time()
+    addresses = cache.getaddrinfo(host, port, 
+                        connection.allowed_gai_family(), socket.SOCK_STREAM)
+    _timings.dns = time.time() - start
+    for family, socktype, proto, canonname, sockaddr in addresses:
+        start = time.time()
+        try:
+            sock = connection.create_connection(sockaddr[:2], *args, **kwargs)
+        except socket.error as e:
+            error = e
+        else:
+            _timings.connect = time.time() - start
+            return sock
+    if error is not None:
+        raise error
+    raise socket.error('getaddrinfo returns an empty list')
+
+
+class CachedConnectionMixin(object):
+    """
+    Opens its socket with create_connection through dns_cache (set by the
+    pool that makes it), otherwise it's urllib3's connection as is.
+    """
+    dns_cache = None
+
+    def _new_conn(self):
+        if self.dns_cache is None:
+            return super(CachedConnectionMixin, self)._new_conn()
+        extra_kw = {}
+        if self.source_address:
+            extra_kw['source_address'] = self.source_address
+        if self.socket_options:
+            extra_kw['socket_options'] = self.socket_options
+        try:
+            return create_connection(self.dns_cache,
+                    (self._dns_host, self.port), self.timeout, **extra_kw)
+        except SocketTimeout:
+            raise ConnectTimeoutError(self, 'Connection to {} timed out. '
+                    '(connect timeout={})'.format(self.host, self.timeout))
+        except socket.error as e:
+            raise NewConnectionError(self,
+                            'Failed to establish a new connection: {}'.format(e))
+
+
+class CachedHTTPConnection(CachedConnectionMixin, HTTPConnection):
+    pass
+
+
+class CachedHTTPSConnection(CachedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class CachedPoolMixin(object):
+    # hands the pool's dns_cache to every connection it makes
+    dns_cache = None
+
+    def _new_conn(self):
+        conn = super(CachedPoolMixin, self)._new_conn()
+        conn.dns_cache = self.dns_cache
+        return conn
+
+
+class CachedHTTPConnectionPool(CachedPoolMixin, HTTPConnectionPool):
+    ConnectionCls = CachedHTTPConnection
+
+
+class CachedHTTPSConnectionPool(CachedPoolMixin, HTTPSConnectionPool):
+    ConnectionCls = CachedHTTPSConnection
+
+
+class CachedPoolManager(PoolManager):
+    """
+    A PoolManager whose pools connect through dns_cache.
+    """
+
+    def __init__(self, dns_cache, *args, **kwargs):
+        PoolManager.__init__(self, *args, **kwargs)
+        self.dns_cache = dns_cache
+        self.pool_classes_by_scheme = {'http': CachedHTTPConnectionPool,
+                                        'https': CachedHTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = PoolManager._new_pool(self, scheme, host, port, 
+                                                        request_context)
+        pool.dns_cache = self.dns_cache
+        return pool
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    """
+    An HTTPAdapter that looks hosts up through dns_cache, a `DNSCache`.
+    It only affects the sessions it's mounted on, so two crawls can each
+    have their own cache (or none). Connections through a proxy look the
+    proxy up the usual way.
+    """
+
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=DEFAULT_POOLBLOCK,
+                                                            **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = CachedPoolManager(self.dns_cache,
+                    num_pools=connections, maxsize=maxsize, block=block,
+                    strict=True, **pool_kwargs)
+
+
+def pop_timings():
+    """
+    (seconds looking up the host, seconds connecting) for the last new
+    connection the current thread made through the cache since we last
+    asked, or (None, None). Connections that were kept alive don't count.
+    """
+    dns = getattr(_timings, 'dns', None)
+    connect = getattr(_timings, 'connect', None)
+    _timings.dns = _timings.connect = None
+    return dns, connect
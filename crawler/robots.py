@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+import logging
+import re
+from threading import Lock, Thread
+import time
+from urlparse import urlsplit
+
+from requests.exceptions import RequestException
+
+from .queues import STOP
+
+# our product token, what we look for in User-agent lines
+AGENT = 'PyCrawl'
+
+# only this much of a robots.txt is read, like the big search engines do
+MAX_ROBOTS_BYTES = 500 * 1024
+
+# crawl-delays longer than this are treated as this
+MAX_CRAWL_DELAY = 60.0
+
+def robots_key(url):
+    """
+    The scheme and host a url's robots.txt belongs to.
+    """
+    parts = urlsplit(url)
+    return '{}://{}'.format(parts.scheme.lower(), parts.netloc.lower())
+
+
+# python's re won't do more than 100 groups in one pattern
+MAX_GROUPS = 99
+
+def pattern_regex(pattern):
+    """
+    The regex source for a robots.txt path pattern with `*` wildcards and
+    maybe a `$` on the end.
+    """
+    end = pattern.endswith('$')
+    if end:
+        pattern = pattern[:-1]
+    regex = '.*?'.join(re.escape(part) for part in pattern.split('*'))
+    if end:
+        regex += r'\Z'
+    return regex
+
+
+class Rules(object):
+    """
+    The compiled rules from one group of a robots.txt. allowed takes a url
+    (or its path and query) and applies the longest matching rule, with
+    Allow winning ties, same as Google.
+
+    Rules are filed by their literal prefix (everything before the first
+    `*`), which the path has to start with for the rule to match at all,
+    so a check only looks at the rules under the path's own prefixes. All
+    of those are either the plain prefix itself, or patterns with `*` or
+    `$` that are at least as long. The patterns are compiled into one
+    regex, best first, so the alternative that matches is the one to use.
+    """
+
+    def __init__(self, rules=(), crawl_delay=None, sitemaps=()):
+        buckets = {}
+        for allow, pattern in rules:
+            prefix = pattern.split('*', 1)[0].rstrip('$')
+            buckets.setdefault(prefix, set()).add((len(pattern), allow,
+                                                                pattern))
+        # literal prefix => (longest rule, [(regex, [(length, allow)])],
+        # (length, allow) of the plain prefix rule or None)
+        self.index = {}
+        for prefix, bucket in buckets.items():
+            plain = None
+            patterns = []
+            for length, allow, pattern in sorted(bucket, reverse=True):
+                if pattern == prefix:
+                    if plain is None:
+                        plain = (length, allow)
+                else:
+                    patterns.append((length, allow, pattern))
+            regexes = []
+            for k in xrange(0, len(patterns), MAX_GROUPS):
+                chunk = patterns[k:k + MAX_GROUPS]
+                regex = re.compile('|'.join('({})'.format(pattern_regex(p))
+                                                    for l, a, p in chunk))
+                regexes.append((regex, [(l, a) for l, a, p in chunk]))
+            longest = max(length for length, allow, pattern in bucket)
+            self.index[prefix] = (longest, regexes, plain)
+        # the prefix lengths worth trying, longest first
+        self.lengths = sorted(set(len(p) for p in self.index), reverse=True)
+        self.count = len(rules)
+        self.crawl_delay = crawl_delay
+        self.sitemaps = list(sitemaps)
+
+    def __len__(self):
+        return self.count
+
+    def allowed(self, url):
+        if not url.startswith('/'):
+            parts = urlsplit(url)
+            url = parts.path or '/'
+            if parts.query:
+                url += '?' + parts.query
+        best = (0, True)
+        index = self.index
+        size = len(url)
+        for length in self.lengths:
+            if length > size:
+                continue
+            bucket = index.get(url[:length])
+            if bucket is None or bucket[0] < best[0]:
+                continue
+            longest, regexes, plain = bucket
+            for regex, rules in regexes:
+                match = regex.match(url)
+                if match is not None:
+                    rule = rules[match.lastindex - 1]
+                    if rule > best:
+                        best = rule
+                    break
+            if plain is not None and plain > best:
+                best = plain
+        return best[1]
+
+
+# for hosts with no robots.txt, and ones that won't let us see it
+ALLOW_ALL = Rules()
+DISALLOW_ALL = Rules([(False, '/')])
+
+
+def parse_robots(text, agent=AGENT):
+    """
+    Compile the rules in a robots.txt that apply to agent: the group(s)
+    with the longest User-agent that agent starts with, or the `*` ones if
+    there aren't any.
+    """
+    agent = agent.lower()
+    # user-agent => [rules], [crawl delays]
+    groups = {}
+    current = []
+    in_rules = False
+    sitemaps = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        if ':' not in line:
+            continue
+        field, value = line.split(':', 1)
+        field = field.strip().lower()
+        value = value.strip()
+        if 'user-agent' == field:
+            if in_rules:
+                current = []
+                in_rules = False
+            value = value.lower()
+            current.append(groups.setdefault(value, ([], [])))
+        elif field in ('allow', 'disallow'):
+            in_rules = True
+            # an empty Disallow means everything's allowed
+            if value:
+                for rules, delays in current:
+                    rules.append(('allow' == field, value))
+        elif 'crawl-delay' == field:
+            in_rules = True
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            for rules, delays in current:
+                delays.append(delay)
+        elif 'sitemap' == field:
+            # as written, these can be relative or not urls at all. whoever
+            # uses them has to resolve them against the robots.txt url.
+            sitemaps.append(value)
+
+    best = None
+    for name in groups:
+        if '*' != name and agent.startswith(name):
+            if best is None or len(name) > len(best):
+                best = name
+    if best is None:
+        best = '*'
+    rules, delays = groups.get(best, ([], []))
+    delay = min(delays[0], MAX_CRAWL_DELAY) if delays else None
+    return Rules(rules, delay, sitemaps)
+
+
+def fetch_robots(key, session, timeout=None, agent=AGENT):
+    """
+    Fetch and compile the robots.txt for key (see `robots_key`). Like the
+    standard library's robotparser, a 401 or 403 means we can't crawl
+    anything there, and any other error means there are no rules.
+    """
+    url = key + '/robots.txt'
+    try:
+        resp = session.get(url, timeout=timeout, stream=True,
+                            headers={'User-Agent': 'PyCrawl 0.1'})
+    except (RequestException, Exception) as e:
+        logging.error('Could not fetch {}: {}'.format(url, e))
+        return ALLOW_ALL
+    try:
+        if resp.status_code in (401, 403):
+            return DISALLOW_ALL
+        if resp.status_code >= 400:
+            return ALLOW_ALL
+        text = resp.raw.read(MAX_ROBOTS_BYTES, decode_content=True)
+    except (RequestException, Exception) as e:
+        logging.error('Could not read {}: {}'.format(url, e))
+        return ALLOW_ALL
+    finally:
+        resp.close()
+    return parse_robots(text.decode('utf-8', 'replace'), agent)
+
+
+class RobotsCache(object):
+    """
+    Compiled robots.txt rules by scheme and host, each kept for ttl seconds
+    and at most max_size hosts at a time (the least recently used go
+    first). get returns None for hosts we don't have, or whose rules have
+    expired, so the caller knows to fetch them again.
+    """
+
+    def __init__(self, ttl=24 * 60 * 60, max_size=1000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            rules, expires = entry
+            if expires < time.time():
+                return None
+            self.entries[key] = entry
+            return rules
+
+    def set(self, key, rules):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (rules, time.time() + self.ttl)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+class RobotsFetcher(Thread):
+    """
+    Fetches robots.txt files off the dispatcher's thread: put a key (see
+    `robots_key`) on hosts and it sends ('robots', (key, rules)) back.
+    """
+    name = 'robots'
+    daemon = True
+
+    def __init__(self, hosts, signal_queue, sessions):
+        Thread.__init__(self)
+        self.hosts = hosts
+        self.signal = signal_queue
+        self.sessions = sessions
+
+    def run(self):
+        while True:
+            key = self.hosts.get()
+            try:
+                if key is STOP:
+                    break
+                rules = fetch_robots(key, self.sessions.get(key),
+                                                    self.sessions.timeout)
+                self.signal.put(('robots', (key, rules)))
+            finally:
+                self.hosts.task_done()
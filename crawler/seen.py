@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+from array import array
+from hashlib import md5
+import math
+import struct
+
+# signed C longs: 64 bits on most 64 bit platforms, 32 on windows.
+_TYPECODE = 'l'
+_BITS = array(_TYPECODE).itemsize * 8
+
+
+def fingerprint(url, bits=64):
+    """
+    A signed integer hash of url, bits wide, which takes a lot less memory
+    to keep around than the url itself.
+    """
+    if isinstance(url, unicode):
+        url = url.encode('utf-8')
+    fp = struct.unpack('<q', md5(url).digest()[:8])[0]
+    if bits < 64:
+        fp >>= 64 - bits
+    return fp
+
+
+class FingerprintSet(object):
+    """
+    The set of urls we've seen, stored as fingerprints in an open addressed
+    hash table on top of a flat array. That's 16-32 bytes a url, where a
+    set of strings runs to a few hundred.
+
+    Two urls with the same 64 bit fingerprint count as one, which for any
+    crawl we're likely to run won't happen.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        size = 8
+        while size < capacity * 2:
+            size <<= 1
+        self.table = array(_TYPECODE, [0]) * size
+        self.mask = size - 1
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, url):
+        fp = fingerprint(url, _BITS) or 1
+        table = self.table
+        mask = self.mask
+        i = fp & mask
+        while True:
+            slot = table[i]
+            if 0 == slot:
+                return False
+            if slot == fp:
+                return True
+            i = (i + 1) & mask
+
+    @property
+    def nbytes(self):
+        return self.table.itemsize * len(self.table)
+
+    def add(self, url):
+        """
+        Add url, returns True if we hadn't seen it before.
+        """
+        # 0 marks an empty slot
+        return self.add_fingerprint(fingerprint(url, _BITS) or 1)
+
+    def add_fingerprint(self, fp):
+        table = self.table
+        mask = self.mask
+        i = fp & mask
+        while True:
+            slot = table[i]
+            if 0 == slot:
+                break
+            if slot == fp:
+                return False
+            i = (i + 1) & mask
+        table[i] = fp
+        self.count += 1
+        if self.count * 2 > len(table):
+            self.grow()
+        return True
+
+    def grow(self):
+        old = self.table
+        self.table = array(_TYPECODE, [0]) * (len(old) * 2)
+        self.mask = len(self.table) - 1
+        self.count = 0
+        for fp in old:
+            if fp:
+                self.add_fingerprint(fp)
+
+
+class BloomFilter(object):
+    """
+    A probabilistic seen set for really big crawls: a fixed size bit array
+    that answers "seen it" wrongly for about error_rate of new urls once
+    capacity urls have been added (and more often after that). A url that
+    gets a false positive is never crawled, in exchange the memory used is
+    about 1.8 bytes a url at a 0.1% error rate.
+    """
+
+    def __init__(self, capacity=10000000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        bits = int(math.ceil(-capacity * math.log(error_rate) /
+                                                    (math.log(2) ** 2)))
+        self.size = max(bits, 8)
+        self.hashes = max(1, int(round(self.size / float(capacity) *
+                                                            math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, url):
+        bits = self.bits
+        for i in self.positions(url):
+            if not bits[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+    def positions(self, url):
+        # double hashing, both halves of the md5
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+        h1, h2 = struct.unpack('<QQ', md5(url).digest())
+        size = self.size
+        return [(h1 + i * h2) % size for i in xrange(0, self.hashes)]
+
+    def add(self, url):
+        """
+        Add url, returns True if it (probably) wasn't there already.
+        """
+        bits = self.bits
+        new = False
+        for i in self.positions(url):
+            byte = i >> 3
+            mask = 1 << (i & 7)
+            if not bits[byte] & mask:
+                bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
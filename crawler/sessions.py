@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from threading import Lock
+from urlparse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .resolver import CachedDNSAdapter
+
+class SessionPool(object):
+    """
+    Hands out one `requests.Session` per host so fetchers share a pool of
+    keep-alive connections rather than opening a new one for every url.
+    The dispatcher owns the pool and passes it to each fetcher.
+    
+    With a dns_cache (a `resolver.DNSCache`) hosts are looked up through it
+    instead of asking the system resolver for every new connection.
+    """
+
+    def __init__(self, pool_size=5, keep_alive=True, connect_timeout=10.0,
+                                        read_timeout=30.0, dns_cache=None):
+        self.pool_size = pool_size
+        self.dns_cache = dns_cache
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.sessions = {}
+        self.lock = Lock()
+
+    def get(self, url):
+        """
+        Get the session for url's scheme and host, creating it if need be.
+        """
+        parts = urlsplit(url)
+        key = (parts.scheme.lower(), parts.netloc.lower())
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = self.make_session()
+        return session
+
+    def make_session(self):
+        session = requests.Session()
+        # one host per session, so we only need one connection pool
+        # that's big enough for every fetcher.
+        kwargs = dict(pool_connections=1, pool_maxsize=self.pool_size,
+                        max_retries=0)
+        if self.dns_cache is not None:
+            adapter = CachedDNSAdapter(self.dns_cache, **kwargs)
+        else:
+            adapter = HTTPAdapter(**kwargs)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        return session
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+class Sink(object):
+    """
+    Where the dispatcher sends what it finds out during a crawl. updates
+    gets batches of partial data as it comes in (an ordered dict of url =>
+    dict of column => value, empty for new urls) and row gets everything we
+    know about a url once it's completely done. Subclasses override
+    whichever they care about.
+    """
+
+    def updates(self, updates):
+        pass
+
+    def row(self, url, data):
+        pass
+
+    def close(self):
+        pass
+
+
+class TeeSink(Sink):
+    """
+    Sends everything on to each of several sinks.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def updates(self, updates):
+        for sink in self.sinks:
+            sink.updates(updates)
+
+    def row(self, url, data):
+        for sink in self.sinks:
+            sink.row(url, data)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+class WriterSink(Sink):
+    """
+    Writes each finished row with an `exporters.Exporter` as soon as the
+    url is done.
+    """
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def row(self, url, data):
+        data = dict(data, url=url)
+        self.exporter.write([data.get(c, '') for c in self.exporter.columns])
+        self.exporter.stream.flush()
+
+    def close(self):
+        self.exporter.close()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+import logging
+import os
+from threading import Condition, Thread
+import time
+import zlib
+
+from lxml import etree
+import requests
+from requests.exceptions import RequestException
+
+from .functions import CHUNK_SIZE
+from .queues import STOP
+
+# what a <loc> in a sitemap points at
+PAGE = 'page'
+SITEMAP = 'sitemap' # another sitemap, from a sitemap index
+
+# the protocol says 50MB, leave some room but don't let a gzip bomb in
+MAX_SITEMAP_BYTES = 200 * 1024 * 1024
+
+GZIP_MAGIC = '\x1f\x8b'
+
+def gunzip_chunks(chunks, max_bytes=MAX_SITEMAP_BYTES):
+    """
+    Pass chunks through, decompressing them on the way if they turn out to
+    be gzipped (going by the first couple of bytes, servers are all over
+    the place with the headers for .xml.gz files). Stops after max_bytes
+    of output either way.
+    """
+    chunks = iter(chunks)
+    first = ''
+    for chunk in chunks:
+        first += chunk
+        if len(first) >= len(GZIP_MAGIC):
+            break
+    left = max_bytes
+    if not first.startswith(GZIP_MAGIC):
+        for chunk in _chain(first, chunks):
+            if len(chunk) > left:
+                yield chunk[:left]
+                logging.warning('Sitemap cut off at {} bytes'.format(
+                                                                max_bytes))
+                return
+            left -= len(chunk)
+            yield chunk
+        return
+    # 16 + MAX_WBITS means expect the gzip header
+    gunzip = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in _chain(first, chunks):
+        while chunk:
+            # a bit at a time, a tiny chunk can inflate to a lot
+            out = gunzip.decompress(chunk, CHUNK_SIZE * 4)
+            chunk = gunzip.unconsumed_tail
+            left -= len(out)
+            if left < 0:
+                logging.warning('Sitemap cut off at {} bytes'.format(
+                                                                max_bytes))
+                return
+            yield out
+    rest = gunzip.flush()
+    if rest:
+        yield rest
+
+
+def _chain(first, chunks):
+    if first:
+        yield first
+    for chunk in chunks:
+        yield chunk
+
+
+def iter_sitemap(chunks):
+    """
+    Feed a sitemap or sitemap index, a chunk at a time, through lxml's
+    pull parser and yield (PAGE or SITEMAP, url) for every <loc> in it as
+    soon as it's parsed. Entries are thrown away once we've seen them, so
+    only the chunk being parsed is ever in memory.
+    """
+    # no entities or network, sitemaps come from strangers
+    parser = etree.XMLPullParser(events=('end',), tag=('{*}loc',),
+                    resolve_entities=False, no_network=True, huge_tree=True)
+    try:
+        for chunk in gunzip_chunks(chunks):
+            parser.feed(chunk)
+            for found in read_locs(parser):
+                yield found
+        parser.close()
+    except etree.XMLSyntaxError as e:
+        logging.error('Could not parse sitemap: {}'.format(e))
+    for found in read_locs(parser):
+        yield found
+
+
+def read_locs(parser):
+    for event, loc in parser.read_events():
+        # the <url> or <sitemap> it's in
+        entry = loc.getparent()
+        if entry is None:
+            continue
+        kind = PAGE
+        if 'sitemap' == entry.tag.rsplit('}', 1)[-1]:
+            kind = SITEMAP
+        url = (loc.text or '').strip()
+        if url:
+            yield kind, url
+        # drop the entries before this one, this one's not done yet
+        root = entry.getparent()
+        if root is not None:
+            while entry.getprevious() is not None:
+                del root[0]
+
+
+def is_remote(location):
+    return location.startswith(('http://', 'https://'))
+
+
+def open_sitemap(location, sessions=None):
+    """
+    The chunks of a sitemap, either a url (fetched with a session from
+    sessions, a `sessions.SessionPool`) or a local file.
+    """
+    if not is_remote(location):
+        try:
+            with open(location, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+                    yield chunk
+        except IOError as e:
+            logging.error('Could not read {}: {}'.format(location, e))
+        return
+    session = requests
+    timeout = None
+    if sessions is not None:
+        session = sessions.get(location)
+        timeout = sessions.timeout
+    try:
+        resp = session.get(location, timeout=timeout, stream=True,
+                            headers={'User-Agent': 'PyCrawl 0.1'})
+    except RequestException as e:
+        logging.error('Could not fetch {}: {}'.format(location, e))
+        return
+    try:
+        if resp.status_code >= 400:
+            logging.error('Could not fetch {}: {}'.format(location,
+                                                        resp.status_code))
+            return
+        for chunk in resp.iter_content(CHUNK_SIZE):
+            yield chunk
+    except RequestException as e:
+        logging.error('Could not read {}: {}'.format(location, e))
+    finally:
+        resp.close()
+
+
+class SitemapLoader(Thread):
+    """
+    Reads sitemaps off the dispatcher's thread: put a sitemap's url (or
+    path) on sitemaps and the page urls in it, and in any sitemaps it
+    lists, come back as ('sitemap_urls', [urls]) signals batch_size at a
+    time, while the crawl is already fetching the first ones. Only urls
+    scope says are part of the crawl are sent.
+
+    At most max_batches batches are out at once, the dispatcher calls
+    batch_done as it handles each one, so a huge sitemap can't pile up on
+    the signal queue faster than it's taken off.
+    """
+    name = 'sitemaps'
+    daemon = True
+
+    def __init__(self, sitemaps, signal_queue, sessions, scope, killer,
+                                        batch_size=1000, max_batches=10):
+        Thread.__init__(self)
+        self.sitemaps = sitemaps
+        self.signal = signal_queue
+        self.sessions = sessions
+        self.scope = scope
+        self.killer = killer
+        self.batch_size = batch_size
+        # batches we can still send before the dispatcher catches up
+        self.slots = max_batches
+        self.cond = Condition()
+        # every sitemap we've been asked for, so an index can't loop
+        self.loaded = set()
+        self.pages = 0
+
+    def run(self):
+        while True:
+            location = self.sitemaps.get()
+            try:
+                if location is STOP:
+                    break
+                if location not in self.loaded and not self.killer.is_set():
+                    self.loaded.add(location)
+                    self.load(location)
+            finally:
+                self.sitemaps.task_done()
+
+    def load(self, location):
+        start = time.time()
+        before = self.pages
+        batch = []
+        found = iter_sitemap(open_sitemap(location, self.sessions))
+        for i, (kind, loc) in enumerate(found):
+            if 0 == i % self.batch_size and self.killer.is_set():
+                return
+            if SITEMAP == kind:
+                loc = self.nested(location, loc)
+                if loc is not None and loc not in self.loaded:
+                    self.sitemaps.put(loc)
+                continue
+            if self.scope is not None and not self.scope(loc):
+                continue
+            batch.append(loc)
+            if len(batch) >= self.batch_size:
+                if not self.send(batch):
+                    return
+                batch = []
+        if batch:
+            self.send(batch)
+        logging.info('Loaded {} urls from {} in {:.2f}s'.format(
+                self.pages - before, location, time.time() - start))
+
+    def nested(self, location, loc):
+        # a sitemap off the web can only point at others on the web, not
+        # at our files. local ones can point either way.
+        if is_remote(loc):
+            return loc
+        if is_remote(location):
+            logging.warning('Ignoring {} in {}'.format(loc, location))
+            return None
+        return os.path.join(os.path.dirname(location), loc)
+
+    def send(self, batch):
+        # wait for a free slot, unless the crawl's stopping (see wake)
+        with self.cond:
+            while self.slots <= 0 and not self.killer.is_set():
+                self.cond.wait()
+            if self.killer.is_set():
+                return False
+            self.slots -= 1
+        self.signal.put(('sitemap_urls', batch))
+        self.pages += len(batch)
+        return True
+
+    def batch_done(self):
+        with self.cond:
+            self.slots += 1
+            self.cond.notify()
+
+    def wake(self):
+        """
+        Set killer first, then call this so a send waiting on a slot notices
+        the crawl's stopping.
+        """
+        with self.cond:
+            self.cond.notify_all()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+# every column we know about for a url, in display order
+COLUMNS = ('url', 'status', 'server', 'content_type', 'size', 'title', 'desc',
+            'kw', 'canonical', 'h1', 'h2', 'x_robots', 'notes')
+
+class ColumnStore(object):
+    """
+    Crawl results, kept column by column: one list per column and a dict of
+    url => row. Values in the columns in `interned` (the ones that repeat a
+    lot, like status codes and content types) are shared between rows so
+    they only cost a pointer each. Nothing in here knows about wx, the grid
+    reads from it and so does exporting.
+
+    Only intern columns with a handful of different values: the table of them
+    never shrinks, so anything mostly unique (sizes, notes) only makes it
+    bigger without sharing anything.
+    """
+
+    def __init__(self, columns, interned=('status', 'server', 'content_type',
+                                                                'x_robots')):
+        self.columns = list(columns)
+        self.positions = dict((key, i) for i, key in enumerate(self.columns))
+        self.data = [[] for key in self.columns]
+        self.rows = {}
+        self.interned = set(self.positions[key] for key in interned
+                                                    if key in self.positions)
+        self.values = {}
+
+    def __len__(self):
+        return len(self.data[0]) if self.data else 0
+
+    def __contains__(self, url):
+        return url in self.rows
+
+    def add(self, url):
+        """
+        Add a row for url, returns its row number (the existing one if it's
+        already there).
+        """
+        row = self.rows.get(url)
+        if row is None:
+            row = self.rows[url] = len(self)
+            for column in self.data:
+                column.append('')
+            self.data[0][row] = url
+        return row
+
+    def get_row(self, url):
+        return self.rows.get(url)
+
+    def get(self, row, col):
+        return self.data[col][row]
+
+    def set(self, row, key, value):
+        """
+        Set column key of row to value, returns False if there's no such
+        column.
+        """
+        col = self.positions.get(key)
+        if col is None:
+            return False
+        if not isinstance(value, basestring):
+            value = str(value)
+        if col in self.interned:
+            value = self.values.setdefault(value, value)
+        self.data[col][row] = value
+        return True
+
+    def update(self, row, data):
+        for key, value in data.items():
+            self.set(row, key, value)
+
+    def apply(self, updates):
+        """
+        Apply a batch of updates (url => dict of column key => value), adding
+        rows for urls we haven't seen. Returns how many rows were added.
+        """
+        before = len(self)
+        for url, data in updates.items():
+            row = self.add(url)
+            if data:
+                self.update(row, data)
+        return len(self) - before
+
+    def row_values(self, row):
+        return [column[row] for column in self.data]
+
+    def iter_rows(self, start=0, stop=None):
+        """
+        Yield each row (from start up to stop) as a list of values in
+        column order.
+        """
+        if stop is None:
+            stop = len(self)
+        for row in xrange(start, stop):
+            yield self.row_values(row)
+
+    def snapshot(self):
+        """
+        A copy of the store as it is now, for reading on another thread
+        while this one keeps changing. The values themselves are shared, so
+        it only costs a pointer a cell.
+        """
+        copy = ColumnStore(self.columns, ())
+        copy.interned = set(self.interned)
+        copy.data = [list(column) for column in self.data]
+        copy.rows = dict(self.rows)
+        copy.values = self.values
+        return copy
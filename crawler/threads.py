@@ -1,82 +1,517 @@
 # -*- coding: utf-8 -*-
-from threading import Thread, Event
+from collections import OrderedDict
+from functools import partial
+from itertools import count
+from hashlib import sha1
+import heapq
+import logging
+from multiprocessing import Pool
+from threading import Condition, Thread, Event
 from Queue import Empty, Queue
+import time
+from urlparse import urljoin
 
-import lxml.html as parser
+from .functions import fetch_url, join_notes, parse_headers, parse_page, \
+    stream_page
+from .metrics import Metrics, NullMetrics, describe
+from .queues import STOP, URLQueue
+from .robots import RobotsCache, RobotsFetcher, robots_key
+from .sitemaps import SitemapLoader, is_remote
+from .recrawl import CHANGED, NOT_MODIFIED, UNCHANGED, content_hash, \
+    hash_chunks, join_links, split_links
+from .seen import FingerprintSet
+from .politeness import Scheduler
+from .resolver import DNS_TTL, DNSCache, pop_timings
+from .sessions import SessionPool
+from .sinks import Sink
+from .urls import Canonicalizer, Scope
+
+# `threads` is a handful of fetchers, one per thread. `pool` runs many more
+# fetchers (hundreds if you like) and caps how many hit any one host.
+ENGINES = ('threads', 'pool')
+
+# `dom` sends page bodies off to the parser to build a full document. 
+# `stream` has the fetcher feed the body through an event parser as it comes
+# in, which keeps memory per page small.
+PARSE_MODES = ('dom', 'stream')
+
+# pages bigger than this are cut off, by default
+MAX_BYTES = 10 * 1024 * 1024
+
+
+def send_parsed(signal, killer, url, result):
+    """
+    Put the signals for a page parsed by `parse_page` or `stream_page`
+    onto the signal queue.
+    """
+    if result is None:
+        signal.put(('send_note', (url, 'HTML parsing error')))
+    else:
+        links, out = result
+        signal.put(('url_links', (url, links)))
+        signal.put(('url_meta', (url, out)))
+    signal.put(('url_done', url))
+
+
+def timed_parse_page(content, url=None, scope=None):
+    """
+    `parse_page`, and how many seconds it took, for the parser pool.
+    """
+    start = time.time()
+    result = parse_page(content, url, scope)
+    return result, time.time() - start
 
-from .functions import fetch_element_att, fetch_element_text, \
-    fetch_links, fetch_url, parse_content, parse_headers
-from .events import NewUrlEvent, NewURLDataEvent, NewNoteEvent, send_event
-from .queues import URLQueue
 
 class Dispatcher(Thread):
     """
     Sends and receives signals from all the other threads in the application.
+    
+    Results go to sink (a `sinks.Sink`, or the GUI if you pass gui instead).
+    Partial updates are merged by url and sent as one batch every
+    flush_interval seconds, or sooner once flush_size urls are waiting.
+    Each url's full row goes out once it's done. If the sink fails the
+    crawl stops, with the error in sink_error.
+    
+    With exit_when_idle the crawl stops by itself once there's nothing left
+    to fetch or parse, rather than waiting for timeout.
+    
+    checkpoint (a `checkpoint.Checkpoint`) gets every url we queue and every
+    finished row as we go. With resume, the crawl picks up where that
+    checkpoint left off instead of starting fresh.
+    
+    previous (a `recrawl.PreviousCrawl`) makes this an incremental re-crawl:
+    pages we have validators for are fetched conditionally, and the ones
+    that haven't changed reuse their old row and links without being
+    parsed. record_links keeps each page's links in its row so a later
+    crawl can do that.
+    
+    Every fetch goes through a `politeness.Scheduler`: at most per_host
+    requests in flight to a host and rate requests a second (None for as
+    fast as it'll go), backing off when a host struggles.
+    
+    Only HTML bodies are downloaded, and only the first max_bytes of those
+    (None for no limit). With head_first, links that look like binary files
+    get a HEAD request before anything else.
+    
+    With robots, urls are checked against their host's robots.txt (fetched
+    once and cached for robots_ttl seconds) before they're queued. Blocked
+    ones are reported with a note but never fetched, and Crawl-delay goes
+    to the scheduler.
+    
+    sitemaps (urls, or paths to local files) seed the crawl with every page
+    they list, read a bit at a time on their own thread while the crawl
+    gets going. With robots_sitemaps, so do the sitemaps robots.txt lists.
+    
+    Host lookups are cached for dns_ttl seconds (None to ask the system
+    resolver every time), unless you pass your own sessions.
+    
+    metrics (a `metrics.Metrics`) counts what every stage is up to: queue
+    sizes, fetch timings, parse times, bytes and pages a second. Take a
+    snapshot whenever you like, and with metrics_path the last one is
+    written there as JSON when the crawl ends. Pass metrics=False to skip
+    it all.
     """
     name = 'dispatcher'
     daemon = True
     
-    def __init__(self, timeout=600.0, fetchers=2, base=None, gui=None):
+    def __init__(self, timeout=600.0, fetchers=2, base=None, gui=None,
+                    sessions=None, engine='threads', per_host=10, parsers=0,
+                    parse_mode='dom', seen=None, canonicalizer=None,
+                    scope='host', flush_interval=0.1, flush_size=500,
+                    sink=None, exit_when_idle=False, checkpoint=None,
+                    resume=False, previous=None, record_links=False,
+                    max_bytes=MAX_BYTES, head_first=False, rate=None,
+                    robots=True, robots_ttl=24 * 60 * 60, sitemaps=(),
+                    robots_sitemaps=False, dns_ttl=DNS_TTL, metrics=True,
+                    metrics_path=None):
         Thread.__init__(self)
         
+        if engine not in ENGINES:
+            raise ValueError('Unknown fetch engine: {}'.format(engine))
+        if parse_mode not in PARSE_MODES:
+            raise ValueError('Unknown parse mode: {}'.format(parse_mode))
+        
         self.killer = Event()
         self.abrupt = Event()
         self.base_url = base
+        self.scope = Scope(base, scope)
         self.timeout = timeout
         self.fetchers = fetchers
+        self.engine = engine
+        self.parse_mode = parse_mode
         self.gui = gui
+        if sink is None and gui is not None:
+            # only pull in wx if we're talking to the GUI
+            from .events import WxSink
+            sink = WxSink(gui)
+        self.sink = sink if sink is not None else Sink()
+        self.sink_error = None
+        self.exit_when_idle = exit_when_idle
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.previous = previous
+        self.record_links = record_links
+        # how the urls we'd crawled before turned out
+        self.recrawled = dict.fromkeys((NOT_MODIFIED, UNCHANGED, CHANGED), 0)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.pending = OrderedDict()
+        # url => everything we know about it so far, until it's done
+        self.rows = {}
+        # pages done and (name, seconds) timings since the last flush, handed
+        # to metrics together
+        self.pages_done = 0
+        self.timed = []
+        self.last_flush = time.time()
+        self.scheduler = Scheduler(rate, per_host)
+        pool_size = self.fetchers
+        if 'pool' == engine:
+            pool_size = per_host
+        if sessions is None:
+            dns_cache = DNSCache(dns_ttl) if dns_ttl else None
+            sessions = SessionPool(pool_size=pool_size, dns_cache=dns_cache)
+        self.sessions = sessions
         
         # queues
-        self.url_queue = URLQueue()
+        self.url_queue = URLQueue(seen=seen)
         self.content_queue = Queue()
         self.signal_queue = Queue()
         
+        if metrics is True:
+            metrics = Metrics()
+        elif not metrics:
+            metrics = NullMetrics()
+        self.metrics = metrics
+        self.metrics_path = metrics_path
+        
+        # robots.txt rules by host, and the new urls waiting on them
+        self.robots = None
+        if robots:
+            self.robots = RobotsCache(robots_ttl)
+            self.robots_queue = Queue()
+            self.robots_fetcher = RobotsFetcher(self.robots_queue, 
+                                            self.signal_queue, self.sessions)
+        self.waiting = {}
+        self.robots_blocked = 0
+        
+        # sitemaps still to read
+        self.sitemaps = list(sitemaps)
+        self.robots_sitemaps = robots_sitemaps and robots
+        self.sitemap_loader = None
+        if self.sitemaps or self.robots_sitemaps:
+            self.sitemap_queue = Queue()
+            self.sitemap_loader = SitemapLoader(self.sitemap_queue,
+                            self.signal_queue, self.sessions, self.scope,
+                            self.killer)
+        
+        # urls go through the canonicalizer before dedup. variants are the
+        # spellings it has rewritten, so we can count the fetches it saved.
+        if canonicalizer is None:
+            canonicalizer = Canonicalizer()
+        self.canonicalize = canonicalizer
+        self.variants = FingerprintSet()
+        self.duplicates_avoided = 0
+        
         # other threads
         for i in xrange(0, self.fetchers):
             setattr(self, 'fetcher{}'.format(i), 
                 Fetcher(self.url_queue, self.signal_queue, 
-                self.killer, self.abrupt))  
-        self.parser = Parser(self.content_queue, self.signal_queue, 
-                                self.base_url, self.killer, self.abrupt)
+                self.killer, self.abrupt, self.sessions, self.scheduler,
+                self.scope, self.parse_mode, self.previous, max_bytes,
+                head_first, self.metrics))
+        if parsers > 0:
+            self.parser = ParserPool(self.content_queue, self.signal_queue, 
+                        self.scope, self.killer, self.abrupt, parsers, 
+                        self.metrics)
+        else:
+            self.parser = Parser(self.content_queue, self.signal_queue, 
+                        self.scope, self.killer, self.abrupt, self.metrics)
+        
+        # read whenever somebody takes a snapshot
+        self.metrics.gauge('url_queue', self.url_queue.qsize)
+        self.metrics.gauge('content_queue', self.content_queue.qsize)
+        self.metrics.gauge('signal_queue', self.signal_queue.qsize)
+        self.metrics.gauge('robots_waiting', 
+                            lambda: sum(map(len, self.waiting.values())))
+        self.metrics.gauge('robots_blocked', lambda: self.robots_blocked)
+        self.metrics.gauge('in_progress', lambda: len(self.rows))
         
     def run(self):
+        if self.resume and self.checkpoint is not None:
+            self.restore()
+        if self.robots is not None:
+            self.robots_fetcher.start()
+        if self.sitemap_loader is not None:
+            self.sitemap_loader.start()
+            for location in self.sitemaps:
+                self.sitemap_queue.put(location)
         for i in xrange(0, self.fetchers):
             getattr(self, 'fetcher{}'.format(i)).start()
         self.parser.start()
         
         while not self.killer.is_set():
             try:
-                action, val = self.signal_queue.get(True, self.timeout)
+                action, val = self.wait_signal(self.timeout)
             except Empty:
                 self.killer.set()
                 continue
             else:
-                self.handle_signal(action, val)
+                self.timed_signal(action, val)
                 self.signal_queue.task_done()
+                self.maybe_flush()
         
         while 1 and not self.abrupt.is_set():
             try:
-                action, val = self.signal_queue.get(True, 10)
+                action, val = self.wait_signal(10)
             except Empty:
                 break
             else:
-                self.handle_signal(action, val)
+                self.timed_signal(action, val)
                 self.signal_queue.task_done()
+                self.maybe_flush()
+        
+        self.stop_fetchers()
+        self.stop_parsers()
+        self.stop_robots()
+        self.stop_sitemaps()
+        self.sessions.close()
+        dns_cache = getattr(self.sessions, 'dns_cache', None)
+        self.url_queue.close()
+        self.flush()
+        self.send_to_sink('close')
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+        logging.info('URL canonicalization avoided {} duplicate '
+                                'fetches'.format(self.duplicates_avoided))
+        if self.previous is not None:
+            self.log_recrawl()
+        if self.robots is not None:
+            logging.info('robots.txt blocked {} urls'.format(
+                                                        self.robots_blocked))
+        if dns_cache is not None:
+            logging.info('DNS cache: {hits} hits, {misses} misses, '
+                    '{negative_hits} failed lookups reused'.format(
+                                                    **dns_cache.stats()))
+        if self.sitemap_loader is not None:
+            logging.info('{} sitemaps listed {} urls'.format(
+                len(self.sitemap_loader.loaded), self.sitemap_loader.pages))
+        logging.info(describe(self.metrics.snapshot()))
+        if self.metrics_path is not None:
+            try:
+                self.metrics.dump(self.metrics_path)
+            except (IOError, OSError) as e:
+                logging.error('Could not write metrics to {}: {}'.format(
+                                                    self.metrics_path, e))
+    
+    def restore(self):
+        """
+        Rebuild the queue and seen urls from the checkpoint. Finished urls are
+        remembered as seen and their rows go to the sink as updates (so the
+        GUI shows them, but they're not written out again), everything else
+        we'd seen goes back on the queue.
+        """
+        start = time.time()
+        done = 0
+        updates = OrderedDict()
+        for url, data in self.checkpoint.read_done():
+            # once they're marked seen, add_url below skips the done urls
+            done += self.url_queue.mark_seen(url)
+            updates[url] = data
+            if len(updates) >= self.flush_size:
+                self.send_to_sink('updates', updates)
+                updates = OrderedDict()
+        pending = 0
+        for url in self.checkpoint.read_seen():
+            if self.url_queue.mark_seen(url):
+                self.admit(url)
+                updates[url] = {}
+                pending += 1
+                if len(updates) >= self.flush_size:
+                    self.send_to_sink('updates', updates)
+                    updates = OrderedDict()
+        if updates:
+            self.send_to_sink('updates', updates)
+        logging.info('Restored {} finished and {} pending urls in {:.2f}s'
+                    .format(done, pending, time.time() - start))
+    
+    def wait_signal(self, timeout):
+        """
+        Get the next signal off the queue, flushing GUI updates while we
+        wait. Raises Empty if nothing shows up for timeout seconds.
+        """
+        deadline = time.time() + timeout
+        while True:
+            wait = min(self.flush_interval, deadline - time.time())
+            if wait <= 0:
+                raise Empty
+            try:
+                return self.signal_queue.get(True, wait)
+            except Empty:
+                self.flush()
+                if self.exit_when_idle and self.idle():
+                    raise
+    
+    def idle(self):
+        """
+        Is everything done? Only meaningful from the dispatcher's thread.
+        Workers put their signals before marking a task done, so check the
+        task counts before the signal queue.
+        """
+        return (0 == self.url_queue.unfinished_tasks and 
+                0 == self.content_queue.unfinished_tasks and 
+                not self.waiting and (self.sitemap_loader is None or
+                    0 == self.sitemap_queue.unfinished_tasks) and 
+                self.signal_queue.empty())
+    
+    def queue_update(self, url, data=None):
+        """
+        Queue up data (column => value) about url for the GUI, merged with
+        anything else that's waiting for the same url.
+        """
+        update = self.pending.get(url)
+        if update is None:
+            update = self.pending[url] = {}
+        if data:
+            update.update(data)
+            self.rows.setdefault(url, {}).update(data)
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+    
+    def maybe_flush(self):
+        if time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        if self.pending:
+            start = time.time()
+            self.send_to_sink('updates', self.pending)
+            self.timed.append(('sink_updates', time.time() - start))
+            self.pending = OrderedDict()
+        if self.checkpoint is not None:
+            self.checkpoint.sync()
+        if self.pages_done or self.timed:
+            self.metrics.add([('pages', self.pages_done)], self.timed)
+            self.pages_done = 0
+            self.timed = []
+        self.last_flush = time.time()
+    
+    def log_recrawl(self):
+        revisited = sum(self.recrawled.values())
+        hits = self.recrawled[NOT_MODIFIED] + self.recrawled[UNCHANGED]
+        rate = 100.0 * hits / revisited if revisited else 0.0
+        logging.info('Re-crawl skipped {} of {} previously crawled urls '
+            '({:.1f}%): {} not modified, {} with the same content'.format(
+                hits, revisited, rate, self.recrawled[NOT_MODIFIED],
+                self.recrawled[UNCHANGED]))
+    
+    def add_urls(self, urls):
+        for raw in urls:
+            url = self.canonicalize(raw)
+            if self.url_queue.mark_seen(url):
+                self.queue_update(url)
+                if self.checkpoint is not None:
+                    self.checkpoint.add_seen(url)
+                self.admit(url)
+            elif url != raw and self.variants.add(raw):
+                self.duplicates_avoided += 1
+    
+    def admit(self, url):
+        """
+        Queue a new url, if robots.txt lets us. Urls for hosts whose
+        robots.txt we haven't got yet wait until it comes in.
+        """
+        if self.robots is None:
+            self.url_queue.put(url)
+            return
+        key = robots_key(url)
+        rules = self.robots.get(key)
+        if rules is None:
+            waiting = self.waiting.get(key)
+            if waiting is None:
+                waiting = self.waiting[key] = []
+                self.robots_queue.put(key)
+            waiting.append(url)
+        elif rules.allowed(url):
+            self.url_queue.put(url)
+        else:
+            self.robots_blocked += 1
+            self.queue_update(url, {'notes': 'Blocked by robots.txt'})
+            self.finish_url(url)
+    
+    def got_robots(self, key, rules):
+        self.robots.set(key, rules)
+        if rules.crawl_delay:
+            self.scheduler.set_crawl_delay(key.split('://', 1)[-1], 
+                                                        rules.crawl_delay)
+        if self.robots_sitemaps:
+            # robots.txt is off the web, so like a remote sitemap it can only
+            # point at other urls (relative to it), never at our files
+            robots_url = key + '/robots.txt'
+            for location in rules.sitemaps:
+                location = urljoin(robots_url, location)
+                if is_remote(location):
+                    self.sitemap_queue.put(location)
+                else:
+                    logging.warning('Ignoring {} in {}'.format(location,
+                                                                robots_url))
+        for url in self.waiting.pop(key, []):
+            self.admit(url)
+    
+    def finish_url(self, url):
+        self.pages_done += 1
+        row = self.rows.pop(url, {})
+        self.send_to_sink('row', url, row)
+        if self.checkpoint is not None:
+            self.checkpoint.add_done(url, row)
+    
+    def send_to_sink(self, method, *args):
+        """
+        Call method on the sink. If the sink breaks (a closed pipe, a full
+        disk) results have nowhere to go, so log it, drop the sink and stop
+        the crawl. The error's kept in sink_error.
+        """
+        try:
+            getattr(self.sink, method)(*args)
+        except Exception as e:
+            logging.exception('Could not save results, stopping the crawl')
+            self.sink_error = e
+            self.sink = Sink()
+            self.signal_queue.put(('stop_now', None))
+    
+    def timed_signal(self, action, val):
+        start = time.time()
+        self.handle_signal(action, val)
+        self.timed.append(('dispatch', time.time() - start))
     
     def handle_signal(self, action, val):
         if 'add_urls' == action:
-            for url in val:
-                new = self.url_queue.add_url(url)
-                if new:
-                    send_event(self.gui, NewUrlEvent(url))
+            self.add_urls(val)
+        elif 'sitemap_urls' == action:
+            if not self.killer.is_set():
+                self.add_urls(val)
+            self.sitemap_loader.batch_done()
+        elif 'url_links' == action:
+            url, links = val
+            if self.record_links:
+                self.rows.setdefault(url, {})['links'] = join_links(links)
+            if not self.killer.is_set():
+                self.add_urls(links)
+        elif 'recrawled' == action:
+            self.recrawled[val] += 1
         elif 'add_content' == action:
             self.content_queue.put(val)
         elif 'send_note' == action:
             url, e = val
-            send_event(self.gui, NewNoteEvent(url, e))
+            # keep whatever we'd already noted, like a redirect
+            notes = join_notes(self.rows.get(url, {}).get('notes'), e)
+            self.queue_update(url, {'notes': notes})
         elif 'url_meta' == action:
             url, dict_ = val
-            send_event(self.gui, NewURLDataEvent(url, dict_))
+            self.queue_update(url, dict_)
+        elif 'url_done' == action:
+            self.finish_url(val)
+        elif 'robots' == action:
+            self.got_robots(*val)
         elif 'stop' == action:
             self.killer.set()
         elif 'stop_now' == action:
@@ -85,25 +520,52 @@ class Dispatcher(Thread):
             self.abrupt.set()
             self.stop_fetchers()
             self.stop_parsers()
+            self.stop_robots()
+            self.stop_sitemaps()
         else:
             pass # nothin'
     
     def empty_queues(self):
-        with self.url_queue.mutex:
-            self.url_queue.queue.clear()
+        self.url_queue.clear()
+        self.waiting.clear()
+        if self.robots is not None:
+            with self.robots_queue.mutex:
+                self.robots_queue.queue.clear()
+        if self.sitemap_loader is not None:
+            with self.sitemap_queue.mutex:
+                self.sitemap_queue.queue.clear()
         with self.content_queue.mutex:
             self.content_queue.queue.clear()
         with self.signal_queue.mutex:
             self.signal_queue.queue.clear()
     
     def stop_fetchers(self):
-        # this seems really bad?
-        for i in xrange(0, self.fetchers):
-            while getattr(self, 'fetcher{}'.format(i)).is_alive():
-                getattr(self, 'fetcher{}'.format(i)).join()
+        """
+        Wake up every fetcher with a stop sentinel and wait for it to exit.
+        Fetchers finish whatever is left in the url queue first.
+        """
+        fetchers = [getattr(self, 'fetcher{}'.format(i)) 
+                                    for i in xrange(0, self.fetchers)]
+        alive = [f for f in fetchers if f.is_alive()]
+        for f in alive:
+            self.url_queue.put(STOP)
+        for f in alive:
+            f.join()
 
+    def stop_robots(self):
+        if self.robots is not None and self.robots_fetcher.is_alive():
+            self.robots_queue.put(STOP)
+            self.robots_fetcher.join()
+    
+    def stop_sitemaps(self):
+        if self.sitemap_loader is not None and self.sitemap_loader.is_alive():
+            self.sitemap_loader.wake()
+            self.sitemap_queue.put(STOP)
+            self.sitemap_loader.join()
+    
     def stop_parsers(self):
-        while self.parser.is_alive():
+        if self.parser.is_alive():
+            self.content_queue.put(STOP)
             self.parser.join()
 
 
@@ -112,50 +574,224 @@ class Fetcher(Thread):
     Fetches URLs and sends an event to the application with their status 
     codes.  Also places the responses body into a Queue for further processing
     by ParserThread
+    
+    A url whose host the scheduler isn't ready for (rate limits, backoff,
+    Retry-After) is parked until it should be and the fetcher gets on with
+    other urls meanwhile. Once max_parked are waiting it waits for them.
     """
     name = 'fetcher'
     daemon = True
     
-    def __init__(self, url_queue, signal_queue, killer, abrupt):
+    def __init__(self, url_queue, signal_queue, killer, abrupt, sessions=None,
+                            scheduler=None, scope=None, parse_mode='dom',
+                            previous=None, max_bytes=None, head_first=False,
+                            metrics=None, max_parked=500):
         Thread.__init__(self)
         
         self.urls = url_queue
         self.signal = signal_queue
         self.killer = killer
         self.abrupt = abrupt
+        self.sessions = sessions
+        self.scheduler = scheduler
+        self.scope = scope
+        self.stream = 'stream' == parse_mode
+        self.previous = previous
+        self.max_bytes = max_bytes
+        self.head_first = head_first
+        self.metrics = metrics if metrics is not None else NullMetrics()
+        # (when to try again, url) for urls taken off the queue whose host
+        # wasn't ready. They stay unfinished tasks until they're fetched.
+        self.parked = []
+        self.max_parked = max_parked
     
     def run(self):
-        while not self.killer.is_set():
-            try:
-                url = self.urls.get_nowait()
-            except Empty:
+        # block until there's work, the dispatcher sends STOP when it's done
+        while True:
+            url = self.next_url()
+            if url is STOP:
+                self.urls.task_done()
+                break
+            self.try_url(url)
+        # STOP comes after every url, so these are the last ones left and
+        # there's nothing else to do while they wait. Nobody else will
+        # take them now, so ones that get told to slow down stay parked
+        # here until the scheduler gives up on them.
+        while self.parked:
+            wait = self.parked[0][0] - time.time()
+            if wait > 0 and not self.abrupt.is_set():
+                self.abrupt.wait(wait)
                 continue
-            else:
-                self.handle_url(url)
+            self.try_url(heapq.heappop(self.parked)[1])
+    
+    def try_url(self, url):
+        # a url stays an unfinished task on the queue while it's parked
+        done = True
+        try:
+            if not self.abrupt.is_set():
+                done = self.handle_url(url)
+        finally:
+            if done:
                 self.urls.task_done()
-        
-        while 1 and not self.abrupt.is_set():
+    
+    def park(self, url, wait):
+        heapq.heappush(self.parked, (time.time() + wait, url))
+        self.metrics.incr('parked')
+    
+    def next_url(self):
+        """
+        A parked url that's due, or the next one off the queue. Only waits
+        on the queue until the first parked url is due, and not at all
+        once there are max_parked of them.
+        """
+        while True:
+            if not self.parked:
+                return self.urls.get()
+            wait = self.parked[0][0] - time.time()
+            if wait > 0 and len(self.parked) >= self.max_parked:
+                self.abrupt.wait(wait)
+                wait = 0
+            if wait <= 0:
+                return heapq.heappop(self.parked)[1]
             try:
-                url = self.urls.get(True, 10)
+                return self.urls.get(True, wait)
             except Empty:
-                break
-            else:
-                self.handle_url(url)
-                self.urls.task_done()
+                pass
+    
+    def fetch(self, url, headers=None):
+        session = timeout = None
+        if self.sessions is not None:
+            session = self.sessions.get(url)
+            timeout = self.sessions.timeout
+        timings = {}
+        result = fetch_url(url, session, timeout, self.stream, headers,
+                                self.max_bytes, self.head_first, timings)
+        self.record_fetch(result[2], timings)
+        return result
+    
+    def record_fetch(self, status, timings):
+        counters = [('fetches', 1)]
+        timed = []
+        if status is None:
+            counters.append(('fetch_errors', 1))
+        dns, connect = pop_timings()
+        if dns is not None:
+            timed.append(('dns', dns))
+        if connect is not None:
+            timed.append(('connect', connect))
+        if 'ttfb' in timings:
+            timed.append(('ttfb', timings['ttfb']))
+        # streamed bodies haven't been read yet, see process_url
+        body = timings.get('body')
+        if body is not None and not self.stream:
+            timed.append(('body', body.read_time))
+            counters.append(('bytes', body.size))
+        self.metrics.add(counters, timed)
     
     def handle_url(self, url):
-        content, headers, status, notes = fetch_url(url)
+        """
+        Fetch url, or park it if its host isn't ready for it yet (or told
+        us to slow down). Returns False if it was parked.
+        """
+        if self.scheduler is None:
+            self.process_url(url)
+            return True
+        ticket, wait = self.scheduler.try_hold(url)
+        if ticket is None:
+            self.park(url, wait)
+            return False
+        # streamed bodies are read while parsing, so hold the slot until the
+        # whole page is done
+        try:
+            retry = self.process_url(url, ticket)
+        finally:
+            self.scheduler.release(ticket)
+        if retry:
+            # the scheduler's holding the host back, try_hold says for how
+            # long once it comes up again
+            self.park(url, 0)
+            return False
+        return True
+    
+    def process_url(self, url, ticket=None):
+        """
+        Fetch url and send on what we find. Returns True if the host told
+        us to slow down and url should be tried again later.
+        """
+        previous = None
+        if self.previous is not None:
+            previous = self.previous.get(url)
+        conditional = None
+        if previous is not None:
+            conditional = self.previous.headers(previous)
+        content, headers, status, notes, final_url = self.fetch(url, 
+                                                                conditional)
+        if ticket is not None and ticket.done(status, headers):
+            if self.stream and content is not None:
+                content.close()
+            return True
         if status is None:
             self.signal.put(('send_note', (url, notes)))
+            self.signal.put(('url_done', url))
+            return
+        if 304 == status and previous is not None:
+            if content is not None and self.stream:
+                for chunk in content:
+                    pass # nothing there, but let the connection go
+            self.reuse(url, previous, NOT_MODIFIED)
             return
-        if content is not None:
-            self.signal.put(('add_content', (url, content)))
+        meta = {}
         if headers is not None:
             meta = parse_headers(headers)
             meta['status'] = status
+        if content is not None and not self.stream:
+            meta['hash'] = content_hash(content)
+            if previous is not None and previous.get('hash') == meta['hash']:
+                self.reuse(url, previous, UNCHANGED, meta)
+                return
+        if previous is not None:
+            self.signal.put(('recrawled', CHANGED))
+        # headers go first so they're in before the parser says it's done
+        if meta:
             self.signal.put(('url_meta', (url, meta)))
         if notes is not None:
             self.signal.put(('send_note', (url, notes)))
+        if content is None:
+            self.signal.put(('url_done', url))
+        elif self.stream:
+            digest = sha1()
+            start = time.time()
+            try:
+                result = stream_page(hash_chunks(content, digest), final_url, 
+                                                                self.scope)
+            finally:
+                # give the connection back even if reading it blew up
+                content.close()
+            # reading and parsing take turns, split them back up
+            self.metrics.add([('bytes', content.size)], [
+                    ('body', content.read_time),
+                    ('parse', time.time() - start - content.read_time)])
+            self.signal.put(('url_meta', (url, {'hash': digest.hexdigest()})))
+            if content.truncated:
+                self.signal.put(('send_note', (url, content.note())))
+            send_parsed(self.signal, self.killer, url, result)
+        else:
+            self.signal.put(('add_content', (url, content, final_url)))
+    
+    def reuse(self, url, previous, how, meta=None):
+        """
+        The page hasn't changed since the previous crawl: send its old row
+        (with anything fresh from meta on top) and links instead of parsing
+        it again.
+        """
+        data = dict(previous)
+        if meta:
+            data.update(meta)
+        links = split_links(data.pop('links', None))
+        self.signal.put(('recrawled', how))
+        self.signal.put(('url_meta', (url, data)))
+        self.signal.put(('url_links', (url, links)))
+        self.signal.put(('url_done', url))
                     
 
 class Parser(Thread):
@@ -166,73 +802,156 @@ class Parser(Thread):
     name = 'parser'
     daemon = True
     
-    def __init__(self, content_queue, signal_queue, base_url, killer, abrupt):
+    def __init__(self, content_queue, signal_queue, scope, killer, abrupt,
+                                                                metrics=None):
         Thread.__init__(self)
         self.content = content_queue
         self.signal = signal_queue
-        self.url = base_url
+        self.scope = scope
         self.killer = killer
         self.abrupt = abrupt
+        self.metrics = metrics if metrics is not None else NullMetrics()
     
     def run(self):
-        while not self.killer.is_set():
+        while True:
+            item = self.content.get()
             try:
-                url, to_parse = self.content.get_nowait()
-            except Empty:
-                continue
-            else:
-                self.parse_content(url, to_parse)
+                if item is STOP:
+                    break
+                if not self.abrupt.is_set():
+                    self.parse_content(*item)
+            finally:
                 self.content.task_done()
-        
-        while 1 and not self.abrupt.is_set():
+    
+    def parse_content(self, url, to_parse, final_url=None):
+        result, seconds = timed_parse_page(to_parse, final_url or url, 
+                                                                self.scope)
+        self.metrics.observe('parse', seconds)
+        self.handle_result(url, result)
+    
+    def handle_result(self, url, result):
+        send_parsed(self.signal, self.killer, url, result)
+
+
+class ParserPool(Parser):
+    """
+    Same job as the Parser, but hands the actual parsing off to a pool of
+    worker processes so it isn't stuck on one core behind the GIL. Only the
+    raw HTML goes out and only the links and the data dict come back.
+    
+    Pages that fail in a worker, or haven't come back after parse_timeout
+    seconds (the worker died, say), are given up on with a parsing error
+    note so the crawl doesn't wait for them forever.
+    """
+    name = 'parser_pool'
+    daemon = True
+    
+    def __init__(self, content_queue, signal_queue, scope, killer, abrupt,
+                        processes=2, metrics=None, parse_timeout=60.0):
+        Parser.__init__(self, content_queue, signal_queue, scope, 
+                                                    killer, abrupt, metrics)
+        self.processes = processes
+        self.parse_timeout = parse_timeout
+        self.pool = Pool(processes)
+        # don't pile up more HTML in the pool than the workers can chew on
+        self.max_pending = processes * 2
+        # task number => (url, `AsyncResult`, when it went out)
+        self.pending = {}
+        self.tasks = count()
+        self.lost = 0
+        self.cond = Condition()
+    
+    def run(self):
+        while True:
+            # only wake up to check on the pool if there's something in it
             try:
-                url, to_parse = self.content.get(True, 10)
+                item = self.content.get(True, 
+                                    1.0 if self.pending else None)
             except Empty:
+                self.reap()
+                continue
+            if item is STOP:
+                self.content.task_done()
                 break
-            else:
-                self.parse_content(url, to_parse)
+            if self.abrupt.is_set():
                 self.content.task_done()
-    
-    def parse_content(self, url, to_parse):
-        parsed = parse_content(to_parse)
-        if parsed is None:
-            self.signal.put(('send_note', (url, 'HTML parsing error')))
-            return
-        
-        if not self.killer.is_set():
-            links = fetch_links(parsed)
-            if links is not None:
-                out_links = set()
-                for l in links:
-                    if l.startswith(self.url):
-                        out_links.add(l)
-                self.signal.put(('add_urls', out_links))
-        
-        out = {
-            'title': '--',
-            'desc': '--',
-            'kw': '--',
-            'canonical': '--',
-            'h1': '--',
-            'h2': '--'
-        }
-        title = fetch_element_text(parsed, 'title')
-        if title is not None:
-            out['title'] = title
-        desc = fetch_element_att(parsed, 'meta[name=description]', 'content')
-        if desc is not None:
-            out['desc'] = desc
-        kw = fetch_element_att(parsed, 'meta[name=keywords]', 'content')
-        if kw is not None:
-            out['kw'] = kw
-        canonical = fetch_element_att(parsed, 'link[rel=canonical]', 'href')
-        if canonical is not None:
-            out['canonical'] = canonical
-        h1 = fetch_element_text(parsed, 'h1')
-        if h1 is not None:
-            out['h1'] = h1
-        h2 = fetch_element_text(parsed, 'h2')
-        if h2 is not None:
-            out['h2'] = h2
-        self.signal.put(('url_meta', (url, out)))
+                continue
+            url, to_parse, final_url = item
+            with self.cond:
+                while len(self.pending) >= self.max_pending:
+                    self.cond.wait(1.0)
+                    self.reap_locked()
+                task = next(self.tasks)
+                self.pending[task] = (url, self.pool.apply_async(
+                                    timed_parse_page, 
+                                    (to_parse, final_url, self.scope),
+                                    callback=partial(self.finish, task)),
+                                    time.time())
         
+        if not self.abrupt.is_set():
+            with self.cond:
+                while self.pending:
+                    self.cond.wait(1.0)
+                    self.reap_locked()
+        # a lost task would have close and join wait for it forever
+        if self.abrupt.is_set() or self.lost:
+            self.pool.terminate()
+        else:
+            self.pool.close()
+        self.pool.join()
+        with self.cond:
+            for task in self.pending.keys():
+                self.pending.pop(task)
+                self.content.task_done()
+    
+    def finish(self, task, timed):
+        # called from the pool's result handler thread
+        with self.cond:
+            entry = self.pending.pop(task, None)
+            if entry is None:
+                # already given up on
+                return
+            self.cond.notify()
+        url = entry[0]
+        try:
+            if not self.abrupt.is_set():
+                result, seconds = timed
+                self.metrics.observe('parse', seconds)
+                self.handle_result(url, result)
+        finally:
+            self.content.task_done()
+    
+    def reap(self):
+        with self.cond:
+            self.reap_locked()
+    
+    def reap_locked(self):
+        """
+        Give up on pages that failed in a worker or are taking too long.
+        Call with self.cond held.
+        """
+        now = time.time()
+        for task, (url, result, started) in self.pending.items():
+            if result.ready():
+                if result.successful():
+                    # the callback's on its way
+                    continue
+                try:
+                    result.get(0)
+                except Exception as e:
+                    logging.error('Parser process failed on {}: {}'.format(
+                                                                    url, e))
+            elif now - started > self.parse_timeout:
+                logging.error('Gave up parsing {} after {:.0f}s'.format(url,
+                                                        self.parse_timeout))
+                # the worker may be gone, and the pool with it
+                self.lost += 1
+            else:
+                continue
+            del self.pending[task]
+            self.cond.notify()
+            try:
+                if not self.abrupt.is_set():
+                    self.handle_result(url, None)
+            finally:
+                self.content.task_done()
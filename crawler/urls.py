@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import re
+from urllib import unquote_plus
+from urlparse import urlsplit, urlunsplit
+
+# query parameters that only track where a visitor came from, they never
+# change the page.
+TRACKING_PARAMS = (
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'gclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid',
+)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# what counts as part of the crawl: the start url's host, that host and its
+# subdomains, or only urls under the start url's path.
+SCOPES = ('host', 'subdomain', 'prefix')
+
+_escape_re = re.compile(r'%([0-9A-Fa-f]{2})')
+_unreserved = frozenset('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+                                                            '0123456789-._~')
+
+
+def _fix_escape(match):
+    char = chr(int(match.group(1), 16))
+    if char in _unreserved:
+        return char
+    return '%' + match.group(1).upper()
+
+
+def normalize_escapes(s):
+    """
+    Decode percent-escapes of characters that never need them (%7E => ~)
+    and upper case the rest (%2f => %2F).
+    """
+    if '%' not in s:
+        return s
+    return _escape_re.sub(_fix_escape, s)
+
+
+class Canonicalizer(object):
+    """
+    Turns the many spellings of a url into one, so `/page`, `/page#top`
+    and `/PAGE?b=2&a=1` style variants of the same page get fetched once.
+    Fragments are dropped, the scheme and host lower cased, default ports
+    removed, percent-escapes normalized, the params in strip_params removed
+    and the rest of the query sorted.
+
+    Results are memoized, up to cache_size urls at a time.
+    """
+
+    def __init__(self, strip_params=TRACKING_PARAMS, sort_query=True,
+                                                        cache_size=100000):
+        self.strip_params = frozenset(strip_params)
+        self.sort_query = sort_query
+        self.cache_size = cache_size
+        self.cache = {}
+
+    def __call__(self, url):
+        return self.canonicalize(url)
+
+    def canonicalize(self, url):
+        rv = self.cache.get(url)
+        if rv is None:
+            rv = self.normalize(url)
+            if len(self.cache) >= self.cache_size:
+                self.cache.clear()
+            self.cache[url] = rv
+        return rv
+
+    def normalize(self, url):
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            # let the fetcher complain about it
+            return url
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        if ':' in host:
+            host = '[{}]'.format(host)
+        if port is not None and DEFAULT_PORTS.get(scheme) != port:
+            host = '{}:{}'.format(host, port)
+        if parts.username is not None:
+            userinfo = parts.netloc.rsplit('@', 1)[0]
+            host = '{}@{}'.format(userinfo, host)
+        path = normalize_escapes(parts.path)
+        if not path and scheme in DEFAULT_PORTS:
+            path = '/'
+        query = self.normalize_query(parts.query)
+        return urlunsplit((scheme, host, path, query, ''))
+
+    def normalize_query(self, query):
+        if not query:
+            return query
+        params = []
+        for param in query.split('&'):
+            if not param:
+                continue
+            key = param.split('=', 1)[0]
+            if unquote_plus(key) in self.strip_params:
+                continue
+            params.append(normalize_escapes(param))
+        if self.sort_query:
+            params.sort()
+        return '&'.join(params)
+
+
+class Scope(object):
+    """
+    Decides whether a (absolute) url is part of a crawl that started at
+    start_url. See SCOPES for the modes; without a start_url everything's
+    in. Only http and https urls are ever in scope; the scheme, case and
+    default ports don't matter. In prefix mode a path is under the start
+    url's if it's the same path or one of its children, so /blog takes in
+    /blog/post but not /blogroll.
+    """
+
+    def __init__(self, start_url=None, mode='host'):
+        if mode not in SCOPES:
+            raise ValueError('Unknown crawl scope: {}'.format(mode))
+        self.mode = mode
+        self.host = self.prefix = None
+        if start_url is not None:
+            parts = urlsplit(start_url)
+            self.host = self.host_of(parts)
+            # without the trailing slash, see __call__
+            self.prefix = parts.path.rstrip('/')
+
+    def __call__(self, url):
+        try:
+            parts = urlsplit(url)
+            host = self.host_of(parts)
+        except ValueError:
+            return False
+        if parts.scheme.lower() not in DEFAULT_PORTS:
+            return False
+        if self.host is None:
+            return True
+        if 'subdomain' == self.mode:
+            return host == self.host or host.endswith('.' + self.host)
+        if host != self.host:
+            return False
+        if 'prefix' == self.mode:
+            path = parts.path or '/'
+            return path == self.prefix or path.startswith(self.prefix + '/')
+        return True
+
+    @staticmethod
+    def host_of(parts):
+        host = (parts.hostname or '').lower()
+        port = parts.port
+        scheme = parts.scheme.lower()
+        if port is not None and DEFAULT_PORTS.get(scheme) != port:
+            host = '{}:{}'.format(host, port)
+        return host
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from crawler.checkpoint import Checkpoint
+from crawler.sinks import Sink
+from crawler.threads import Dispatcher
+
+SETTINGS = {'base': 'http://example.com/', 'fetchers': 4, 'robots': False}
+
+class RecordingSink(Sink):
+
+    def __init__(self):
+        self.seen = []
+
+    def updates(self, updates):
+        self.seen.extend(updates.items())
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'crawl')
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.path))
+
+    def save(self, seen, done):
+        checkpoint = Checkpoint(self.path)
+        checkpoint.start(SETTINGS)
+        for url in seen:
+            checkpoint.add_seen(url)
+        for url, data in done:
+            checkpoint.add_done(url, data)
+        checkpoint.close()
+
+    def test_round_trip(self):
+        seen = ['http://example.com/', 'http://example.com/a',
+                'http://example.com/caf\xc3\xa9', 'http://example.com/b']
+        done = [('http://example.com/', {'status': '200', 'title': u'Caf\xe9'}),
+                ('http://example.com/a', {'status': '404'})]
+        self.save(seen, done)
+        checkpoint = Checkpoint(self.path)
+        self.assertTrue(checkpoint.exists())
+        self.assertEqual(SETTINGS, checkpoint.load_settings())
+        self.assertEqual(seen, list(checkpoint.read_seen()))
+        self.assertEqual(done, list(checkpoint.read_done()))
+        for url, data in checkpoint.read_done():
+            self.assertIsInstance(url, str)
+
+    def test_newlines_escaped(self):
+        self.save(['http://example.com/a\nb\r'], [])
+        self.assertEqual(['http://example.com/a%0Ab%0D'],
+                            list(Checkpoint(self.path).read_seen()))
+
+    def test_torn_line(self):
+        self.save(['http://example.com/'], [])
+        # as if we died halfway through writing a line
+        with open(os.path.join(self.path, 'crawl.log'), 'ab') as f:
+            f.write('= ["http://example.com/", {"stat')
+        checkpoint = Checkpoint(self.path)
+        self.assertEqual([], list(checkpoint.read_done()))
+        checkpoint.add_seen('http://example.com/next')
+        checkpoint.close()
+        self.assertEqual(['http://example.com/', 'http://example.com/next'],
+                            list(checkpoint.read_seen()))
+
+    def test_restore(self):
+        self.save(['http://example.com/', 'http://example.com/a',
+                    'http://example.com/b'],
+                    [('http://example.com/', {'status': '200'})])
+        sink = RecordingSink()
+        checkpoint = Checkpoint(self.path)
+        dispatcher = Dispatcher(sink=sink, checkpoint=checkpoint, resume=True,
+                                metrics=False, **checkpoint.load_settings())
+        dispatcher.restore()
+        self.assertEqual([('http://example.com/', {'status': '200'}),
+                            ('http://example.com/a', {}),
+                            ('http://example.com/b', {})], sink.seen)
+        queued = [dispatcher.url_queue.get_nowait() for i in xrange(2)]
+        self.assertEqual(['http://example.com/a', 'http://example.com/b'],
+                            queued)
+        self.assertTrue(dispatcher.url_queue.empty())
+        # and none of them get queued again
+        self.assertFalse(dispatcher.url_queue.add_url('http://example.com/'))
+        self.assertFalse(dispatcher.url_queue.add_url('http://example.com/a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+
+from crawler.cli import main
+from crawler.sinks import Sink
+from crawler.threads import Dispatcher
+
+class UsageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.output = os.path.join(self.folder, 'out.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_incremental_without_db(self):
+        with open(self.output, 'wb') as f:
+            f.write('last crawl\n')
+        checkpoint = os.path.join(self.folder, 'crawl')
+        self.assertEqual(2, main(['http://example.com/', '-o', self.output,
+                        '--incremental', '--checkpoint', checkpoint]))
+        # nothing clobbered or started
+        with open(self.output, 'rb') as f:
+            self.assertEqual('last crawl\n', f.read())
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_bad_url(self):
+        self.assertEqual(2, main(['example.com', '-o', self.output]))
+        self.assertFalse(os.path.exists(self.output))
+
+
+class BrokenSink(Sink):
+
+    def row(self, url, data):
+        raise IOError(errno.EPIPE, 'Broken pipe')
+
+
+class SinkErrorTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.ERROR)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def test_stops_the_crawl(self):
+        dispatcher = Dispatcher(sink=BrokenSink(), robots=False,
+                                                            metrics=False)
+        dispatcher.finish_url('http://example.com/')
+        self.assertIsInstance(dispatcher.sink_error, IOError)
+        self.assertEqual(('stop_now', None),
+                            dispatcher.signal_queue.get_nowait())
+        # the broken sink's gone, so it doesn't go again
+        dispatcher.finish_url('http://example.com/other')
+        self.assertTrue(dispatcher.signal_queue.empty())
+
+
+if __name__ == '__main__':
+    unittest.main()
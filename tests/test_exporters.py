@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from cStringIO import StringIO
+import csv
+import json
+import unittest
+
+from crawler.exporters import (EXPORTERS, Exporter, export_store,
+                                get_exporter)
+from crawler.store import ColumnStore
+
+COLUMNS = ('url', 'status', 'title')
+ROWS = [
+    ['http://example.com/', '200', u'Caf\xe9 "quoted", with a comma'],
+    ['http://example.com/404', '404', ''],
+]
+
+def make_store():
+    store = ColumnStore(COLUMNS)
+    for url, status, title in ROWS:
+        store.update(store.add(url), {'status': status, 'title': title})
+    return store
+
+
+def export(format, store=None):
+    stream = StringIO()
+    if store is None:
+        store = make_store()
+    for progress in export_store(store,
+                                    get_exporter(format, stream, COLUMNS)):
+        pass
+    return stream.getvalue()
+
+
+class ExporterTest(unittest.TestCase):
+
+    def test_json(self):
+        self.assertEqual([dict(zip(COLUMNS, row)) for row in ROWS],
+                            json.loads(export('json')))
+
+    def test_json_empty(self):
+        self.assertEqual([], json.loads(export('json', ColumnStore(COLUMNS))))
+
+    def test_jsonl(self):
+        lines = export('jsonl').splitlines()
+        self.assertEqual([dict(zip(COLUMNS, row)) for row in ROWS],
+                            [json.loads(line) for line in lines])
+
+    def test_csv(self):
+        rows = list(csv.reader(StringIO(export('csv'))))
+        self.assertEqual(list(COLUMNS), rows[0])
+        self.assertEqual([[v.encode('utf-8') for v in row] for row in ROWS],
+                            rows[1:])
+
+    def test_all_registered(self):
+        for format in EXPORTERS:
+            self.assertTrue(export(format))
+        self.assertRaises(ValueError, get_exporter, 'xml', StringIO(), COLUMNS)
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, Exporter, StringIO(), COLUMNS)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def test_unchanged_by_store(self):
+        store = make_store()
+        copy = store.snapshot()
+        store.set(0, 'status', '500')
+        store.add('http://example.com/new')
+        self.assertEqual(len(ROWS), len(copy))
+        self.assertEqual(ROWS, list(copy.iter_rows()))
+        self.assertNotIn('http://example.com/new', copy)
+
+
+if __name__ == '__main__':
+    unittest.main()
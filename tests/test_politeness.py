@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from Queue import Queue
+from threading import Event
+import time
+import unittest
+
+from crawler.politeness import Scheduler
+from crawler.queues import STOP, URLQueue
+from crawler.threads import Fetcher
+
+class TryHoldTest(unittest.TestCase):
+
+    def test_per_host(self):
+        scheduler = Scheduler(per_host=2, busy_wait=0.05)
+        first, wait = scheduler.try_hold('http://example.com/a')
+        self.assertIsNotNone(first)
+        self.assertEqual(0, wait)
+        self.assertIsNotNone(scheduler.try_hold('http://example.com/b')[0])
+        self.assertEqual((None, 0.05),
+                            scheduler.try_hold('http://example.com/c'))
+        # other hosts aren't held up
+        self.assertIsNotNone(scheduler.try_hold('http://other.com/')[0])
+        scheduler.release(first)
+        self.assertIsNotNone(scheduler.try_hold('http://example.com/c')[0])
+
+    def test_rate(self):
+        scheduler = Scheduler(rate=2)
+        ticket, wait = scheduler.try_hold('http://example.com/a')
+        scheduler.release(ticket)
+        ticket, wait = scheduler.try_hold('http://example.com/b')
+        self.assertIsNone(ticket)
+        self.assertTrue(0.4 < wait <= 0.5)
+
+    def test_retry_after(self):
+        scheduler = Scheduler()
+        ticket, wait = scheduler.try_hold('http://example.com/a')
+        self.assertTrue(ticket.done(429, {'retry-after': '30'}))
+        scheduler.release(ticket)
+        ticket, wait = scheduler.try_hold('http://example.com/a')
+        self.assertIsNone(ticket)
+        self.assertTrue(29 < wait <= 30)
+
+
+class FetcherParkingTest(unittest.TestCase):
+
+    def make_fetcher(self, statuses):
+        self.urls = URLQueue()
+        self.signal = Queue()
+        self.scheduler = Scheduler(min_backoff=0.05)
+        fetcher = Fetcher(self.urls, self.signal, Event(), Event(),
+                                                scheduler=self.scheduler)
+        self.fetched = []
+        def fetch(url, headers=None):
+            self.fetched.append(url)
+            return None, {}, statuses.pop(0), None, url
+        fetcher.fetch = fetch
+        return fetcher
+
+    def signals(self):
+        return [self.signal.get_nowait() for i in xrange(self.signal.qsize())]
+
+    def test_slow_down_after_stop(self):
+        # parked when STOP comes, then told to slow down: it has to be
+        # tried again right here, there's nobody else left to do it
+        fetcher = self.make_fetcher([429, 200])
+        url = 'http://example.com/'
+        with self.scheduler.cond:
+            self.scheduler.get_host(url).not_before = time.time() + 0.1
+        self.urls.put(url)
+        self.urls.put(STOP)
+        fetcher.run()
+        self.assertEqual([url, url], self.fetched)
+        self.assertIn(('url_done', url), self.signals())
+        self.assertEqual(0, self.urls.unfinished_tasks)
+
+    def test_gives_up(self):
+        fetcher = self.make_fetcher([503] * 4)
+        url = 'http://example.com/'
+        self.urls.put(url)
+        self.urls.put(STOP)
+        fetcher.run()
+        # the first try and the scheduler's three retries, then it's done
+        # with the status it got
+        self.assertEqual(4, len(self.fetched))
+        signals = self.signals()
+        self.assertIn(('url_done', url), signals)
+        self.assertEqual(503, [val[1]['status'] for action, val in signals
+                                            if 'url_meta' == action][0])
+        self.assertEqual(0, self.urls.unfinished_tasks)
+
+
+if __name__ == '__main__':
+    unittest.main()
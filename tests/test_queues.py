@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from crawler.queues import STOP, URLQueue
+
+def drain(queue):
+    items = []
+    while not queue.empty():
+        items.append(queue.get_nowait())
+        queue.task_done()
+    return items
+
+
+class URLQueueTest(unittest.TestCase):
+
+    def test_spill_round_trip(self):
+        queue = URLQueue(hot_size=3)
+        urls = ['http://example.com/{}'.format(i) for i in xrange(10)]
+        urls += [u'http://example.com/caf\xe9', u'http://example.com/plain',
+                    'http://example.com/na\xc3\xafve']
+        for url in urls:
+            self.assertTrue(queue.add_url(url))
+        queue.put(STOP)
+        self.assertEqual(len(urls) + 1, queue.qsize())
+        items = drain(queue)
+        self.assertIs(STOP, items.pop())
+        self.assertEqual(urls, items)
+        # u'a' == 'a', so check they came back as what they went in as
+        self.assertEqual(map(type, urls), map(type, items))
+        queue.close()
+
+    def test_spill_interleaved(self):
+        queue = URLQueue(hot_size=2)
+        got = []
+        for i in xrange(0, 20, 4):
+            for j in xrange(i, i + 4):
+                queue.add_url(u'http://example.com/{}'.format(j))
+            got.append(queue.get_nowait())
+            got.append(queue.get_nowait())
+        got.extend(drain(queue))
+        self.assertEqual([u'http://example.com/{}'.format(i) 
+                                            for i in xrange(20)], got)
+        self.assertTrue(all(isinstance(url, unicode) for url in got))
+        queue.close()
+
+    def test_newlines_escaped(self):
+        queue = URLQueue(hot_size=1)
+        queue.add_url('http://example.com/first')
+        queue.add_url('http://example.com/a\r\nb')
+        self.assertEqual(['http://example.com/first', 
+                            'http://example.com/a%0D%0Ab'], drain(queue))
+        queue.close()
+
+    def test_seen_only_once(self):
+        queue = URLQueue(hot_size=1)
+        self.assertTrue(queue.add_url('http://example.com/'))
+        self.assertFalse(queue.add_url('http://example.com/'))
+        self.assertFalse(queue.mark_seen('http://example.com/'))
+        self.assertTrue(queue.mark_seen('http://example.com/other'))
+        self.assertEqual(1, queue.qsize())
+
+    def test_clear_drops_spilled(self):
+        queue = URLQueue(hot_size=2)
+        for i in xrange(10):
+            queue.add_url('http://example.com/{}'.format(i))
+        queue.clear()
+        self.assertEqual(0, queue.qsize())
+        # still remembered as seen
+        self.assertFalse(queue.add_url('http://example.com/5'))
+        queue.add_url('http://example.com/new')
+        self.assertEqual(['http://example.com/new'], drain(queue))
+        queue.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
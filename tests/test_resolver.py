@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import BaseHTTPServer
+import socket
+import SocketServer
+from threading import Thread
+import unittest
+
+import requests
+from requests.exceptions import ConnectionError
+from urllib3.util import connection
+
+from crawler.resolver import DNSCache, pop_timings
+from crawler.sessions import SessionPool
+
+class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class StubResolver(object):
+    """
+    *.test hosts are all 127.0.0.1, and it remembers who asked.
+    """
+
+    def __init__(self):
+        self.hosts = []
+
+    def __call__(self, host, port, family=0, socktype=0, proto=0, flags=0):
+        self.hosts.append(host)
+        if not host.endswith('.test'):
+            raise socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        return socket.getaddrinfo('127.0.0.1', port, socket.AF_INET,
+                                                            socktype, proto)
+
+
+class CachedDNSAdapterTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = Server(('127.0.0.1', 0), Handler)
+        thread = Thread(target=cls.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def url(self, host):
+        return 'http://{}:{}/'.format(host, self.server.server_port)
+
+    def get(self, sessions, host):
+        url = self.url(host)
+        return sessions.get(url).get(url, timeout=sessions.timeout)
+
+    def test_per_pool(self):
+        first, second = StubResolver(), StubResolver()
+        one = SessionPool(keep_alive=False, dns_cache=DNSCache(resolve=first))
+        two = SessionPool(keep_alive=False, dns_cache=DNSCache(resolve=second))
+        try:
+            self.assertEqual('ok', self.get(one, 'one.test').text)
+            self.assertEqual('ok', self.get(two, 'two.test').text)
+            self.assertEqual(['one.test'], first.hosts)
+            self.assertEqual(['two.test'], second.hosts)
+            self.assertEqual(1, one.dns_cache.stats()['misses'])
+            self.get(one, 'one.test')
+            self.assertEqual(1, one.dns_cache.stats()['hits'])
+            # closing one pool leaves the other's cache alone
+            one.close()
+            self.get(two, 'two.test')
+            self.assertEqual(1, two.dns_cache.stats()['hits'])
+        finally:
+            one.close()
+            two.close()
+
+    def test_timings(self):
+        sessions = SessionPool(dns_cache=DNSCache(resolve=StubResolver()))
+        try:
+            pop_timings()
+            self.get(sessions, 'timed.test')
+            dns, connect = pop_timings()
+            self.assertIsNotNone(dns)
+            self.assertIsNotNone(connect)
+            # kept alive, so no new connection this time
+            self.get(sessions, 'timed.test')
+            self.assertEqual((None, None), pop_timings())
+        finally:
+            sessions.close()
+
+    def test_lookup_fails(self):
+        sessions = SessionPool(dns_cache=DNSCache(resolve=StubResolver()))
+        try:
+            self.assertRaises(ConnectionError, self.get, sessions, 'nx.invalid')
+            self.assertRaises(ConnectionError, self.get, sessions, 'nx.invalid')
+            self.assertEqual(1, sessions.dns_cache.stats()['negative_hits'])
+        finally:
+            sessions.close()
+
+    def test_not_global(self):
+        create = connection.create_connection
+        sessions = SessionPool(dns_cache=DNSCache(resolve=StubResolver()))
+        self.get(sessions, 'global.test')
+        self.assertIs(create, connection.create_connection)
+        # plain requests still goes to the system resolver
+        self.assertEqual('ok', requests.get(self.url('127.0.0.1')).text)
+        self.assertRaises(ConnectionError, requests.get,
+                                        self.url('global.test'), timeout=5)
+        sessions.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
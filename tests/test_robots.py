@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+import logging
+import unittest
+
+from crawler.robots import parse_robots
+from crawler.threads import Dispatcher
+
+ROBOTS = '''User-agent: *
+Disallow: /private
+Sitemap: http://example.com/sitemap.xml
+Sitemap: /sitemap-news.xml
+Sitemap: sitemaps/pages.xml
+Sitemap: /etc/passwd
+Sitemap: file:///etc/passwd
+Sitemap: C:\\Windows\\win.ini
+Sitemap: ftp://example.com/sitemap.xml
+'''
+
+class RobotsSitemapsTest(unittest.TestCase):
+
+    def setUp(self):
+        logging.disable(logging.WARNING)
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+
+    def queued(self, text):
+        dispatcher = Dispatcher(robots_sitemaps=True, metrics=False)
+        dispatcher.got_robots('http://example.com', parse_robots(text))
+        queue = dispatcher.sitemap_queue
+        return [queue.get_nowait() for i in xrange(queue.qsize())]
+
+    def test_parse(self):
+        self.assertEqual(7, len(parse_robots(ROBOTS).sitemaps))
+
+    def test_only_remote(self):
+        # paths are on the robots.txt's own site, never our files
+        self.assertEqual(['http://example.com/sitemap.xml',
+                            'http://example.com/sitemap-news.xml',
+                            'http://example.com/sitemaps/pages.xml',
+                            'http://example.com/etc/passwd'],
+                            self.queued(ROBOTS))
+
+    def test_local_path(self):
+        self.assertEqual([], self.queued('Sitemap: file:///etc/passwd\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+from crawler.seen import BloomFilter, FingerprintSet, fingerprint
+
+def urls(count, prefix='http://example.com/'):
+    return ['{}{}'.format(prefix, i) for i in xrange(count)]
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_unicode_same_as_utf8(self):
+        self.assertEqual(fingerprint(u'http://example.com/caf\xe9'),
+                            fingerprint('http://example.com/caf\xc3\xa9'))
+
+    def test_bits(self):
+        for url in urls(100):
+            fp = fingerprint(url, 32)
+            self.assertTrue(-2 ** 31 <= fp < 2 ** 31)
+            self.assertEqual(fingerprint(url) >> 32, fp)
+
+
+class FingerprintSetTest(unittest.TestCase):
+
+    def test_add(self):
+        seen = FingerprintSet()
+        self.assertTrue(seen.add('http://example.com/'))
+        self.assertFalse(seen.add('http://example.com/'))
+        self.assertFalse(seen.add(u'http://example.com/'))
+        self.assertIn('http://example.com/', seen)
+        self.assertNotIn('http://example.com/other', seen)
+        self.assertEqual(1, len(seen))
+
+    def test_collisions(self):
+        seen = FingerprintSet(capacity=8)
+        size = len(seen.table)
+        # all in the last slot, so probing has to wrap around, and some
+        # negative like half of all real fingerprints
+        fps = [size - 1 + k * size for k in xrange(1, 5)]
+        fps += [-1 - k * size for k in xrange(0, 3)]
+        for fp in fps:
+            self.assertTrue(seen.add_fingerprint(fp))
+        for fp in fps:
+            self.assertFalse(seen.add_fingerprint(fp))
+        self.assertEqual(len(fps), len(seen))
+        self.assertEqual(sorted(fps), sorted(fp for fp in seen.table if fp))
+
+    def test_grow(self):
+        seen = FingerprintSet(capacity=4)
+        start = len(seen.table)
+        added = urls(5000)
+        for url in added:
+            self.assertTrue(seen.add(url))
+        self.assertEqual(5000, len(seen))
+        self.assertGreater(len(seen.table), start)
+        # never more than half full
+        self.assertLessEqual(len(seen) * 2, len(seen.table))
+        for url in added:
+            self.assertIn(url, seen)
+            self.assertFalse(seen.add(url))
+        for url in urls(5000, 'http://example.org/'):
+            self.assertNotIn(url, seen)
+        self.assertEqual(seen.nbytes, len(seen.table) * seen.table.itemsize)
+
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        seen = BloomFilter(capacity=2000, error_rate=0.01)
+        added = urls(2000)
+        for url in added:
+            seen.add(url)
+        for url in added:
+            self.assertIn(url, seen)
+            self.assertFalse(seen.add(url))
+        self.assertIn(u'http://example.com/5', seen)
+
+    def test_false_positive_rate(self):
+        seen = BloomFilter(capacity=10000, error_rate=0.01)
+        new = sum(seen.add(url) for url in urls(10000))
+        others = urls(20000, 'http://example.org/')
+        rate = sum(url in seen for url in others) / float(len(others))
+        # about error_rate once it's at capacity, give it some slack
+        self.assertLess(rate, 0.02)
+        # and each of those cost a new url when adding
+        self.assertGreater(new, 10000 * 0.98)
+        self.assertEqual(new, len(seen))
+
+    def test_sizing(self):
+        seen = BloomFilter(capacity=1000000, error_rate=0.001)
+        # about 1.8 bytes a url and 10 hashes at 0.1%
+        self.assertEqual(10, seen.hashes)
+        self.assertAlmostEqual(1.8, seen.nbytes / 1e6, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+from Queue import Queue
+from threading import Event, Thread
+import unittest
+
+from crawler.sitemaps import SitemapLoader
+
+class SendTest(unittest.TestCase):
+
+    def setUp(self):
+        self.signal = Queue()
+        self.killer = Event()
+        self.loader = SitemapLoader(Queue(), self.signal, None, None,
+                                    self.killer, max_batches=2)
+
+    def send_in_thread(self):
+        results = []
+        thread = Thread(target=lambda: results.append(self.loader.send(['x'])))
+        thread.daemon = True
+        thread.start()
+        return thread, results
+
+    def test_waits_for_a_slot(self):
+        self.assertTrue(self.loader.send(['a']))
+        self.assertTrue(self.loader.send(['b']))
+        thread, results = self.send_in_thread()
+        thread.join(0.2)
+        self.assertTrue(thread.is_alive())
+        self.loader.batch_done()
+        thread.join(5)
+        self.assertEqual([True], results)
+        self.assertEqual(3, self.signal.qsize())
+
+    def test_stopping(self):
+        self.loader.send(['a'])
+        self.loader.send(['b'])
+        thread, results = self.send_in_thread()
+        thread.join(0.2)
+        self.killer.set()
+        self.loader.wake()
+        thread.join(5)
+        self.assertEqual([False], results)
+        self.assertEqual(2, self.signal.qsize())
+
+
+if __name__ == '__main__':
+    unittest.main()